@@ -0,0 +1,351 @@
+""" adaptive_pool.py - Adaptive concurrency for subprocess-heavy stages
+Runs jobs on a thread pool whose effective worker count is tuned while the
+stage runs: the controller measures throughput and system load at a fixed
+interval and hill-climbs the worker count within the user's limits.
+
+A StageProgress counts completed, running and failed jobs per worker
+thread and reports them at a fixed interval, independent of the order in
+which the caller consumes the results.
+"""
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Iterable, Iterator, Optional, Tuple, Any, Dict, List, Sequence
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = os.cpu_count() or 4
+
+# Seconds between throughput samples
+SAMPLE_INTERVAL = 2.0
+# Relative throughput change treated as noise
+TOLERANCE = 0.05
+# Load (fraction of all cores busy) above which the controller backs off
+MAX_LOAD = 0.95
+# Seconds between StageProgress reports
+PROGRESS_INTERVAL = 5.0
+
+def system_load() -> Optional[float]:
+    """Return the fraction of CPU capacity in use, or None if it cannot be measured"""
+    if psutil is not None:
+        return psutil.cpu_percent(interval=None) / 100.0
+    if hasattr(os, "getloadavg"):
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    return None
+
+class AdaptiveConcurrency:
+    """Hill-climbing controller for the number of concurrent jobs in a stage"""
+
+    def __init__(self,
+                 stage: str,
+                 min_workers: int = 1,
+                 max_workers: int = DEFAULT_MAX_WORKERS,
+                 adaptive: bool = True,
+                 log: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            stage: Stage name used in log messages
+            min_workers: Lower bound for the worker count
+            max_workers: Upper bound for the worker count
+            adaptive: If False the worker count stays fixed at max_workers
+            log: Optional callback receiving level changes, in addition to the logger
+        """
+        self.stage = stage
+        self.min_workers = max(1, min(min_workers, max_workers))
+        self.max_workers = max(1, max_workers)
+        self.adaptive = adaptive
+        self.log = log
+        if adaptive:
+            # Start in the middle of the range and climb from there
+            self.level = max(self.min_workers, (self.min_workers + self.max_workers) // 2)
+        else:
+            self.level = self.max_workers
+        self.direction = 1
+        self.completed = 0
+        self.sample_completed = 0
+        self.sample_start = time.perf_counter()
+        self.start = self.sample_start
+        self.last_throughput: Optional[float] = None
+        self.best_level = self.level
+        self.best_throughput = 0.0
+        if psutil is not None:
+            # Prime the CPU counter so the first sample is meaningful
+            psutil.cpu_percent(interval=None)
+        self.report(f"[{self.stage}] Starting with {self.level} workers "
+                    f"(limits {self.min_workers}-{self.max_workers}, adaptive={self.adaptive})")
+
+    def report(self, message: str):
+        """Log a message and forward it to the log callback"""
+        logger.info(message)
+        if self.log is not None:
+            self.log(message)
+
+    def record(self, count: int = 1):
+        """Record finished jobs and adjust the level when a sample is complete"""
+        self.completed += count
+        self.sample_completed += count
+        now = time.perf_counter()
+        elapsed = now - self.sample_start
+        if elapsed < SAMPLE_INTERVAL:
+            return
+        throughput = self.sample_completed / elapsed
+        self.sample_completed = 0
+        self.sample_start = now
+        if throughput > self.best_throughput:
+            self.best_throughput = throughput
+            self.best_level = self.level
+        if self.adaptive:
+            self._adjust(throughput)
+
+    def _adjust(self, throughput: float):
+        load = system_load()
+        if load is not None and load > MAX_LOAD:
+            self.direction = -1
+        elif self.last_throughput is not None and throughput < self.last_throughput * (1 - TOLERANCE):
+            # The last move made things worse: turn around
+            self.direction = -self.direction
+        self.last_throughput = throughput
+
+        new_level = min(self.max_workers, max(self.min_workers, self.level + self.direction))
+        if new_level == self.level:
+            # Pinned at a limit; stay until throughput drops
+            return
+        load_text = f"{load:.0%}" if load is not None else "n/a"
+        self.report(f"[{self.stage}] Workers {self.level} -> {new_level} "
+                    f"({throughput:.1f} jobs/s, load {load_text})")
+        self.level = new_level
+
+    def summary(self) -> str:
+        """Summary of the stage for tuning, e.g. for the log"""
+        elapsed = time.perf_counter() - self.start
+        rate = self.completed / elapsed if elapsed > 0 else 0.0
+        return (f"[{self.stage}] {self.completed} jobs in {elapsed:.1f}s ({rate:.1f} jobs/s); "
+                f"best level {self.best_level} workers at {self.best_throughput:.1f} jobs/s")
+
+class StageProgress:
+    """
+    Completed, running and failed job counts of a stage, per worker thread
+
+    Each worker thread updates only its own counters, so recording a job
+    takes no lock; report() adds them up on the consuming thread.
+    """
+
+    def __init__(self,
+                 stage: str,
+                 interval: float = PROGRESS_INTERVAL,
+                 failed: Optional[Callable[[Any], bool]] = None,
+                 total: Optional[Callable[[], int]] = None,
+                 log: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            stage: Stage name used in the reports
+            interval: Seconds between reports
+            failed: Tells from a job's result whether it failed; jobs that raise always count as failed
+            total: Optional callback returning the number of jobs known so far
+            log: Optional callback receiving the reports instead of the logger
+        """
+        self.stage = stage
+        self.interval = interval
+        self.is_failure = failed
+        self.total = total
+        self.log = log
+        # Thread name -> [started, completed, failed, first start]; each list is written by its thread only
+        self.workers: Dict[str, List[Any]] = {}
+        self.local = threading.local()
+        self.start = time.perf_counter()
+        self.last_report = self.start
+
+    def wrap(self, func: Callable[[Any], Any]) -> Callable[[Any], Any]:
+        """Count every call of a job function on the thread that runs it"""
+        def counted(item):
+            counters = getattr(self.local, "counters", None)
+            if counters is None:
+                counters = self.local.counters = [0, 0, 0, time.perf_counter()]
+                self.workers[threading.current_thread().name] = counters
+            counters[0] += 1
+            try:
+                result = func(item)
+            except BaseException:
+                counters[2] += 1
+                counters[1] += 1
+                raise
+            if self.is_failure is not None and self.is_failure(result):
+                counters[2] += 1
+            counters[1] += 1
+            return result
+        return counted
+
+    def counts(self) -> Tuple[int, int, int]:
+        """Tuple of (completed, running, failed) jobs"""
+        workers = list(self.workers.values())
+        completed = sum(counters[1] for counters in workers)
+        running = sum(counters[0] - counters[1] for counters in workers)
+        failed = sum(counters[2] for counters in workers)
+        return completed, running, failed
+
+    def message(self) -> str:
+        """One line summary of the stage so far"""
+        now = time.perf_counter()
+        completed, running, failed = self.counts()
+        elapsed = now - self.start
+        rate = completed / elapsed if elapsed > 0 else 0.0
+        done = f"{completed}/{self.total()}" if self.total is not None else f"{completed}"
+        rates = " ".join(f"{counters[1] / max(now - counters[3], 1e-9):.1f}"
+                         for _, counters in sorted(self.workers.items()))
+        return (f"[{self.stage}] {done} done, {running} running, {failed} failed, "
+                f"{rate:.1f} jobs/s; per worker: {rates or '-'} jobs/s")
+
+    def report(self, force: bool = False):
+        """Log the counts if the interval has passed since the last report (or always when forced)"""
+        now = time.perf_counter()
+        if not force and now - self.last_report < self.interval:
+            return
+        self.last_report = now
+        (self.log or logger.info)(self.message())
+
+def file_size(path: str) -> int:
+    """Size of a file in bytes, 0 if it cannot be read"""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def largest_first(items: Iterable[Any],
+                  path_of: Callable[[Any], str] = lambda item: item,
+                  category_of: Optional[Callable[[Any], str]] = None,
+                  category_priority: Optional[Sequence[str]] = None) -> List[Any]:
+    """
+    Order work items so the biggest inputs start first
+
+    Starting the largest jobs first keeps every worker busy until the end
+    instead of leaving one thread on a giant bank after the rest are done.
+
+    Args:
+        items: Work items
+        path_of: Returns the input file of an item
+        category_of: Returns the category of an item (needed for category_priority)
+        category_priority: Categories to run first, in order; others follow
+
+    Returns:
+        Items sorted by category priority, then by input size (largest first)
+    """
+    ranks = {category: rank for rank, category in enumerate(category_priority or [])}
+    def sort_key(item):
+        rank = ranks.get(category_of(item), len(ranks)) if category_of and ranks else 0
+        return (rank, -file_size(path_of(item)))
+    return sorted(items, key=sort_key)
+
+class CountedItems:
+    """
+    Work items counted as they are taken, for progress messages
+
+    The total of a list is known up front; the total of a generator (e.g. a
+    running scan) grows until it is exhausted.
+    """
+
+    def __init__(self, items: Iterable[Any]):
+        self.known = isinstance(items, (list, tuple))
+        self.count = len(items) if self.known else 0
+        self.exhausted = self.known
+        self.source = iter(items)
+
+    def __iter__(self) -> Iterator[Any]:
+        for item in self.source:
+            if not self.known:
+                self.count += 1
+            yield item
+        self.exhausted = True
+
+    def total(self) -> str:
+        """The total so far, e.g. "120", or "120+" while items are still coming"""
+        return str(self.count) if self.exhausted else f"{self.count}+"
+
+def run_adaptive(func: Callable[[Any], Any],
+                 items: Iterable[Any],
+                 controller: AdaptiveConcurrency,
+                 should_continue: Optional[Callable[[], bool]] = None,
+                 cancel: Optional[Callable[[], None]] = None,
+                 progress: Optional[StageProgress] = None) -> Iterator[Tuple[Any, Any]]:
+    """
+    Run func over items with the concurrency chosen by the controller
+
+    Items are pulled from the iterable only when a worker slot is free, so it
+    may be a generator that is still producing (e.g. a running scan).
+
+    When should_continue() turns False, or the loop is left early (an
+    exception such as Ctrl+C, or the caller stops iterating), jobs that have
+    not started are cancelled and cancel() is called to stop the running
+    ones, so the pool does not wait for them to finish on their own.
+
+    Args:
+        func: Function called once per item, on a worker thread
+        items: Work items
+        controller: Controller deciding how many jobs run at once
+        should_continue: Optional callback; when it returns False no new jobs are started
+        cancel: Optional callback stopping running jobs, e.g. ProcessRunner.cancel
+        progress: Optional StageProgress counting the jobs and reporting at its interval
+
+    Yields:
+        Tuples of (item, result) in completion order; cancelled jobs are left out
+    """
+    source = iter(items)
+    exhausted = False
+    stopped = False
+    in_flight = {}
+    if progress is not None:
+        func = progress.wrap(func)
+
+    def stop():
+        nonlocal stopped
+        if stopped:
+            return
+        stopped = True
+        for future in in_flight:
+            future.cancel()
+        if cancel is not None:
+            cancel()
+
+    with ThreadPoolExecutor(max_workers=controller.max_workers) as executor:
+        try:
+            while True:
+                while not exhausted and len(in_flight) < controller.level:
+                    if should_continue is not None and not should_continue():
+                        exhausted = True
+                        stop()
+                        break
+                    try:
+                        item = next(source)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    in_flight[executor.submit(func, item)] = item
+
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, timeout=SAMPLE_INTERVAL, return_when=FIRST_COMPLETED)
+                controller.record(len(done))
+                if progress is not None:
+                    progress.report()
+                if should_continue is not None and not should_continue():
+                    # Cancelled while jobs were running
+                    exhausted = True
+                    stop()
+                for future in done:
+                    item = in_flight.pop(future)
+                    if not future.cancelled():
+                        yield (item, future.result())
+        except BaseException:
+            stop()
+            raise
+    if progress is not None:
+        progress.report(force=True)
+    controller.report(controller.summary())
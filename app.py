@@ -2,12 +2,28 @@ import sys
 import os
 import glob
 import re
-import subprocess
 import shutil
-import urllib.request
-import zipfile
 import json
+import time
+import argparse
+import uuid
+from typing import Optional
 from config_manager import get_config, set_config, save_config, load_config
+from sound_mappings import read_bank_source_ids, load_wiki_data, wiki_id_map_for_bank, is_bank_xml, compress_bank_xml, check_xml_compression
+from audio_store import AudioStore, source_key, build_flat_view, build_bank_view, link_file
+from sound_scanner import SoundScanner, CategoryMatcher, find_category_roots, SOUND_LAYOUTS
+from fingerprint import FingerprintIndex
+from tool_registry import find_tool, tool_registry, cache_tag
+from dependency_downloader import download_dependencies
+from vgmstream_batch import iter_batches, convert_batch, DEFAULT_BATCH_FILES, DEFAULT_BATCH_BYTES
+from adaptive_pool import AdaptiveConcurrency, CountedItems, run_adaptive, largest_first, file_size, DEFAULT_MAX_WORKERS
+from sharding import parse_shard, write_shard_record
+from sound_filter import SoundFilter, config_filter_settings, add_filter_arguments, filter_settings_from_args, bank_name_of
+from watcher import ChangeWatcher, BankSoundIndex, category_of
+from profiling import RunProfiler
+from process_runner import ProcessRunner, python_command, DEFAULT_DECODE_TIMEOUT, DEFAULT_CONVERT_TIMEOUT
+from bank_archives import export_bank_archives, ARCHIVE_FORMATS, DEFAULT_ARCHIVE_FOLDER
+from run_planner import ThroughputHistory, plan_run, format_plan, settings_from_config, STAGES, split_skips, DEFAULT_HISTORY_PATH
 
 from PyQt6.QtWidgets import (
     QApplication,
@@ -22,6 +38,8 @@ from PyQt6.QtWidgets import (
     QFileDialog,
     QCheckBox,
     QProgressBar,
+    QSpinBox,
+    QLabel,
 )
 from PyQt6.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
 from PyQt6.QtGui import QIcon, QFont
@@ -36,14 +54,25 @@ class Worker(QObject):
         super().__init__()
         self.settings = settings
         self._is_running = True
+        self.runner = ProcessRunner()
+        # Banks and WEMs of the last run that failed to decode or convert
+        self.failed = []
+        # Why the last run stopped before processing anything, if it did
+        self.error = None
 
     def stop(self):
         self._is_running = False
+        # Kill the wwiser and vgmstream-cli processes still running
+        self.runner.cancel()
 
     @pyqtSlot()
     def run(self):
         # (Reset cancellation flag)
         self._is_running = True
+        # Runs wwiser and vgmstream-cli, and counts their runs and failures
+        runner = self.runner = ProcessRunner()
+        self.failed = []
+        self.error = None
 
         # Fixed paths based on the current working directory
         wwiser_pyz = self.settings.get("wwiser_pyz", "")
@@ -57,6 +86,58 @@ class Worker(QObject):
         should_decode_banks = self.settings.get("should_decode_banks", False)
         should_group = self.settings.get("should_group", False)
         should_rename = self.settings.get("should_rename", False)
+        should_export = self.settings.get("should_export", False)
+        # Per-bank archives of the grouped folders (see bank_archives.py)
+        folder_bank_archives = self.settings.get("folder_bank_archives") or DEFAULT_ARCHIVE_FOLDER
+        archive_format = self.settings.get("archive_format") or "zip"
+        use_audio_store = self.settings.get("use_audio_store", False)
+        folder_audio_store = self.settings.get("folder_audio_store", os.path.join(os.getcwd(), "AudioStore"))
+        vgmstream = tool_registry.probe("vgmstream", folder_vgmstream)
+        vgmstream_cli = vgmstream["path"] if vgmstream else "vgmstream-cli"
+        # Store entries converted by another vgmstream version count as out of date
+        store = AudioStore(folder_audio_store, vgmstream["version"] if vgmstream else None) if use_audio_store else None
+        max_workers = self.settings.get("max_workers", DEFAULT_MAX_WORKERS)
+        adaptive_workers = self.settings.get("adaptive_workers", False)
+        should_sort_largest_first = self.settings.get("largest_first", True)
+        skip_duplicates = self.settings.get("skip_duplicates", False)
+        skip_near_duplicates = self.settings.get("skip_near_duplicates", False)
+        fingerprint_index_path = self.settings.get("fingerprint_index", os.path.join(os.getcwd(), "fingerprints.json"))
+        batch_convert = self.settings.get("batch_convert", True)
+        batch_max_files = self.settings.get("batch_max_files", DEFAULT_BATCH_FILES)
+        batch_max_mb = self.settings.get("batch_max_mb", DEFAULT_BATCH_BYTES // (1024 * 1024))
+        decode_timeout = self.settings.get("decode_timeout") or DEFAULT_DECODE_TIMEOUT
+        convert_timeout = self.settings.get("convert_timeout") or DEFAULT_CONVERT_TIMEOUT
+        # Decoded bank XMLs can be kept gzip/zstd compressed (see sound_mappings.py)
+        xml_compression = self.settings.get("xml_compression") or "none"
+        # Only the banks and WEMs of this shard are processed (see sharding.py)
+        shard = parse_shard(self.settings.get("shard"))
+        # Only the selected banks, categories and sounds are processed (see sound_filter.py)
+        try:
+            sound_filter = SoundFilter.from_settings(self.settings)
+        except ValueError as e:
+            self.error = f"Invalid filter: {e}"
+            self.progress.emit(self.error)
+            self.finished.emit()
+            return
+        if sound_filter.active:
+            self.progress.emit(f"Filter: {sound_filter.describe()}")
+        try:
+            check_xml_compression(xml_compression)
+        except ValueError as e:
+            self.error = str(e)
+            self.progress.emit(self.error)
+            self.finished.emit()
+            return
+        if should_export and archive_format not in ARCHIVE_FORMATS:
+            self.error = f"Unknown archive format {archive_format!r} (use {', '.join(ARCHIVE_FORMATS)})"
+            self.progress.emit(self.error)
+            self.finished.emit()
+            return
+        # Measured stage throughput, used by the dry-run planner for its estimates
+        history = ThroughputHistory(self.settings.get("throughput_history") or DEFAULT_HISTORY_PATH)
+        # Optional per-stage cProfile/tracemalloc reports
+        profiler = RunProfiler("app", self.settings.get("profile", False), log=self.progress.emit)
+        profiler.start()
         
         # Create the output folders immediately.
         os.makedirs(folder_banks_converted, exist_ok=True)
@@ -82,128 +163,267 @@ class Worker(QObject):
         os.makedirs(src_sound_dev, exist_ok=True)
         os.makedirs(src_banks, exist_ok=True)
         os.makedirs(src_banks_dev, exist_ok=True)
-        os.makedirs(dest_sound, exist_ok=True)
-        os.makedirs(dest_sound_dev, exist_ok=True)
+        if store is None:
+            os.makedirs(dest_sound, exist_ok=True)
+            os.makedirs(dest_sound_dev, exist_ok=True)
         
         # --- Decode banks immediately, creating a bank folder per file ---
         def decode_banks(source_dir: str, target_folder: str):
+            category = os.path.basename(target_folder)
+            if not sound_filter.wants_category(category):
+                self.progress.emit(f"Skipping {category} banks (filtered out)")
+                return
             # First try direct path for .bnk files
             banks = glob.glob(os.path.join(source_dir, "*.bnk"))
             
-            # If no banks found, try searching recursively from the unpacked_data folder
+            # If no banks found, search recursively from the unpacked_data folder
+            scanner = None
             if len(banks) == 0:
                 self.progress.emit(f"No BNK files found in {source_dir}. Searching recursively...")
-                # Try searching in the entire folder structure
-                for root, _, files in os.walk(folder_unpacked_data):
-                    for file in files:
-                        if file.lower().endswith('.bnk'):
-                            banks.append(os.path.join(root, file))
-                
-                self.progress.emit(f"Found {len(banks)} BNK files in recursive search")
+                # Banks of this category are decoded as the scan finds them
+                scanner = SoundScanner(extensions=(".bnk",), shared_only=True)
+                matcher = CategoryMatcher(find_category_roots(folder_unpacked_data))
+                banks = (bank for bank in scanner.scan_parallel(folder_unpacked_data)
+                         if matcher.categorize(bank) == category)
             
-            total = len(banks)
+            if sound_filter.active:
+                banks = (bank for bank in banks if sound_filter.wants_bank(category, bank))
+            if shard is not None:
+                banks = (bank for bank in banks if shard.owns(category, bank))
             bank_index = 0
-            
-            if total == 0:
-                self.progress.emit(f"No BNK files found in {source_dir} or recursive search")
-                return
                 
-            self.progress.emit(f"Decoding {total} banks")
-            for bank in banks:
-                if not self._is_running:
-                    self.progress.emit("Decoding cancelled.")
-                    return
+            def decode_bank(bank: str) -> bool:
                 bank_name = os.path.basename(bank)[:-4]  # remove .bnk extension
                 bank_folder = os.path.join(target_folder, bank_name)
                 os.makedirs(bank_folder, exist_ok=True)  # create the bank folder immediately
-                cmd = f'python "{wwiser_pyz}" -d xsl "{bank}"'
-                subprocess.call(cmd, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                result = runner.run([python_command(), wwiser_pyz, "-d", "xsl", bank],
+                                    timeout=decode_timeout, name="wwiser", job=bank)
+                if not result.ok and not result.cancelled:
+                    self.progress.emit(f"wwiser failed on {os.path.basename(bank)}: {result.describe()}")
                 # Expected output file: bank_name.bnk.xml
                 xml_file = bank[:-4] + ".bnk.xml"
                 if os.path.exists(xml_file):
-                    shutil.move(xml_file, os.path.join(bank_folder, os.path.basename(xml_file)))
-                    self.progress.emit(f"Added XML for bank '{bank_name}'")
+                    target = os.path.join(bank_folder, os.path.basename(xml_file))
+                    shutil.move(xml_file, target)
+                    compress_bank_xml(target, xml_compression)
+                    return True
+                return False
+            
+            if should_sort_largest_first:
+                # Sorting needs every bank, so after a recursive search decoding starts once it is done
+                banks = largest_first(banks)
+            banks = CountedItems(banks)
+            self.progress.emit(f"Decoding {banks.count} banks" if banks.exhausted else "Decoding banks as they are found")
+            controller = AdaptiveConcurrency("decode", max_workers=max_workers,
+                                             adaptive=adaptive_workers, log=self.progress.emit)
+            start = time.perf_counter()
+            decoded_bytes = 0
+            for bank, decoded in run_adaptive(profiler.wrap(decode_bank), banks, controller,
+                                              should_continue=lambda: self._is_running, cancel=runner.cancel):
+                if decoded:
+                    self.progress.emit(f"Added XML for bank '{os.path.basename(bank)[:-4]}'")
+                elif self._is_running:
+                    self.failed.append(bank)
                 bank_index += 1
-                self.progress.emit(f"{bank_index}/{total} banks decoded in {source_dir}")
+                decoded_bytes += file_size(bank)
+                self.progress.emit(f"{bank_index}/{banks.total()} banks decoded in {source_dir}")
+            if scanner is not None:
+                self.progress.emit(f"Found {banks.count} BNK files in recursive search")
+                self.progress.emit(scanner.rate_message())
+            if banks.exhausted and banks.count == 0:
+                self.progress.emit(f"No BNK files found in {source_dir} or recursive search")
+                return
+            if not self._is_running:
+                self.progress.emit("Decoding cancelled.")
+            else:
+                history.record("decode", bank_index, decoded_bytes, time.perf_counter() - start, controller.max_workers)
+        
+        # Split WEMs into ones to convert and (duplicate, canonical) pairs, dropping silent ones
+        def plan_skips(wems):
+            if not os.path.exists(fingerprint_index_path):
+                self.progress.emit("No fingerprint index found; converting all files")
+                return wems, []
+            index = FingerprintIndex(fingerprint_index_path, cache_tag(vgmstream["version"]) if vgmstream else None)
+            duplicates, silent = index.skip_plan(skip_near_duplicates)
+            kept, duplicate_wems, silent_count = split_skips(wems, duplicates, silent)
+            self.progress.emit(f"Skipping {silent_count} silent and {len(duplicate_wems)} duplicate files")
+            return kept, duplicate_wems
         
         # Convert .wem files using vgmstream-cli
         def convert_wem_folder(source_dir: str, dest_dir: str):
+            category = os.path.basename(dest_dir)
+            if not sound_filter.wants_category(category):
+                self.progress.emit(f"Skipping {category} audio (filtered out)")
+                return
+            if sound_filter.banks or sound_filter.wiki_pages:
+                # Bank filters select the sounds the decoded banks reference
+                read = sound_filter.load_bank_sounds(os.path.join(folder_banks_converted, category), category)
+                if read == 0:
+                    self.progress.emit(f"No decoded {category} banks match the filter; decode them first to convert their sounds")
             cwd = os.getcwd()
             os.chdir(folder_vgmstream)
             
             # First try direct path for .wem files
             wems = glob.glob(os.path.join(source_dir, "*.wem"))
             
-            # If no wem files found, try searching recursively from the unpacked_data folder
+            # If no wem files found, search recursively from the unpacked_data folder
+            scanner = None
             if len(wems) == 0:
                 self.progress.emit(f"No WEM files found in {source_dir}. Searching recursively...")
-                
-                # Determine whether this is for Shared or SharedDev
-                is_shared = "Shared" in source_dir and "SharedDev" not in source_dir
-                is_shareddev = "SharedDev" in source_dir
-                
-                # Try searching in the entire folder structure
-                for root, _, files in os.walk(folder_unpacked_data):
-                    for file in files:
-                        if file.lower().endswith('.wem'):
-                            # Only include files in the right category
-                            if (is_shared and "SharedDev" not in root and "Shared" in root) or \
-                               (is_shareddev and "SharedDev" in root) or \
-                               (not is_shared and not is_shareddev):  # If not specific, include all
-                                wems.append(os.path.join(root, file))
-                
-                self.progress.emit(f"Found {len(wems)} WEM files in recursive search")
+                # Files of this category are converted as the scan finds them
+                scanner = SoundScanner(extensions=(".wem",), shared_only=True)
+                matcher = CategoryMatcher(find_category_roots(folder_unpacked_data, SOUND_LAYOUTS))
+                wems = (wem for wem in scanner.scan_parallel(folder_unpacked_data)
+                        if matcher.categorize(wem) == category)
             
-            total = len(wems)
+            if sound_filter.active:
+                wems = (wem for wem in wems if sound_filter.wants_sound(category, wem))
+            if shard is not None:
+                wems = (wem for wem in wems if shard.owns(category, wem))
             wem_index = 0
+                
+            def convert_wem(wem: str) -> Optional[bool]:
+                # Returns False when the store already had the file, None when the conversion failed
+                _, filename = os.path.split(wem)
+                if store is not None:
+                    key = source_key(category, wem)
+                    if store.is_current(key, wem):
+                        return False
+                    output = store.temp_path()
+                else:
+                    output = os.path.join(dest_dir, filename + ".wav")
+                result = runner.run([vgmstream_cli, "-o", output, wem],
+                                    timeout=convert_timeout, name="vgmstream-cli", job=wem)
+                if not result.ok and not result.cancelled:
+                    self.progress.emit(f"vgmstream-cli failed on {filename}: {result.describe()}")
+                if not os.path.exists(output):
+                    return None
+                if store is not None:
+                    store.add(key, wem, output)
+                return True
+            
+            def convert_wem_batch(batch):
+                # Store conversions go to a scratch folder of their own, then into the store
+                output_dir = os.path.join(store.tmp_dir, uuid.uuid4().hex) if store is not None else dest_dir
+                results = convert_batch(vgmstream_cli, batch, output_dir, runner, convert_timeout)
+                if store is not None:
+                    for wem, output in results.items():
+                        if output is not None:
+                            store.add(source_key(category, wem), wem, output)
+                    shutil.rmtree(output_dir, ignore_errors=True)
+                return results
             
-            if total == 0:
+            # Leave out silent placeholders and duplicates known to the fingerprint index;
+            # the skip plan needs every file, so conversion starts once the scan is done
+            duplicate_wems = []
+            if skip_duplicates:
+                wems, duplicate_wems = plan_skips(list(wems))
+            
+            if should_sort_largest_first:
+                # Sorting needs every file as well
+                wems = largest_first(wems)
+            wems = CountedItems(wems)
+            self.progress.emit(f"Converting {wems.count} files" if wems.exhausted else "Converting files as they are found")
+            controller = AdaptiveConcurrency("convert", max_workers=max_workers,
+                                             adaptive=adaptive_workers, log=self.progress.emit)
+            start = time.perf_counter()
+            converted_files, converted_bytes = 0, 0
+            if batch_convert:
+                # Many files per vgmstream-cli process; up-to-date store entries are left out of the batches
+                def pending(items):
+                    nonlocal wem_index
+                    for wem in items:
+                        if store is not None and store.is_current(source_key(category, wem), wem):
+                            wem_index += 1
+                        else:
+                            yield wem
+                batches = iter_batches(pending(wems), batch_max_files, batch_max_mb * 1024 * 1024)
+                for batch, results in run_adaptive(profiler.wrap(convert_wem_batch), batches, controller,
+                                                   should_continue=lambda: self._is_running, cancel=runner.cancel):
+                    for wem, output in results.items():
+                        if output is None:
+                            self.progress.emit(f"Failed to convert {wem}")
+                            if self._is_running:
+                                self.failed.append(wem)
+                    wem_index += len(batch)
+                    converted_files += len(batch)
+                    converted_bytes += sum(file_size(wem) for wem in batch)
+                    self.progress.emit(f"{wem_index}/{wems.total()} files converted in {source_dir}")
+                stage = "convert_batch"
+            else:
+                for wem, converted in run_adaptive(profiler.wrap(convert_wem), wems, controller,
+                                                   should_continue=lambda: self._is_running, cancel=runner.cancel):
+                    wem_index += 1
+                    if converted is None and self._is_running:
+                        self.failed.append(wem)
+                    if converted is not False:
+                        # Failed conversions took their time as well
+                        converted_files += 1
+                        converted_bytes += file_size(wem)
+                    self.progress.emit(f"{wem_index}/{wems.total()} files converted in {source_dir}")
+                stage = "convert"
+            if scanner is not None:
+                self.progress.emit(f"Found {wems.count} WEM files in recursive search")
+                self.progress.emit(scanner.rate_message())
+            if wems.exhausted and wems.count == 0 and not duplicate_wems:
                 self.progress.emit(f"No WEM files found in {source_dir} or recursive search")
                 os.chdir(cwd)
                 return
-                
-            self.progress.emit(f"Converting {total} files")
-            for wem in wems:
-                if not self._is_running:
-                    self.progress.emit("Conversion cancelled.")
-                    break
-                _, filename = os.path.split(wem)
-                cmd = f'vgmstream-cli -o "{os.path.join(dest_dir, filename + ".wav")}" "{wem}"'
-                subprocess.call(cmd, shell=True, stdout=subprocess.DEVNULL)
-                wem_index += 1
-                self.progress.emit(f"{wem_index}/{total} files converted in {source_dir}")
+            if not self._is_running:
+                self.progress.emit("Conversion cancelled.")
+            else:
+                history.record(stage, converted_files, converted_bytes, time.perf_counter() - start, controller.max_workers)
+            
+            # Duplicates reuse the output of their canonical sound
+            for wem, canonical_wem in duplicate_wems:
+                if store is not None:
+                    canonical_entry = store.sources.get(source_key(category, canonical_wem))
+                    if canonical_entry is not None:
+                        stat = os.stat(wem)
+                        store.sources[source_key(category, wem)] = dict(
+                            canonical_entry, size=stat.st_size, mtime=stat.st_mtime, source=wem)
+                else:
+                    canonical_output = os.path.join(dest_dir, os.path.basename(canonical_wem) + ".wav")
+                    output = os.path.join(dest_dir, os.path.basename(wem) + ".wav")
+                    if os.path.exists(canonical_output) and not os.path.exists(output):
+                        link_file(canonical_output, output)
+            if store is not None:
+                store.save()
             os.chdir(cwd)
         
         # Group files by bank by reading the XML files stored in bank folders.
-        def create_banks_folders(banks_dir: str, sounds_dir: str):
+        def create_banks_folders(banks_dir: str, sounds_dir: str) -> int:
+            moved = 0
+            category = os.path.basename(banks_dir)
             for root, dirs, files in os.walk(banks_dir):
                 if not self._is_running:
                     self.progress.emit("Grouping cancelled.")
-                    return
+                    return moved
                 for file in files:
-                    if file.endswith(".bnk.xml"):
+                    if is_bank_xml(file) and sound_filter.wants_bank(category, file):
                         bank_name = os.path.basename(root)
                         target_folder = os.path.join(sounds_dir, bank_name)
                         os.makedirs(target_folder, exist_ok=True)
-                        xml_path = os.path.join(root, file)
-                        with open(xml_path, "r") as bank_file_content:
-                            for line in bank_file_content:
-                                if 'name="sourceID"' in line:
-                                    ids = line.split('"')[-2]
-                                    filename = f"{ids}.wem.wav"
-                                    if filename in os.listdir(sounds_dir):
-                                        shutil.move(
-                                            os.path.join(sounds_dir, filename),
-                                            os.path.join(target_folder, filename),
-                                        )
+                        for ids in read_bank_source_ids(os.path.join(root, file)):
+                            filename = f"{ids}.wem.wav"
+                            if filename in os.listdir(sounds_dir):
+                                shutil.move(
+                                    os.path.join(sounds_dir, filename),
+                                    os.path.join(target_folder, filename),
+                                )
+                                moved += 1
                         self.progress.emit(f"Grouped files for bank '{bank_name}'")
+            return moved
         
         # Rename files using the JSON mapping
-        def rename_files(source: str):
+        def rename_files(source: str) -> int:
+            renamed = 0
             if not os.path.exists(wiki_json_path):
                 self.progress.emit("wiki_data.json is missing. Skipping renaming.")
-                return
-            folders = glob.glob(os.path.join(source, "*/"))
+                return renamed
+            category = os.path.basename(source)
+            folders = [folder for folder in glob.glob(os.path.join(source, "*/"))
+                       if sound_filter.wants_bank(category, os.path.basename(os.path.normpath(folder)))]
             total = len(folders)
             rename_folder_index = 0
             self.progress.emit(f"Renaming files in {total} folders from {source}")
@@ -213,77 +433,124 @@ class Worker(QObject):
                     wiki_data = json.load(f)
             except Exception as e:
                 self.progress.emit(f"Error loading JSON mapping: {e}")
-                return
+                return renamed
 
             for folder_path in folders:
                 if not self._is_running:
                     self.progress.emit("Renaming cancelled.")
-                    return
+                    return renamed
                 folder_name = os.path.basename(os.path.normpath(folder_path))
-                mapping_key = None
-                for key in wiki_data:
-                    if folder_name.upper() in key.upper():
-                        mapping_key = key
-                        break
-
-                if mapping_key is None:
+                id_dict = wiki_id_map_for_bank(wiki_data, folder_name)
+                if id_dict is None:
                     self.progress.emit(f"No mappings found for {folder_name}")
                     continue
 
-                content = wiki_data[mapping_key].get("content", "")
-                lines = [line.strip() for line in content.splitlines() if line.strip()]
-                start_index = 0
-                for i, line in enumerate(lines):
-                    if line.isdigit():
-                        start_index = i
-                        break
-
-                id_dict = {}
-                for i in range(start_index, len(lines), 3):
-                    if i + 2 < len(lines):
-                        base_name = lines[i + 1]
-                        ids_line = lines[i + 2]
-                        ids = [x.strip() for x in ids_line.split(",") if x.strip()]
-                        for idx, id_val in enumerate(ids):
-                            id_dict[id_val] = f"{base_name}_{idx}"
                 sounds = glob.glob(os.path.join(folder_path, "*.wem.wav"))
                 for sound in sounds:
                     sound_id = os.path.basename(sound).split(".")[0]
                     if sound_id in id_dict:
                         new_name = os.path.join(folder_path, f"{id_dict[sound_id]}.wav")
                         os.rename(sound, new_name)
+                        renamed += 1
                 rename_folder_index += 1
                 self.progress.emit(f"{rename_folder_index}/{total} folders processed for renaming")
+            return renamed
+        
+        # Build the grouped/renamed (or flat) trees as link farms over the audio store
+        def build_store_views() -> int:
+            wiki_data = None
+            if should_rename:
+                wiki_data = load_wiki_data(wiki_json_path)
+                if wiki_data is None:
+                    self.progress.emit("wiki_data.json is missing. Skipping renaming.")
+            if should_group or should_rename:
+                counts = build_bank_view(store, folder_audio_converted, folder_banks_converted, wiki_data)
+            else:
+                counts = build_flat_view(store, folder_audio_converted)
+            for category, count in counts.items():
+                self.progress.emit(f"  Linked {count} files in {category} view")
+            return sum(count for count in counts.values() if count)
         
         # --- Process banks first ---
         if should_decode_banks:
             self.progress.emit("Decoding sound banks")
             self.progress.emit("  Processing Shared banks")
-            decode_banks(src_banks, folder_banks_converted_shared)
+            with profiler.stage("decode Shared"):
+                decode_banks(src_banks, folder_banks_converted_shared)
             self.progress.emit("  Processing SharedDev banks")
-            decode_banks(src_banks_dev, folder_banks_converted_shared_dev)
+            with profiler.stage("decode SharedDev"):
+                decode_banks(src_banks_dev, folder_banks_converted_shared_dev)
         
         if should_convert:
             self.progress.emit("Converting sound files")
             self.progress.emit("  Processing Shared audio")
-            convert_wem_folder(src_sound, dest_sound)
+            with profiler.stage("convert Shared"):
+                convert_wem_folder(src_sound, dest_sound)
             self.progress.emit("  Processing SharedDev audio")
-            convert_wem_folder(src_sound_dev, dest_sound_dev)
+            with profiler.stage("convert SharedDev"):
+                convert_wem_folder(src_sound_dev, dest_sound_dev)
             
-        if should_group:
-            self.progress.emit("Grouping files by bank")
-            self.progress.emit("  Grouping Shared audio")
-            create_banks_folders(folder_banks_converted_shared, dest_sound)
-            self.progress.emit("  Grouping SharedDev audio")
-            create_banks_folders(folder_banks_converted_shared_dev, dest_sound_dev)
+        if shard is not None:
+            # Banks and the sounds they reference can be in different shards
+            self.progress.emit(f"Shard {shard} done. Grouping and renaming run after the shards are merged.")
+            for output in (folder_banks_converted, folder_audio_converted, store.root if store else None):
+                if output is not None and self._is_running:
+                    write_shard_record(output, shard)
+        elif store is not None:
+            if self._is_running:
+                self.progress.emit("Building views from the audio store")
+                start = time.perf_counter()
+                with profiler.stage("views"):
+                    linked = build_store_views()
+                history.record("link", linked, 0, time.perf_counter() - start, 1)
+        else:
+            if should_group:
+                self.progress.emit("Grouping files by bank")
+                start = time.perf_counter()
+                self.progress.emit("  Grouping Shared audio")
+                with profiler.stage("group Shared"):
+                    moved = create_banks_folders(folder_banks_converted_shared, dest_sound)
+                self.progress.emit("  Grouping SharedDev audio")
+                with profiler.stage("group SharedDev"):
+                    moved += create_banks_folders(folder_banks_converted_shared_dev, dest_sound_dev)
+                if self._is_running:
+                    history.record("group", moved, 0, time.perf_counter() - start, 1)
             
-        if should_rename:
+        if should_rename and store is None and shard is None:
             self.progress.emit("Renaming files")
+            start = time.perf_counter()
             self.progress.emit("  Renaming Shared audio")
-            rename_files(dest_sound)
+            with profiler.stage("rename Shared"):
+                renamed = rename_files(dest_sound)
             self.progress.emit("  Renaming SharedDev audio")
-            rename_files(dest_sound_dev)
-        
+            with profiler.stage("rename SharedDev"):
+                renamed += rename_files(dest_sound_dev)
+            if self._is_running:
+                history.record("rename", renamed, 0, time.perf_counter() - start, 1)
+        
+        if should_export and shard is None and self._is_running:
+            self.progress.emit("Exporting bank archives")
+            start = time.perf_counter()
+            with profiler.stage("export"):
+                counts = export_bank_archives(folder_audio_converted, folder_bank_archives, archive_format,
+                                              self.settings.get("bank_dictionary"), wiki_json_path,
+                                              max_workers=max_workers, adaptive=adaptive_workers,
+                                              sound_filter=sound_filter,
+                                              should_continue=lambda: self._is_running, log=self.progress.emit)
+            self.progress.emit(f"Wrote {counts['archives']} archives with {counts['files']} files; "
+                               f"{counts['skipped']} were up to date")
+            if self._is_running:
+                history.record("export", counts["files"], counts["bytes"], time.perf_counter() - start, max_workers)
+            else:
+                self.progress.emit("Export cancelled.")
+        
+        try:
+            history.save()
+        except OSError as e:
+            self.progress.emit(f"Could not save throughput history: {e}")
+        for line in runner.summary():
+            self.progress.emit(line)
+        profiler.finish()
         self.progress.emit("Done")
         self.finished.emit()
 
@@ -304,42 +571,32 @@ class DownloadWorker(QObject):
 
     @pyqtSlot()
     def run(self):
-        os.makedirs(self.download_folder, exist_ok=True)
-        for url in self.dependencies:
-            if not self._is_running:
-                self.progress.emit("Download cancelled.")
-                self.finished.emit()
-                return
-            file_name = url.split("/")[-1]
-            destination = os.path.join(self.download_folder, file_name)
-            if os.path.exists(destination):
-                self.progress.emit(f"{file_name} already exists.")
-            else:
-                self.progress.emit(f"Downloading {file_name}...")
-                try:
-                    urllib.request.urlretrieve(url, destination)
-                    self.progress.emit(f"Downloaded {file_name}")
-                except Exception as e:
-                    self.progress.emit(f"Error downloading {file_name}: {e}")
-        for url in self.dependencies:
-            if not self._is_running:
-                self.progress.emit("Extraction cancelled.")
-                self.finished.emit()
-                return
-            file_name = url.split("/")[-1]
-            if file_name.lower().endswith('.zip'):
-                zip_path = os.path.join(self.download_folder, file_name)
-                extract_folder = os.path.join(self.download_folder, file_name[:-4])
-                if os.path.exists(extract_folder):
-                    self.progress.emit(f"{file_name} already extracted.")
-                else:
-                    self.progress.emit(f"Extracting {file_name}...")
-                    try:
-                        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                            zip_ref.extractall(extract_folder)
-                        self.progress.emit(f"Extracted {file_name} to {extract_folder}")
-                    except Exception as e:
-                        self.progress.emit(f"Error extracting {file_name}: {e}")
+        failed = download_dependencies(self.dependencies, self.download_folder, self.progress.emit,
+                                       should_continue=lambda: self._is_running)
+        if not self._is_running:
+            self.progress.emit("Download cancelled.")
+        elif failed:
+            self.progress.emit(f"Failed: {', '.join(failed)}")
+        self.finished.emit()
+
+# Worker for the dry run: counts the work of each stage without running any tool
+class PlanWorker(QObject):
+    progress = pyqtSignal(str)
+    finished = pyqtSignal()
+    
+    def __init__(self, settings):
+        super().__init__()
+        self.settings = settings
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            start = time.perf_counter()
+            for line in format_plan(plan_run(self.settings)):
+                self.progress.emit(line)
+            self.progress.emit(f"Planned in {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            self.progress.emit(f"Error while planning: {e}")
         self.finished.emit()
 
 # Main GUI Window with a single user-input field: UnpackedData
@@ -364,15 +621,52 @@ class MainWindow(QMainWindow):
         self.unpacked_data_edit.setText(get_config("folder_unpacked_data", ""))
         self.add_browse_button(form_layout, "Path to UnpackedData:", self.unpacked_data_edit)
         
+        self.bank_filter_edit = QLineEdit(", ".join(get_config("filter_banks") or []))
+        self.bank_filter_edit.setPlaceholderText("Comma separated name patterns, e.g. VO_*; empty for all banks")
+        form_layout.addRow("Only banks:", self.bank_filter_edit)
+        
         self.convert_checkbox = QCheckBox("Convert sound files")
         self.decode_checkbox = QCheckBox("Decode banks")
         self.group_checkbox = QCheckBox("Group files by bank")
         self.rename_checkbox = QCheckBox("Rename files")
+        self.export_checkbox = QCheckBox("Export one archive per bank (to BankArchives)")
+        self.store_checkbox = QCheckBox("Use audio store (build grouped/renamed folders as links)")
+        self.store_checkbox.setChecked(get_config("use_audio_store", False))
         
         layout.addWidget(self.convert_checkbox)
         layout.addWidget(self.decode_checkbox)
         layout.addWidget(self.group_checkbox)
         layout.addWidget(self.rename_checkbox)
+        layout.addWidget(self.export_checkbox)
+        layout.addWidget(self.store_checkbox)
+        
+        workers_layout = QHBoxLayout()
+        self.workers_spinner = QSpinBox()
+        self.workers_spinner.setMinimum(1)
+        self.workers_spinner.setMaximum(64)
+        self.workers_spinner.setValue(get_config("max_workers", DEFAULT_MAX_WORKERS))
+        self.adaptive_checkbox = QCheckBox("Adapt to throughput (spinner is the maximum)")
+        self.adaptive_checkbox.setChecked(get_config("adaptive_workers", False))
+        workers_layout.addWidget(QLabel("Parallel jobs:"))
+        workers_layout.addWidget(self.workers_spinner)
+        workers_layout.addWidget(self.adaptive_checkbox)
+        layout.addLayout(workers_layout)
+        
+        self.skip_duplicates_checkbox = QCheckBox("Skip silent and duplicate sounds (needs fingerprints.json)")
+        self.skip_duplicates_checkbox.setChecked(get_config("skip_duplicates", False))
+        layout.addWidget(self.skip_duplicates_checkbox)
+        
+        self.largest_first_checkbox = QCheckBox("Process largest files first")
+        self.largest_first_checkbox.setChecked(get_config("largest_first", True))
+        layout.addWidget(self.largest_first_checkbox)
+        
+        self.batch_checkbox = QCheckBox("Convert in batches (many files per vgmstream-cli run)")
+        self.batch_checkbox.setChecked(get_config("batch_convert", True))
+        layout.addWidget(self.batch_checkbox)
+        
+        self.profile_checkbox = QCheckBox("Profile this run (CPU and memory reports in Profiles)")
+        self.profile_checkbox.setChecked(get_config("profile_run", False))
+        layout.addWidget(self.profile_checkbox)
         
         btn_layout = QHBoxLayout()
         self.start_button = QPushButton("Start Processing")
@@ -380,6 +674,12 @@ class MainWindow(QMainWindow):
         self.start_button.clicked.connect(self.start_processing)
         btn_layout.addWidget(self.start_button)
         
+        self.plan_button = QPushButton("Dry Run")
+        self.plan_button.setIcon(qta.icon('fa5s.list', color='#9C27B0'))
+        self.plan_button.setToolTip("Show the files, bytes and estimated time of each stage without processing")
+        self.plan_button.clicked.connect(self.plan_processing)
+        btn_layout.addWidget(self.plan_button)
+        
         self.stop_button = QPushButton("Stop")
         self.stop_button.setIcon(qta.icon('fa5s.stop', color='#F44336'))
         self.stop_button.setEnabled(False)
@@ -427,9 +727,14 @@ class MainWindow(QMainWindow):
                 save_config()
         
     def check_dependencies(self):
+        # Locate the tools once; their versions are cached until the files change
+        tools = {tool: tool_registry.probe(tool) for tool in ("wwiser", "vgmstream", "wwnames")}
+        for tool, info in tools.items():
+            if info:
+                self.log_text.append(f"Found {tool} {info['version']} at {info['path']}")
+        
         # Check for decoding dependency (wwiser.pyz)
-        wwiser_path = os.path.join(os.getcwd(), "dependencies", "wwiser.pyz")
-        if not os.path.exists(wwiser_path):
+        if tools["wwiser"] is None:
             self.decode_checkbox.setEnabled(False)
             self.group_checkbox.setEnabled(False)
             self.decode_checkbox.setToolTip("Requires wwiser.pyz dependency")
@@ -452,20 +757,23 @@ class MainWindow(QMainWindow):
             self.download_button.setText("Dependencies already downloaded")
             self.download_button.setEnabled(False)
         
-    def start_processing(self):
-        self.start_button.setEnabled(False)
-        self.stop_button.setEnabled(True)
-        self.progress_bar.setVisible(True)
-        self.log_text.clear()
-        
+    def build_settings(self):
         # Save the current unpacked data path to config
         set_config("folder_unpacked_data", self.unpacked_data_edit.text())
+        set_config("use_audio_store", self.store_checkbox.isChecked())
+        set_config("max_workers", self.workers_spinner.value())
+        set_config("adaptive_workers", self.adaptive_checkbox.isChecked())
+        set_config("largest_first", self.largest_first_checkbox.isChecked())
+        set_config("skip_duplicates", self.skip_duplicates_checkbox.isChecked())
+        set_config("batch_convert", self.batch_checkbox.isChecked())
+        set_config("profile_run", self.profile_checkbox.isChecked())
+        set_config("filter_banks", [pattern.strip() for pattern in self.bank_filter_edit.text().split(",") if pattern.strip()])
         save_config()
         
         # Build settings using the configuration manager
         settings = {
             "folder_unpacked_data": get_config("folder_unpacked_data"),
-            "wwiser_pyz": get_config("wwiser_pyz"),
+            "wwiser_pyz": find_tool("wwiser") or get_config("wwiser_pyz"),
             "folder_vgmstream": get_config("folder_vgmstream"),
             "folder_audio_converted": get_config("folder_audio_converted"),
             "folder_banks_converted": get_config("folder_banks_converted"),
@@ -474,7 +782,37 @@ class MainWindow(QMainWindow):
             "should_decode_banks": self.decode_checkbox.isChecked(),
             "should_group": self.group_checkbox.isChecked(),
             "should_rename": self.rename_checkbox.isChecked(),
+            "should_export": self.export_checkbox.isChecked(),
+            "use_audio_store": self.store_checkbox.isChecked(),
+            "folder_audio_store": get_config("folder_audio_store"),
+            "max_workers": self.workers_spinner.value(),
+            "adaptive_workers": self.adaptive_checkbox.isChecked(),
+            "largest_first": self.largest_first_checkbox.isChecked(),
+            "skip_duplicates": self.skip_duplicates_checkbox.isChecked(),
+            "batch_convert": self.batch_checkbox.isChecked(),
+            "batch_max_files": get_config("batch_max_files"),
+            "batch_max_mb": get_config("batch_max_mb"),
+            "skip_near_duplicates": get_config("skip_near_duplicates", False),
+            "fingerprint_index": get_config("fingerprint_index"),
+            "throughput_history": get_config("throughput_history"),
+            "profile": self.profile_checkbox.isChecked(),
+            "decode_timeout": get_config("decode_timeout"),
+            "convert_timeout": get_config("convert_timeout"),
+            "xml_compression": get_config("xml_compression", "none"),
+            "folder_bank_archives": get_config("folder_bank_archives"),
+            "archive_format": get_config("archive_format", "zip"),
+            "bank_dictionary": get_config("output_json"),
+            **config_filter_settings(),
         }
+        return settings
+        
+    def start_processing(self):
+        self.start_button.setEnabled(False)
+        self.plan_button.setEnabled(False)
+        self.stop_button.setEnabled(True)
+        self.progress_bar.setVisible(True)
+        self.log_text.clear()
+        settings = self.build_settings()
         
         self.thread = QThread()
         self.worker = Worker(settings)
@@ -489,6 +827,25 @@ class MainWindow(QMainWindow):
         
         self.thread.start()
         
+    def plan_processing(self):
+        self.start_button.setEnabled(False)
+        self.plan_button.setEnabled(False)
+        self.log_text.clear()
+        self.log_text.append("Dry run: nothing is converted or moved")
+        
+        self.plan_thread = QThread()
+        self.plan_worker = PlanWorker(self.build_settings())
+        self.plan_worker.moveToThread(self.plan_thread)
+        
+        self.plan_thread.started.connect(self.plan_worker.run)
+        self.plan_worker.progress.connect(self.report_progress)
+        self.plan_worker.finished.connect(self.plan_finished)
+        self.plan_worker.finished.connect(self.plan_thread.quit)
+        self.plan_worker.finished.connect(self.plan_worker.deleteLater)
+        self.plan_thread.finished.connect(self.plan_thread.deleteLater)
+        
+        self.plan_thread.start()
+        
     def stop_processing(self):
         if hasattr(self, "worker"):
             self.worker.stop()
@@ -529,14 +886,110 @@ class MainWindow(QMainWindow):
         self.log_text.append("Processing complete.")
         self.progress_bar.setVisible(False)
         self.start_button.setEnabled(True)
+        self.plan_button.setEnabled(True)
         self.stop_button.setEnabled(False)
         
+    @pyqtSlot()
+    def plan_finished(self):
+        self.start_button.setEnabled(True)
+        self.plan_button.setEnabled(True)
+        
     @pyqtSlot()
     def download_finished(self):
         self.log_text.append("Dependency download and extraction complete.")
         self.download_button.setEnabled(True)
 
+def watch_changes(settings, state_path, interval, dictionary_path=None):
+    """Run the enabled stages on every batch of changed banks and sounds until interrupted"""
+    # Saved filters still apply; each batch narrows them down to the changed files
+    user_filter = SoundFilter.from_settings(settings)
+    print("Reading decoded banks...")
+    bank_index = BankSoundIndex(settings.get("folder_banks_converted", ""))
+    for category in ("Shared", "SharedDev"):
+        user_filter.load_bank_sounds(os.path.join(settings.get("folder_banks_converted", ""), category), category)
+    # Files processed with another wwiser or vgmstream version are processed again
+    tools = {"wwiser": tool_registry.probe("wwiser", settings.get("wwiser_pyz")),
+             "vgmstream": tool_registry.probe("vgmstream", settings.get("folder_vgmstream"))}
+    watcher = ChangeWatcher(settings["folder_unpacked_data"], state_path, interval, log=print,
+                            tools={tool: cache_tag(info["version"]) for tool, info in tools.items() if info})
+    worker = None
+    
+    def handle(changed, removed):
+        nonlocal worker
+        banks = [path for path in changed
+                 if path.lower().endswith(".bnk") and user_filter.wants_bank(category_of(path), path)]
+        wems = [path for path in changed
+                if path.lower().endswith(".wem") and user_filter.wants_sound(category_of(path), path)]
+        removed_banks = [path for path in removed if path.lower().endswith(".bnk")]
+        if removed:
+            print(f"{len(removed)} files were removed; their converted files are kept")
+        if banks or wems:
+            sound_ids = {os.path.basename(wem).split(".")[0] for wem in wems}
+            # Changed sounds are regrouped into the banks that use them
+            bank_names = {bank_name_of(bank) for bank in banks} | bank_index.banks_using(sound_ids)
+            worker = Worker(dict(settings, filter_banks=[], filter_wiki_pages=[], filter_ids_file="",
+                                 filter_ids=sorted(bank_names | sound_ids)))
+            worker.progress.connect(print)
+            worker.run()
+            if worker.error:
+                raise RuntimeError(worker.error)
+            bank_index.refresh(bank_name_of(bank) for bank in banks)
+        if dictionary_path and os.path.exists(dictionary_path) and (banks or removed_banks):
+            from app2 import update_dictionary_file
+            counts = update_dictionary_file(dictionary_path, settings["folder_unpacked_data"],
+                                            settings["wwiser_pyz"], banks, removed_banks,
+                                            get_config("xml_output_folder") or None)
+            print(f"Updated {counts['updated']} and removed {counts['removed']} banks in {dictionary_path}")
+        # Files that failed to decode or convert are handed over again with the next batch
+        failed = {os.path.normpath(path) for path in worker.failed} if worker is not None and (banks or wems) else set()
+        return [path for path in changed if os.path.normpath(path) in failed]
+    
+    try:
+        watcher.watch(handle)
+    except KeyboardInterrupt:
+        # The tools run in their own process groups, so Ctrl+C does not reach them
+        if worker is not None:
+            worker.stop()
+        print("Stopped watching")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BG3 Sound Categoriser")
+    parser.add_argument("--headless", action="store_true",
+                        help="Run the stages with the saved settings, without opening the window")
+    parser.add_argument("--stages", default="decode,convert",
+                        help=f"Comma separated stages for --headless ({', '.join(STAGES)})")
+    parser.add_argument("--shard", default=None, help="Only process shard i of N, e.g. 2/4")
+    parser.add_argument("--dry-run", action="store_true", help="With --headless, only print the plan")
+    parser.add_argument("--profile", action="store_true", help="With --headless, write CPU and memory profiles")
+    parser.add_argument("--watch", action="store_true",
+                        help="With --headless, keep running and process only the banks and sounds that change")
+    parser.add_argument("--interval", type=float, default=get_config("watch_interval", 10),
+                        help="Seconds between checks in --watch mode")
+    parser.add_argument("--dictionary", default=get_config("output_json"),
+                        help="Bank dictionary to update in --watch mode, if it exists")
+    add_filter_arguments(parser)
+    args = parser.parse_args()
+    
+    if args.headless:
+        stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+        settings = settings_from_config(stages, shard=args.shard, profile=args.profile or None,
+                                        **filter_settings_from_args(args))
+        if args.dry_run:
+            for line in format_plan(plan_run(settings)):
+                print(line)
+            sys.exit(0)
+        if args.watch:
+            watch_changes(settings, get_config("watch_state"), args.interval, args.dictionary)
+            sys.exit(0)
+        worker = Worker(settings)
+        # Without an event loop the signals are delivered directly
+        worker.progress.connect(print)
+        worker.run()
+        sys.exit(0)
+    
     app = QApplication([])
     # Apply a dark mode style sheet
     app.setStyleSheet("""
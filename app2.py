@@ -6,14 +6,25 @@ A PyQt6 GUI application for listing WEM files by sound banks from decoded BNK fi
 import os
 import sys
 import json
-import subprocess
+import shutil
+import tempfile
+import argparse
 import xml.etree.ElementTree as ET
 from pathlib import Path
 from config_manager import get_config, set_config, save_config, load_config
+from sound_scanner import SoundScanner, CategoryMatcher, find_category_roots
+from adaptive_pool import AdaptiveConcurrency, StageProgress, run_adaptive, largest_first as sort_largest_first
+from tool_registry import find_tool
+from dictionary_writer import DictionaryWriter
+from name_resolver import load_name_resolver, enrich_bank
+from sharding import Shard, parse_shard, write_shard_record
+from sound_filter import SoundFilter, config_filter_settings, add_filter_arguments, filter_settings_from_args, bank_name_of
+from sound_mappings import compress_bank_xml, open_bank_xml, check_xml_compression, XML_COMPRESSION_SUFFIXES
+from profiling import RunProfiler
+from process_runner import ProcessRunner, process_runner, python_command, DEFAULT_DECODE_TIMEOUT
 import re
 import logging
-from concurrent.futures import ThreadPoolExecutor
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, List, Optional, Any, Tuple, Iterator, Iterable, Callable
 
 # PyQt6 imports
 from PyQt6.QtWidgets import (
@@ -36,6 +47,9 @@ logger = logging.getLogger(__name__)
 class BankProcessingWorker(QThread):
     """Worker thread for processing BNK files"""
     progress_update = pyqtSignal(int, int, str)
+    # Category, bank name and number of sound files, once per finished bank
+    bank_finished = pyqtSignal(str, str, int)
+    # Summary with the bank and sound counts and the path of the written dictionary
     finished = pyqtSignal(dict)
     error = pyqtSignal(str)
     log_message = pyqtSignal(str)
@@ -43,21 +57,39 @@ class BankProcessingWorker(QThread):
     def __init__(self, 
                  unpacked_data_folder: str, 
                  wwiser_pyz_path: str, 
+                 output_path: str,
                  output_folder: Optional[str] = None,
                  shared_only: bool = False,
                  shareddev_only: bool = False,
-                 num_threads: int = 4):
+                 num_threads: int = 4,
+                 adaptive: bool = False,
+                 largest_first: bool = False,
+                 category_priority: Optional[List[str]] = None,
+                 profile: bool = False,
+                 sound_filter: Optional[SoundFilter] = None):
         super().__init__()
+        self.output_path = output_path
         self.unpacked_data_folder = unpacked_data_folder
         self.wwiser_pyz_path = wwiser_pyz_path
         self.output_folder = output_folder
         self.shared_only = shared_only
         self.shareddev_only = shareddev_only
         self.num_threads = num_threads
+        self.adaptive = adaptive
+        self.largest_first = largest_first
+        self.category_priority = category_priority
+        self.profile = profile
+        self.sound_filter = sound_filter
         self.is_cancelled = False
+        # Runs wwiser; cancel() kills the decodes still running
+        self.runner = ProcessRunner()
     
     def run(self):
         """Main method that runs in the thread"""
+        # Optional cProfile/tracemalloc reports of the bank stage and the final write
+        profiler = RunProfiler("app2", self.profile, log=self.log_message.emit)
+        profiler.start()
+        writer = None
         try:
             # Check dependencies
             if not check_dependencies(self.wwiser_pyz_path):
@@ -65,55 +97,73 @@ class BankProcessingWorker(QThread):
                 return
                 
             self.log_message.emit("Finding BNK files...")
-            # Find all BNK files
-            bnk_files = find_bnk_files(self.unpacked_data_folder, self.shared_only, self.shareddev_only)
+            if self.sound_filter is not None and self.sound_filter.active:
+                self.log_message.emit(f"Filter: {self.sound_filter.describe()}")
             
-            # Initialize result dictionary
-            all_banks = {}
+            # Banks are written out as they finish; only placeholders and counts stay in memory
+            discovered = {}
+            writer = DictionaryWriter(self.output_path)
+            processed_files = 0
             
-            # Count total files for progress tracking
-            total_files = sum(len(files) for files in bnk_files.values())
-            self.log_message.emit(f"Found {total_files} BNK files to process")
+            # Readable Wwise names for bank and sound IDs, if wwnames.db3 is available
+            resolver = load_name_resolver()
+            if resolver is not None:
+                self.log_message.emit(f"Loaded {len(resolver)} names from wwnames.db3")
             
-            if total_files == 0:
-                self.error.emit("No BNK files found in the specified location")
+            scanner = SoundScanner(extensions=(".bnk",))
+            with profiler.stage("banks"):
+                for folder, bank_name, bank_info in iter_bnk_results(
+                        self.unpacked_data_folder, self.wwiser_pyz_path, self.output_folder,
+                        self.shared_only, self.shareddev_only, self.num_threads, self.adaptive,
+                        self.largest_first, self.category_priority, discovered=discovered, scanner=scanner,
+                        should_continue=lambda: not self.is_cancelled, log=self.log_message.emit,
+                        profiler=profiler, runner=self.runner,
+                        timeout=get_config("decode_timeout", DEFAULT_DECODE_TIMEOUT),
+                        sound_filter=self.sound_filter,
+                        compression=get_config("xml_compression", "none")):
+                    if resolver is not None:
+                        enrich_bank(bank_info, resolver)
+                    writer.add(folder, bank_name, bank_info)
+                    self.bank_finished.emit(folder, bank_name, len(bank_info["sound_files"]))
+                    
+                    # Update progress; the total grows until the scan has finished
+                    processed_files += 1
+                    total_files = sum(len(banks) for banks in discovered.values())
+                    self.progress_update.emit(processed_files, total_files, bank_name)
+            
+            if self.is_cancelled:
+                writer.discard()
+                self.log_message.emit("Processing cancelled")
                 return
-                
-            processed_files = 0
             
-            # Process each folder (Shared, SharedDev)
-            for folder, files in bnk_files.items():
-                self.log_message.emit(f"Processing {len(files)} BNK files in {folder}...")
-                all_banks[folder] = {}
-                
-                # Prepare tasks for thread pool
-                tasks = []
-                for bnk_file in files:
-                    bank_name = os.path.basename(bnk_file).replace(".bnk", "")
-                    tasks.append((self.wwiser_pyz_path, bnk_file, bank_name, self.output_folder))
-                
-                # Process files in parallel
-                with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
-                    for bank_name, bank_info in executor.map(process_bnk_file, tasks):
-                        if self.is_cancelled:
-                            self.log_message.emit("Processing cancelled")
-                            return
-                            
-                        all_banks[folder][bank_name] = bank_info
-                        
-                        # Update progress
-                        processed_files += 1
-                        completion_percentage = int((processed_files / total_files) * 100)
-                        self.progress_update.emit(processed_files, total_files, bank_name)
+            self.log_message.emit(scanner.rate_message())
+            for line in self.runner.summary():
+                self.log_message.emit(line)
+            if processed_files == 0:
+                writer.discard()
+                self.error.emit("No BNK files found in the specified location")
+                return
             
-            self.finished.emit(all_banks)
+            with profiler.stage("write"):
+                writer.close(discovered)
+            self.finished.emit({
+                "banks": writer.bank_count,
+                "sounds": writer.sound_count,
+                "output_path": self.output_path,
+            })
             
         except Exception as e:
+            # Remove the spools of the banks written so far; a no-op after close()
+            if writer is not None:
+                writer.discard()
             self.error.emit(f"Error processing banks: {str(e)}")
+        finally:
+            profiler.finish()
     
     def cancel(self):
         """Cancel the processing"""
         self.is_cancelled = True
+        self.runner.cancel()
 
 def check_dependencies(wwiser_path: str) -> bool:
     """Check if required dependencies are available."""
@@ -122,7 +172,12 @@ def check_dependencies(wwiser_path: str) -> bool:
         return False
     return True
 
-def decode_bnk_file(wwiser_pyz_path: str, bnk_file_path: str, output_folder: Optional[str] = None) -> Optional[str]:
+def decode_bnk_file(wwiser_pyz_path: str,
+                    bnk_file_path: str,
+                    output_folder: Optional[str] = None,
+                    runner: Optional[ProcessRunner] = None,
+                    timeout: float = DEFAULT_DECODE_TIMEOUT,
+                    compression: str = "none") -> Optional[str]:
     """
     Decode a single BNK file to XML using wwiser.pyz
     
@@ -130,9 +185,12 @@ def decode_bnk_file(wwiser_pyz_path: str, bnk_file_path: str, output_folder: Opt
         wwiser_pyz_path: Path to the wwiser.pyz file
         bnk_file_path: Path to the BNK file to decode
         output_folder: Optional folder for output, if None uses same directory as BNK
+        runner: ProcessRunner to run wwiser with (default: the shared one)
+        timeout: Seconds before wwiser is killed
+        compression: Keep the XML as is ("none") or compressed ("gzip", "zstd")
         
     Returns:
-        Path to the generated XML file or None if decoding failed
+        Path to the generated (possibly compressed) XML file or None if decoding failed
     """
     try:
         # Determine output path
@@ -143,11 +201,13 @@ def decode_bnk_file(wwiser_pyz_path: str, bnk_file_path: str, output_folder: Opt
             xml_path = os.path.join(output_folder, f"{os.path.basename(bnk_file_path)}.xml")
         
         # Call wwiser.pyz to decode the BNK file
-        cmd = [sys.executable, wwiser_pyz_path, "decode", bnk_file_path, "-o", xml_path]
-        process = subprocess.run(cmd, capture_output=True, text=True)
+        cmd = [python_command(), wwiser_pyz_path, "decode", bnk_file_path, "-o", xml_path]
+        result = (runner or process_runner).run(cmd, timeout=timeout, name="wwiser", job=bnk_file_path)
         
-        if process.returncode != 0:
-            logger.error(f"Failed to decode {bnk_file_path}: {process.stderr}")
+        if result.cancelled:
+            return None
+        if not result.ok:
+            logger.error(f"Failed to decode {bnk_file_path}: {result.describe()}")
             return None
         
         # Check if the XML file was created
@@ -155,7 +215,7 @@ def decode_bnk_file(wwiser_pyz_path: str, bnk_file_path: str, output_folder: Opt
             logger.error(f"XML file not created: {xml_path}")
             return None
         
-        return xml_path
+        return compress_bank_xml(xml_path, compression)
     
     except Exception as e:
         logger.error(f"Error decoding {bnk_file_path}: {str(e)}")
@@ -165,6 +225,11 @@ def parse_bnk_xml(xml_path: str) -> Dict[str, Any]:
     """
     Parse an XML file to extract sound IDs and other metadata
     
+    The XML is read as a stream (decompressing .gz/.zst files on the fly).
+    Each element is cleared once it is handled, or right away if it is not
+    needed, so only emptied elements of the sections still open are kept
+    and memory does not grow with the size of the HIRC section.
+    
     Args:
         xml_path: Path to the XML file to parse
         
@@ -172,42 +237,102 @@ def parse_bnk_xml(xml_path: str) -> Dict[str, Any]:
         Dictionary with the bank's information
     """
     try:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-        
-        bank_name = os.path.basename(xml_path).replace(".bnk.xml", "")
+        bank_name = bank_name_of(xml_path)
         bank_info = {
             "name": bank_name,
             "sound_files": {}
         }
+        # Source paths of media sources, applied once all embedded files are known
+        source_paths = []
+        sfx_depth = 0
+        # Children of an open MediaSource are kept until it is handled
+        media_depth = 0
         
-        # Find all embedded wem files
-        for sound_sfx in root.findall(".//SoundSFX"):
-            for embedded_file in sound_sfx.findall(".//EmbeddedFile"):
-                file_id = embedded_file.get("ID")
-                if file_id:
-                    wem_filename = f"{file_id}.wem"
-                    bank_info["sound_files"][file_id] = {
-                        "wem_filename": wem_filename,
-                        "wav_filename": f"{wem_filename}.wav"
-                    }
-        
-        # Look for additional metadata like sound paths or references
-        for media_source in root.findall(".//MediaSource"):
-            source_id = media_source.get("ID")
-            if source_id and source_id in bank_info["sound_files"]:
-                source_info = bank_info["sound_files"][source_id]
-                
-                # Extract any additional metadata (file path, etc.)
-                source_file = media_source.find("SourceFile")
-                if source_file is not None and source_file.text:
-                    source_info["source_path"] = source_file.text
+        with open_bank_xml(xml_path) as xml_file:
+            for event, element in ET.iterparse(xml_file, events=("start", "end")):
+                if event == "start":
+                    if element.tag == "SoundSFX":
+                        sfx_depth += 1
+                    elif element.tag == "MediaSource":
+                        media_depth += 1
+                    continue
+                if element.tag == "SoundSFX":
+                    sfx_depth -= 1
+                elif element.tag == "EmbeddedFile" and sfx_depth > 0:
+                    # Embedded wem files of sound objects
+                    file_id = element.get("ID")
+                    if file_id:
+                        wem_filename = f"{file_id}.wem"
+                        bank_info["sound_files"][file_id] = {
+                            "wem_filename": wem_filename,
+                            "wav_filename": f"{wem_filename}.wav"
+                        }
+                elif element.tag == "MediaSource":
+                    media_depth -= 1
+                    # Additional metadata like the source file path
+                    source_file = element.find("SourceFile")
+                    if element.get("ID") and source_file is not None and source_file.text:
+                        source_paths.append((element.get("ID"), source_file.text))
+                if media_depth == 0:
+                    element.clear()
+        
+        for source_id, source_path in source_paths:
+            if source_id in bank_info["sound_files"]:
+                bank_info["sound_files"][source_id]["source_path"] = source_path
         
         return bank_info
     
     except Exception as e:
         logger.error(f"Error parsing XML {xml_path}: {str(e)}")
-        return {"name": os.path.basename(xml_path).replace(".bnk.xml", ""), "sound_files": {}}
+        return {"name": bank_name_of(xml_path), "sound_files": {}}
+
+def stream_bnk_files(unpacked_data_folder: str,
+                     shared_only: bool = False,
+                     shareddev_only: bool = False,
+                     scanner: Optional[SoundScanner] = None,
+                     sound_filter: Optional[SoundFilter] = None) -> Iterator[Tuple[str, str]]:
+    """
+    Yield BNK files as the parallel scan finds them, with their category
+    
+    Args:
+        unpacked_data_folder: Path to the UnpackedData folder
+        shared_only: Process only Shared folder (if found)
+        shareddev_only: Process only SharedDev folder (if found)
+        scanner: Optional scanner, to read the scan statistics afterwards
+        sound_filter: Optional filter; banks it does not select are left out
+        
+    Yields:
+        Tuples of (category, bnk file path); category is "Shared", "SharedDev" or "Other"
+    """
+    logger.info(f"Searching for BNK files in {unpacked_data_folder} (including all subdirectories)...")
+    roots = find_category_roots(unpacked_data_folder)
+    if roots["Shared"] and not shareddev_only:
+        logger.info(f"Found Shared folder at {roots['Shared']}")
+    if roots["SharedDev"] and not shared_only:
+        logger.info(f"Found SharedDev folder at {roots['SharedDev']}")
+    
+    # Categorize by the longest matching folder prefix, so SharedDev banks
+    # are never mistaken for Shared ones
+    matcher = CategoryMatcher(roots)
+    excluded = set()
+    if shared_only:
+        excluded.add("SharedDev")
+    if shareddev_only:
+        excluded.add("Shared")
+    
+    # Crawl the sound subtrees concurrently and categorize BNK files
+    if scanner is None:
+        scanner = SoundScanner(extensions=(".bnk",))
+    for file_path in scanner.scan_parallel(unpacked_data_folder):
+        category = matcher.categorize(file_path)
+        if category in excluded:
+            continue
+        # If we can't categorize, put in Other
+        category = category or "Other"
+        if sound_filter is not None and not sound_filter.wants_bank(category, file_path):
+            continue
+        yield (category, file_path)
+    logger.info(scanner.rate_message())
 
 def find_bnk_files(unpacked_data_folder: str, shared_only: bool = False, shareddev_only: bool = False) -> Dict[str, List[str]]:
     """
@@ -221,65 +346,10 @@ def find_bnk_files(unpacked_data_folder: str, shared_only: bool = False, sharedd
     Returns:
         Dictionary with folder names as keys and lists of BNK file paths as values
     """
-    bnk_files = {"Other": []}  # Default category for BNK files not in Shared or SharedDev
-
-    # Walk through all directories starting from the unpacked_data_folder
-    logger.info(f"Searching for BNK files in {unpacked_data_folder} (including all subdirectories)...")
-    
-    # Check if specific paths exist for Shared and SharedDev
-    shared_path = None
-    shared_dev_path = None
-    
-    # Try different possible folder structures
-    possible_shared_paths = [
-        os.path.join(unpacked_data_folder, "Public", "Shared"),
-        os.path.join(unpacked_data_folder, "Shared"),
-        os.path.join(unpacked_data_folder, "Data", "Public", "Shared"),
-        os.path.join(unpacked_data_folder, "SharedSoundBanks", "Public", "Shared")
-    ]
-    
-    possible_shared_dev_paths = [
-        os.path.join(unpacked_data_folder, "Public", "SharedDev"),
-        os.path.join(unpacked_data_folder, "SharedDev"),
-        os.path.join(unpacked_data_folder, "Data", "Public", "SharedDev"),
-        os.path.join(unpacked_data_folder, "SharedSoundBanks", "Public", "SharedDev")
-    ]
-    
-    # Find the first valid path for Shared
-    for path in possible_shared_paths:
-        if os.path.exists(path):
-            shared_path = path
-            break
-    
-    # Find the first valid path for SharedDev
-    for path in possible_shared_dev_paths:
-        if os.path.exists(path):
-            shared_dev_path = path
-            break
-    
-    # Initialize the dictionaries for Shared and SharedDev
-    if shared_path and not shareddev_only:
-        bnk_files["Shared"] = []
-        logger.info(f"Found Shared folder at {shared_path}")
-    
-    if shared_dev_path and not shared_only:
-        bnk_files["SharedDev"] = []
-        logger.info(f"Found SharedDev folder at {shared_dev_path}")
-    
-    # Walk through all directories and categorize BNK files
-    for root, _, files in os.walk(unpacked_data_folder):
-        for file in files:
-            if file.lower().endswith(".bnk"):
-                file_path = os.path.join(root, file)
-                
-                # Categorize based on path
-                if shared_path and not shareddev_only and shared_path in root:
-                    bnk_files["Shared"].append(file_path)
-                elif shared_dev_path and not shared_only and shared_dev_path in root:
-                    bnk_files["SharedDev"].append(file_path)
-                else:
-                    # If we can't categorize, put in Other
-                    bnk_files["Other"].append(file_path)
+    # Default category for BNK files not in Shared or SharedDev comes first
+    bnk_files = {"Other": [], "Shared": [], "SharedDev": []}
+    for category, file_path in stream_bnk_files(unpacked_data_folder, shared_only, shareddev_only):
+        bnk_files[category].append(file_path)
     
     # Remove empty categories
     for category in list(bnk_files.keys()):
@@ -287,7 +357,6 @@ def find_bnk_files(unpacked_data_folder: str, shared_only: bool = False, sharedd
             del bnk_files[category]
             
     # Count found files
-    total_files = sum(len(files) for files in bnk_files.values())
     for category, files in bnk_files.items():
         logger.info(f"Found {len(files)} BNK files in category '{category}'")
     
@@ -295,22 +364,175 @@ def find_bnk_files(unpacked_data_folder: str, shared_only: bool = False, sharedd
 
 
 
-def process_bnk_file(args: Tuple[str, str, str, Optional[str]]) -> Tuple[str, Dict[str, Any]]:
+def decode_bank_info(args: Tuple[str, str, str, Optional[str]],
+                     runner: Optional[ProcessRunner] = None,
+                     timeout: float = DEFAULT_DECODE_TIMEOUT,
+                     compression: str = "none") -> Optional[Dict[str, Any]]:
     """
-    Process a single BNK file
+    Decode and parse a single BNK file
     
     Args:
         args: Tuple containing (wwiser_path, bnk_file, bank_name, output_folder)
+        runner: ProcessRunner to run wwiser with (default: the shared one)
+        timeout: Seconds before wwiser is killed
+        compression: How the decoded XML is kept ("none", "gzip" or "zstd")
         
     Returns:
-        Tuple of (bank_name, bank_info)
+        The bank's information, or None if decoding failed or was cancelled
     """
     wwiser_path, bnk_file, bank_name, output_folder = args
-    xml_path = decode_bnk_file(wwiser_path, bnk_file, output_folder)
+    xml_path = decode_bnk_file(wwiser_path, bnk_file, output_folder, runner, timeout, compression)
     if xml_path:
-        bank_info = parse_bnk_xml(xml_path)
-        return (bank_name, bank_info)
-    return (bank_name, {"name": bank_name, "sound_files": {}})
+        return parse_bnk_xml(xml_path)
+    return None
+
+def process_bnk_file(args: Tuple[str, str, str, Optional[str]],
+                     runner: Optional[ProcessRunner] = None,
+                     timeout: float = DEFAULT_DECODE_TIMEOUT,
+                     compression: str = "none") -> Tuple[str, Dict[str, Any]]:
+    """
+    Process a single BNK file
+    
+    Args:
+        args: Tuple containing (wwiser_path, bnk_file, bank_name, output_folder)
+        runner: ProcessRunner to run wwiser with (default: the shared one)
+        timeout: Seconds before wwiser is killed
+        compression: How the decoded XML is kept ("none", "gzip" or "zstd")
+        
+    Returns:
+        Tuple of (bank_name, bank_info); a bank that failed to decode has no sound files
+    """
+    bank_name = args[2]
+    bank_info = decode_bank_info(args, runner, timeout, compression)
+    if bank_info is None:
+        bank_info = {"name": bank_name, "sound_files": {}}
+    return (bank_name, bank_info)
+
+def iter_bank_tasks(stream: Iterable[Tuple[str, str]],
+                    wwiser_pyz_path: str,
+                    output_folder: Optional[str],
+                    all_banks: Dict[str, Dict[str, Any]]) -> Iterator[Tuple[str, Tuple[str, str, str, Optional[str]]]]:
+    """
+    Turn streamed BNK files into process_bnk_file tasks
+    
+    Each bank gets a placeholder entry in all_banks as it is found, so the
+    dictionary keeps discovery order whatever order decoding finishes in.
+    
+    Args:
+        stream: Iterable of (category, bnk file path), e.g. from stream_bnk_files()
+        wwiser_pyz_path: Path to the wwiser.pyz file
+        output_folder: Optional folder for decoded files
+        all_banks: Result dictionary to reserve entries in
+        
+    Yields:
+        Tuples of (category, task) where task is the process_bnk_file argument
+    """
+    for folder, bnk_file in stream:
+        bank_name = os.path.basename(bnk_file).replace(".bnk", "")
+        all_banks.setdefault(folder, {})[bank_name] = None
+        yield (folder, (wwiser_pyz_path, bnk_file, bank_name, output_folder))
+
+def prioritize_bank_tasks(tasks: Iterable[Tuple[str, Tuple[str, str, str, Optional[str]]]],
+                          category_priority: Optional[List[str]] = None) -> List[Tuple[str, Tuple[str, str, str, Optional[str]]]]:
+    """
+    Order tasks from iter_bank_tasks() largest bank first
+    
+    Args:
+        tasks: Tuples of (category, task)
+        category_priority: Categories to decode first, in order
+        
+    Returns:
+        The tasks as a list, sorted by category priority and bank size
+    """
+    return sort_largest_first(tasks,
+                              path_of=lambda item: item[1][1],
+                              category_of=lambda item: item[0],
+                              category_priority=category_priority)
+
+def iter_bnk_results(
+    unpacked_data_folder: str,
+    wwiser_pyz_path: str,
+    output_folder: Optional[str] = None,
+    shared_only: bool = False,
+    shareddev_only: bool = False,
+    num_threads: int = 4,
+    adaptive: bool = False,
+    largest_first: bool = False,
+    category_priority: Optional[List[str]] = None,
+    discovered: Optional[Dict[str, Dict[str, Any]]] = None,
+    scanner: Optional[SoundScanner] = None,
+    should_continue: Optional[Callable[[], bool]] = None,
+    log: Optional[Callable[[str], None]] = None,
+    shard: Optional[Shard] = None,
+    profiler: Optional[RunProfiler] = None,
+    runner: Optional[ProcessRunner] = None,
+    timeout: float = DEFAULT_DECODE_TIMEOUT,
+    sound_filter: Optional[SoundFilter] = None,
+    compression: str = "none"
+) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+    """
+    Decode and parse all BNK files, yielding each bank as soon as it is done
+    
+    Args:
+        unpacked_data_folder: Path to the UnpackedData folder
+        wwiser_pyz_path: Path to the wwiser.pyz file
+        output_folder: Optional folder for decoded files
+        shared_only: Process only Shared folder
+        shareddev_only: Process only SharedDev folder
+        num_threads: Number of threads for parallel processing (the upper limit when adaptive)
+        adaptive: Tune the number of threads to the measured throughput
+        largest_first: Decode the largest banks first (waits for the scan to finish)
+        category_priority: Categories to decode first when largest_first is set
+        discovered: Optional dictionary receiving a None placeholder per bank
+            ({category: {bank name: None}}) in discovery order
+        scanner: Optional SoundScanner to use, e.g. to read its statistics afterwards
+        should_continue: Optional callback; when it returns False no new banks are started
+        log: Optional callback for status messages
+        shard: Optional shard; only the banks it owns are decoded
+        profiler: Optional run profiler; bank jobs are profiled on their threads
+        runner: ProcessRunner to run wwiser with (default: the shared one);
+            a runner of the run's own is cancelled when the run stops early
+        timeout: Seconds before wwiser is killed on one bank
+        sound_filter: Optional filter; only the banks it selects are decoded
+        compression: How the decoded XMLs are kept ("none", "gzip" or "zstd")
+        
+    Yields:
+        Tuples of (category, bank name, bank info) in completion order; banks
+        that failed to decode have no sound files, cancelled ones are left out
+    """
+    if discovered is None:
+        discovered = {}
+    if scanner is None:
+        scanner = SoundScanner(extensions=(".bnk",))
+    
+    # Decode banks as the scan finds them, so decoding overlaps the scan
+    stream = stream_bnk_files(unpacked_data_folder, shared_only, shareddev_only, scanner, sound_filter)
+    if shard is not None:
+        stream = ((category, path) for category, path in stream if shard.owns(category, path))
+    tasks = iter_bank_tasks(stream, wwiser_pyz_path, output_folder, discovered)
+    if largest_first:
+        # Sorting needs the whole scan, so decoding starts once it is done
+        tasks = prioritize_bank_tasks(tasks, category_priority)
+        if log is not None:
+            log(f"Found {len(tasks)} BNK files, starting with the largest")
+    controller = AdaptiveConcurrency("decode", max_workers=num_threads, adaptive=adaptive, log=log)
+    # Completed/running/failed counts and per-thread rates, logged every few seconds
+    progress = StageProgress("decode",
+                             failed=lambda bank_info: bank_info is None and not (runner is not None and runner.cancelled),
+                             total=lambda: sum(len(banks) for banks in discovered.values()), log=log)
+    job = lambda item: decode_bank_info(item[1], runner, timeout, compression)
+    if profiler is not None:
+        job = profiler.wrap(job)
+    # The shared runner is left alone; cancelling it would refuse every later job
+    cancel = runner.cancel if runner is not None else None
+    for (folder, task), bank_info in run_adaptive(
+            job, tasks, controller, should_continue=should_continue, cancel=cancel, progress=progress):
+        bank_name = task[2]
+        if bank_info is None:
+            if runner is not None and runner.cancelled:
+                continue
+            bank_info = {"name": bank_name, "sound_files": {}}
+        yield (folder, bank_name, bank_info)
 
 def build_bnk_dictionary(
     unpacked_data_folder: str, 
@@ -318,52 +540,45 @@ def build_bnk_dictionary(
     output_folder: Optional[str] = None,
     shared_only: bool = False,
     shareddev_only: bool = False,
-    num_threads: int = 4
+    num_threads: int = 4,
+    adaptive: bool = False,
+    largest_first: bool = False,
+    category_priority: Optional[List[str]] = None
 ) -> Dict[str, Dict[str, Any]]:
     """
     Process all BNK files and build a structured dictionary
     
+    The whole dictionary is kept in memory; use iter_bnk_results() with a
+    DictionaryWriter to write it bank by bank instead.
+    
     Args:
         unpacked_data_folder: Path to the UnpackedData folder
         wwiser_pyz_path: Path to the wwiser.pyz file
         output_folder: Optional folder for decoded files
         shared_only: Process only Shared folder
         shareddev_only: Process only SharedDev folder
-        num_threads: Number of threads for parallel processing
+        num_threads: Number of threads for parallel processing (the upper limit when adaptive)
+        adaptive: Tune the number of threads to the measured throughput
+        largest_first: Decode the largest banks first (waits for the scan to finish)
+        category_priority: Categories to decode first when largest_first is set
         
     Returns:
         Dictionary with all bank data
     """
-    # Find all BNK files
-    bnk_files = find_bnk_files(unpacked_data_folder, shared_only, shareddev_only)
-    
-    # Initialize result dictionary
+    # Initialize result dictionary; placeholders keep the discovery order
     all_banks = {}
-    
-    # Count total files for progress tracking
-    total_files = sum(len(files) for files in bnk_files.values())
     processed_files = 0
     
-    # Process each folder (Shared, SharedDev)
-    for folder, files in bnk_files.items():
-        logger.info(f"Processing {len(files)} BNK files in {folder}...")
-        all_banks[folder] = {}
-        
-        # Prepare tasks for thread pool
-        tasks = []
-        for bnk_file in files:
-            bank_name = os.path.basename(bnk_file).replace(".bnk", "")
-            tasks.append((wwiser_pyz_path, bnk_file, bank_name, output_folder))
-        
-        # Process files in parallel
-        with ThreadPoolExecutor(max_workers=num_threads) as executor:
-            for bank_name, bank_info in executor.map(process_bnk_file, tasks):
-                all_banks[folder][bank_name] = bank_info
-                
-                # Update progress
-                processed_files += 1
-                completion_percentage = (processed_files / total_files) * 100
-                logger.info(f"Progress: {processed_files}/{total_files} ({completion_percentage:.1f}%)")
+    for folder, bank_name, bank_info in iter_bnk_results(
+            unpacked_data_folder, wwiser_pyz_path, output_folder, shared_only, shareddev_only,
+            num_threads, adaptive, largest_first, category_priority, discovered=all_banks):
+        all_banks[folder][bank_name] = bank_info
+        
+        # Update progress; the total grows until the scan has finished
+        processed_files += 1
+        total_files = sum(len(banks) for banks in all_banks.values())
+        completion_percentage = (processed_files / total_files) * 100
+        logger.info(f"Progress: {processed_files}/{total_files} ({completion_percentage:.1f}%)")
     
     return all_banks
 
@@ -372,7 +587,10 @@ class BG3SoundsDictionaryApp(QMainWindow):
     
     def __init__(self):
         super().__init__()
-        self.all_banks = {}
+        # The dictionary itself is written to disk by the worker; only its path and counts are kept
+        self.result_path = None
+        self.bank_count = 0
+        self.sound_count = 0
         self.worker = None
         # Load saved configuration
         load_config()
@@ -431,7 +649,7 @@ class BG3SoundsDictionaryApp(QMainWindow):
         # Wwiser.pyz selection
         wwiser_layout = QHBoxLayout()
         self.wwiser_label = QLabel("Wwiser.pyz Path:")
-        self.wwiser_path = QLineEdit(get_config("wwiser_pyz", "wwiser.pyz"))
+        self.wwiser_path = QLineEdit(find_tool("wwiser") or get_config("wwiser_pyz", "wwiser.pyz"))
         self.wwiser_btn = QPushButton("Browse...")
         self.wwiser_btn.clicked.connect(self.browse_wwiser)
         wwiser_layout.addWidget(self.wwiser_label)
@@ -458,6 +676,15 @@ class BG3SoundsDictionaryApp(QMainWindow):
         folder_layout.addWidget(self.shareddev_only)
         options_layout.addLayout(folder_layout)
         
+        # Bank name filter
+        bank_filter_layout = QHBoxLayout()
+        self.bank_filter_label = QLabel("Only banks:")
+        self.bank_filter = QLineEdit(", ".join(get_config("filter_banks") or []))
+        self.bank_filter.setPlaceholderText("Comma separated name patterns, e.g. VO_*, *Ambience*; empty for all banks")
+        bank_filter_layout.addWidget(self.bank_filter_label)
+        bank_filter_layout.addWidget(self.bank_filter)
+        options_layout.addLayout(bank_filter_layout)
+        
         # Other options
         other_layout = QHBoxLayout()
         
@@ -468,9 +695,21 @@ class BG3SoundsDictionaryApp(QMainWindow):
         self.thread_spinner.setMinimum(1)
         self.thread_spinner.setMaximum(32)
         self.thread_spinner.setValue(4)
+        self.adaptive_threads = QCheckBox("Adapt thread count to throughput (spinner is the maximum)")
+        self.adaptive_threads.setChecked(get_config("adaptive_workers", False))
         thread_layout.addWidget(self.thread_label)
         thread_layout.addWidget(self.thread_spinner)
+        thread_layout.addWidget(self.adaptive_threads)
         other_layout.addLayout(thread_layout)
+        
+        self.largest_first = QCheckBox("Largest banks first")
+        self.largest_first.setChecked(get_config("largest_first", True))
+        other_layout.addWidget(self.largest_first)
+        
+        self.profile_run = QCheckBox("Profile this run")
+        self.profile_run.setToolTip("Write CPU and memory reports to the Profiles folder")
+        self.profile_run.setChecked(get_config("profile_run", False))
+        other_layout.addWidget(self.profile_run)
         options_layout.addLayout(other_layout)
         
         main_layout.addWidget(options_group)
@@ -567,8 +806,25 @@ class BG3SoundsDictionaryApp(QMainWindow):
         set_config("wwiser_pyz", self.wwiser_path.text())
         set_config("output_json", self.output_path.text())
         set_config("xml_output_folder", self.xml_path.text())
+        set_config("adaptive_workers", self.adaptive_threads.isChecked())
+        set_config("largest_first", self.largest_first.isChecked())
+        set_config("profile_run", self.profile_run.isChecked())
+        set_config("filter_banks", [pattern.strip() for pattern in self.bank_filter.text().split(",") if pattern.strip()])
         save_config()
         
+        try:
+            sound_filter = SoundFilter.from_settings(dict(config_filter_settings(),
+                                                          folder_bg3sids_wiki=get_config("folder_bg3sids_wiki")))
+        except ValueError as e:
+            QMessageBox.warning(self, "Warning", f"Invalid filter: {e}")
+            return
+        
+        try:
+            check_xml_compression(get_config("xml_compression", "none"))
+        except ValueError as e:
+            QMessageBox.warning(self, "Warning", str(e))
+            return
+        
         if not os.path.exists(self.unpacked_path.text()):
             QMessageBox.warning(self, "Warning", "The specified UnpackedData folder does not exist")
             return
@@ -577,18 +833,31 @@ class BG3SoundsDictionaryApp(QMainWindow):
             QMessageBox.warning(self, "Warning", "Wwiser.pyz not found at the specified path")
             return
         
+        # Without an output file the dictionary goes to a temporary file until it is saved
+        output_path = self.output_path.text() or os.path.join(tempfile.gettempdir(), "bg3_sounds_dictionary.json")
+        self.result_path = None
+        self.bank_count = 0
+        self.sound_count = 0
+        
         # Configure worker thread
         self.worker = BankProcessingWorker(
             unpacked_data_folder=self.unpacked_path.text(),
             wwiser_pyz_path=self.wwiser_path.text(),
+            output_path=output_path,
             output_folder=self.xml_path.text() if self.xml_path.text() else None,
             shared_only=self.shared_only.isChecked(),
             shareddev_only=self.shareddev_only.isChecked(),
-            num_threads=self.thread_spinner.value()
+            num_threads=self.thread_spinner.value(),
+            adaptive=self.adaptive_threads.isChecked(),
+            largest_first=self.largest_first.isChecked(),
+            category_priority=get_config("category_priority", []),
+            profile=self.profile_run.isChecked(),
+            sound_filter=sound_filter
         )
         
         # Connect signals
         self.worker.progress_update.connect(self.update_progress)
+        self.worker.bank_finished.connect(self.bank_finished)
         self.worker.finished.connect(self.processing_finished)
         self.worker.error.connect(self.show_error)
         self.worker.log_message.connect(self.log_message)
@@ -610,28 +879,25 @@ class BG3SoundsDictionaryApp(QMainWindow):
         self.progress_bar.setValue(percentage)
         self.progress_label.setText(f"Processing {current}/{total}: {current_file}")
     
-    def processing_finished(self, all_banks):
+    def bank_finished(self, category, bank_name, sound_count):
+        """Count a finished bank"""
+        self.bank_count += 1
+        self.sound_count += sound_count
+    
+    def processing_finished(self, summary):
         """Handle completion of processing"""
-        self.all_banks = all_banks
+        self.result_path = summary["output_path"]
         self.log_message("Processing completed successfully!")
         self.start_btn.setEnabled(True)
         self.cancel_btn.setEnabled(False)
         self.save_btn.setEnabled(True)
         self.progress_label.setText("Processing completed")
         
-        # Count total banks and sound files
-        total_banks = 0
-        total_sounds = 0
-        for folder, banks in all_banks.items():
-            total_banks += len(banks)
-            for bank_name, bank_info in banks.items():
-                total_sounds += len(bank_info["sound_files"])
+        self.log_message(f"Processed {summary['banks']} banks containing {summary['sounds']} sound files")
         
-        self.log_message(f"Processed {total_banks} banks containing {total_sounds} sound files")
-        
-        # Auto-save if output path is specified
+        # The dictionary is already written when an output path is specified
         if self.output_path.text():
-            self.save_dictionary()
+            self.log_message(f"Successfully saved dictionary to {self.result_path}")
     
     def show_error(self, error_message):
         """Display an error message"""
@@ -651,20 +917,18 @@ class BG3SoundsDictionaryApp(QMainWindow):
     
     def save_dictionary(self):
         """Save the generated dictionary to a JSON file"""
-        if not self.all_banks:
+        if not self.result_path or not os.path.exists(self.result_path):
             QMessageBox.warning(self, "Warning", "No dictionary data to save")
             return
         
-        output_path = self.output_path.text()
+        output_path, _ = QFileDialog.getSaveFileName(self, "Save Dictionary", self.output_path.text(), "JSON Files (*.json)")
         if not output_path:
-            output_path, _ = QFileDialog.getSaveFileName(self, "Save Dictionary", "", "JSON Files (*.json)")
-            if not output_path:
-                return
-            self.output_path.setText(output_path)
+            return
+        self.output_path.setText(output_path)
         
         try:
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(self.all_banks, f, indent=2, ensure_ascii=False)
+            if os.path.abspath(output_path) != os.path.abspath(self.result_path):
+                shutil.copyfile(self.result_path, output_path)
             self.log_message(f"Successfully saved dictionary to {output_path}")
             QMessageBox.information(self, "Success", f"Dictionary saved to {output_path}")
         except Exception as e:
@@ -672,12 +936,183 @@ class BG3SoundsDictionaryApp(QMainWindow):
             self.log_message(error_msg)
             QMessageBox.critical(self, "Error", error_msg)
 
+def build_dictionary_file(
+    unpacked_data_folder: str,
+    wwiser_pyz_path: str,
+    output_path: str,
+    output_folder: Optional[str] = None,
+    num_threads: int = 4,
+    adaptive: bool = False,
+    largest_first: bool = False,
+    category_priority: Optional[List[str]] = None,
+    shard: Optional[Shard] = None,
+    profile: bool = False,
+    sound_filter: Optional[SoundFilter] = None,
+    compression: str = "none"
+) -> Dict[str, int]:
+    """
+    Build the dictionary file without the GUI, writing banks as they finish
+    
+    Args:
+        unpacked_data_folder: Path to the UnpackedData folder
+        wwiser_pyz_path: Path to the wwiser.pyz file
+        output_path: Dictionary JSON to write
+        output_folder: Optional folder for decoded files
+        num_threads: Number of threads for parallel processing (the upper limit when adaptive)
+        adaptive: Tune the number of threads to the measured throughput
+        largest_first: Decode the largest banks first (waits for the scan to finish)
+        category_priority: Categories to decode first when largest_first is set
+        shard: Optional shard; only its banks are decoded and a shard record
+            is written next to the output for sharding.py merge-dictionary
+        profile: Write cProfile/tracemalloc reports of the run to Profiles
+        sound_filter: Optional filter; only the banks it selects are decoded
+        compression: How the decoded XMLs are kept ("none", "gzip" or "zstd")
+        
+    Returns:
+        Dictionary with the "banks" and "sounds" counts
+    """
+    profiler = RunProfiler("app2", profile)
+    profiler.start()
+    runner = ProcessRunner()
+    resolver = load_name_resolver()
+    discovered = {}
+    writer = DictionaryWriter(output_path)
+    try:
+        with profiler.stage("banks"):
+            for folder, bank_name, bank_info in iter_bnk_results(
+                    unpacked_data_folder, wwiser_pyz_path, output_folder, num_threads=num_threads,
+                    adaptive=adaptive, largest_first=largest_first, category_priority=category_priority,
+                    discovered=discovered, log=logger.info, shard=shard, profiler=profiler,
+                    runner=runner, timeout=get_config("decode_timeout", DEFAULT_DECODE_TIMEOUT),
+                    sound_filter=sound_filter, compression=compression):
+                if resolver is not None:
+                    enrich_bank(bank_info, resolver)
+                writer.add(folder, bank_name, bank_info)
+    except BaseException:
+        writer.discard()
+        profiler.finish()
+        raise
+    with profiler.stage("write"):
+        writer.close(discovered)
+    profiler.finish()
+    for line in runner.summary():
+        logger.info(line)
+    counts = {"banks": writer.bank_count, "sounds": writer.sound_count}
+    if shard is not None:
+        write_shard_record(output_path, shard, **counts)
+    return counts
+
+def update_dictionary_file(
+    dictionary_path: str,
+    unpacked_data_folder: str,
+    wwiser_pyz_path: str,
+    changed_banks: Iterable[str],
+    removed_banks: Iterable[str] = (),
+    output_folder: Optional[str] = None,
+    runner: Optional[ProcessRunner] = None
+) -> Dict[str, int]:
+    """
+    Re-decode changed banks and update an existing dictionary file in place
+    
+    Changed banks replace their entry (new banks are added at the end of
+    their category); removed banks are dropped. Other entries are copied
+    unchanged.
+    
+    Args:
+        dictionary_path: Dictionary JSON written by app2.py
+        unpacked_data_folder: Path to the UnpackedData folder, to categorize the banks
+        wwiser_pyz_path: Path to the wwiser.pyz file
+        changed_banks: Paths of new or modified .bnk files
+        removed_banks: Paths of deleted .bnk files
+        output_folder: Optional folder for decoded files
+        runner: ProcessRunner to run wwiser with (default: the shared one)
+        
+    Returns:
+        Dictionary with the "updated" and "removed" bank counts
+    """
+    with open(dictionary_path, "r", encoding="utf-8") as f:
+        all_banks = json.load(f)
+    matcher = CategoryMatcher(find_category_roots(unpacked_data_folder))
+    resolver = load_name_resolver()
+    timeout = get_config("decode_timeout", DEFAULT_DECODE_TIMEOUT)
+    compression = get_config("xml_compression", "none")
+    
+    removed = 0
+    for bnk_file in removed_banks:
+        category = matcher.categorize(bnk_file) or "Other"
+        if all_banks.get(category, {}).pop(os.path.basename(bnk_file).replace(".bnk", ""), None) is not None:
+            removed += 1
+    updated = 0
+    for bnk_file in changed_banks:
+        category = matcher.categorize(bnk_file) or "Other"
+        bank_name = os.path.basename(bnk_file).replace(".bnk", "")
+        _, bank_info = process_bnk_file((wwiser_pyz_path, bnk_file, bank_name, output_folder), runner, timeout, compression)
+        if resolver is not None:
+            enrich_bank(bank_info, resolver)
+        all_banks.setdefault(category, {})[bank_name] = bank_info
+        updated += 1
+    
+    writer = DictionaryWriter(dictionary_path)
+    try:
+        for category, banks in all_banks.items():
+            for bank_name, bank_info in banks.items():
+                writer.add(category, bank_name, bank_info)
+    except Exception:
+        writer.discard()
+        raise
+    writer.close({category: list(banks) for category, banks in all_banks.items()})
+    return {"updated": updated, "removed": removed}
+
 def main():
     """Main entry point for the application"""
-    app = QApplication(sys.argv)
-    window = BG3SoundsDictionaryApp()
-    window.show()
-    sys.exit(app.exec())
+    parser = argparse.ArgumentParser(description="BG3 Sound Banks Dictionary Builder")
+    parser.add_argument("--headless", action="store_true", help="Build the dictionary without opening the window")
+    parser.add_argument("--unpacked", default=get_config("folder_unpacked_data"), help="UnpackedData folder")
+    parser.add_argument("--wwiser", default=find_tool("wwiser") or get_config("wwiser_pyz"), help="wwiser.pyz")
+    parser.add_argument("--output", default=get_config("output_json"), help="Dictionary JSON to write")
+    parser.add_argument("--xml-output", default=get_config("xml_output_folder") or None,
+                        help="Keep the decoded XML files in this folder")
+    parser.add_argument("--xml-compression", choices=list(XML_COMPRESSION_SUFFIXES),
+                        default=get_config("xml_compression", "none"),
+                        help="Keep the decoded XML files compressed")
+    parser.add_argument("--threads", type=int, default=get_config("max_workers", 4))
+    parser.add_argument("--shard", default=None, help="Only process shard i of N, e.g. 2/4")
+    parser.add_argument("--profile", action="store_true", help="Write CPU and memory reports to Profiles")
+    add_filter_arguments(parser)
+    # Anything else is left for Qt
+    args, qt_args = parser.parse_known_args()
+    
+    if not args.headless:
+        app = QApplication([sys.argv[0]] + qt_args)
+        window = BG3SoundsDictionaryApp()
+        window.show()
+        sys.exit(app.exec())
+    
+    # Filters given on the command line replace the saved ones
+    filter_settings = config_filter_settings()
+    filter_settings.update({key: value for key, value in filter_settings_from_args(args).items() if value is not None})
+    filter_settings["folder_bg3sids_wiki"] = get_config("folder_bg3sids_wiki")
+    try:
+        shard = parse_shard(args.shard)
+        sound_filter = SoundFilter.from_settings(filter_settings)
+        check_xml_compression(args.xml_compression)
+    except ValueError as e:
+        parser.error(str(e))
+    if sound_filter.active:
+        logger.info(f"Filter: {sound_filter.describe()}")
+    if not check_dependencies(args.wwiser):
+        sys.exit(1)
+    counts = build_dictionary_file(args.unpacked, args.wwiser, args.output, args.xml_output,
+                                   num_threads=args.threads,
+                                   adaptive=get_config("adaptive_workers", False),
+                                   largest_first=get_config("largest_first", True),
+                                   category_priority=get_config("category_priority"),
+                                   shard=shard,
+                                   profile=args.profile or get_config("profile_run", False),
+                                   sound_filter=sound_filter,
+                                   compression=args.xml_compression)
+    shard_text = f" (shard {shard})" if shard else ""
+    logger.info(f"Wrote {counts['banks']} banks with {counts['sounds']} sounds to {args.output}{shard_text}")
 
 if __name__ == "__main__":
     main()
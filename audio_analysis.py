@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+""" audio_analysis.py - Bulk duration/loudness/silence analysis of converted audio
+Reads converted WAVs as memory-mapped NumPy arrays in a process pool and
+records each sound's duration, peak and RMS level (dBFS) and whether it is
+silent, so placeholder sounds can be filtered out.
+
+Sounds are taken from the audio store (each stored object is analysed once)
+or from a folder of "<id>.wem.wav" files. Results are written into the bank
+dictionary entries and/or a side table JSON keyed by "<category>/<sound id>",
+since Shared and SharedDev reuse sound IDs.
+
+Usage:
+    python audio_analysis.py --store AudioStore --dictionary bg3_sounds.json
+    python audio_analysis.py --folder ConvertedAudio --output analysis.json
+"""
+
+import os
+import json
+import time
+import struct
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Any, Tuple
+
+import numpy as np
+
+from config_manager import get_config
+from audio_store import AudioStore, source_key
+from adaptive_pool import file_size
+
+logger = logging.getLogger(__name__)
+
+# Peak level at or below which a sound counts as silent
+SILENCE_THRESHOLD_DBFS = -60.0
+# Levels are floored here instead of -inf so they stay valid JSON
+MIN_DBFS = -120.0
+# Frames processed per step, to bound memory on long sounds
+CHUNK_FRAMES = 1 << 20
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+def read_wav_layout(path: str) -> Tuple[np.dtype, int, int, int, int]:
+    """
+    Locate the sample data of a WAV file
+
+    Args:
+        path: Path to the WAV file
+
+    Returns:
+        Tuple of (sample dtype, channels, sample rate, data offset, data size in bytes)
+
+    Raises:
+        ValueError: If the file is not a supported PCM/float WAV
+    """
+    with open(path, "rb") as f:
+        riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave != b"WAVE":
+            raise ValueError("not a RIFF/WAVE file")
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError("no data chunk")
+            chunk_id, chunk_size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                fmt = struct.unpack("<HHIIHH", f.read(16))
+                f.seek(chunk_size - 16 + (chunk_size & 1), os.SEEK_CUR)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError("data chunk before fmt chunk")
+                data_offset = f.tell()
+                break
+            else:
+                f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+    format_tag, channels, sample_rate, _, _, bits = fmt
+    data_size = min(chunk_size, os.path.getsize(path) - data_offset)
+    if format_tag == WAVE_FORMAT_EXTENSIBLE:
+        format_tag = WAVE_FORMAT_IEEE_FLOAT if bits == 32 and _is_float_extensible(path) else WAVE_FORMAT_PCM
+    if format_tag == WAVE_FORMAT_IEEE_FLOAT and bits == 32:
+        dtype = np.dtype("<f4")
+    elif format_tag == WAVE_FORMAT_PCM and bits in (8, 16, 32):
+        dtype = np.dtype({8: "u1", 16: "<i2", 32: "<i4"}[bits])
+    else:
+        raise ValueError(f"unsupported format {format_tag} with {bits} bits")
+    return dtype, channels, sample_rate, data_offset, data_size
+
+def _is_float_extensible(path: str) -> bool:
+    """Check the sub-format GUID of a WAVE_FORMAT_EXTENSIBLE header for IEEE float"""
+    with open(path, "rb") as f:
+        head = f.read(4096)
+    index = head.find(b"fmt ")
+    return index >= 0 and head[index + 8 + 24:index + 8 + 26] == struct.pack("<H", WAVE_FORMAT_IEEE_FLOAT)
+
+def _to_dbfs(value: float) -> float:
+    if value <= 0:
+        return MIN_DBFS
+    return round(max(MIN_DBFS, 20.0 * float(np.log10(value))), 2)
+
+def analyze_wav(path: str) -> Dict[str, Any]:
+    """
+    Measure one WAV file
+
+    Args:
+        path: Path to the WAV file
+
+    Returns:
+        Dictionary with duration (seconds), peak_dbfs, rms_dbfs and silent,
+        or with an "error" entry if the file cannot be read
+    """
+    try:
+        dtype, channels, sample_rate, offset, size = read_wav_layout(path)
+        frames = size // (dtype.itemsize * channels)
+        duration = frames / sample_rate if sample_rate else 0.0
+        if frames == 0:
+            return {"duration": round(duration, 3), "peak_dbfs": MIN_DBFS, "rms_dbfs": MIN_DBFS, "silent": True}
+        samples = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(frames * channels,))
+        if dtype.kind == "u":
+            scale, center = 128.0, 128.0
+        elif dtype.kind == "i":
+            scale, center = float(np.iinfo(dtype).max) + 1.0, 0.0
+        else:
+            scale, center = 1.0, 0.0
+        peak = 0.0
+        square_sum = 0.0
+        step = CHUNK_FRAMES * channels
+        for start in range(0, samples.shape[0], step):
+            chunk = (samples[start:start + step].astype(np.float64) - center) / scale
+            peak = max(peak, float(np.max(np.abs(chunk))))
+            square_sum += float(np.dot(chunk, chunk))
+        del samples
+        rms = (square_sum / (frames * channels)) ** 0.5
+        peak_dbfs = _to_dbfs(peak)
+        return {
+            "duration": round(duration, 3),
+            "peak_dbfs": peak_dbfs,
+            "rms_dbfs": _to_dbfs(rms),
+            "silent": peak_dbfs <= SILENCE_THRESHOLD_DBFS,
+        }
+    except Exception as e:
+        return {"error": str(e)}
+
+def collect_from_store(store: AudioStore) -> Tuple[Dict[str, str], Dict[str, List[str]]]:
+    """
+    List the stored objects to analyse
+
+    Returns:
+        Tuple of (hash -> object path, hash -> source keys using it)
+    """
+    paths: Dict[str, str] = {}
+    ids: Dict[str, List[str]] = {}
+    for key, entry in store.sources.items():
+        digest = entry["hash"]
+        paths[digest] = store.object_path(digest)
+        ids.setdefault(digest, []).append(key)
+    return paths, ids
+
+def collect_from_folder(folder: str) -> Tuple[Dict[str, str], Dict[str, List[str]]]:
+    """
+    List "<id>.wem.wav" files under a folder
+
+    The category is the first folder below the given one, as in
+    ConvertedAudio/<category>/<bank>/<id>.wem.wav; files directly in it take
+    the folder's own name (e.g. --folder ConvertedAudio/Shared).
+
+    Returns:
+        Tuple of (path -> path, path -> [source key]), matching collect_from_store()
+    """
+    paths: Dict[str, str] = {}
+    ids: Dict[str, List[str]] = {}
+    folder_name = os.path.basename(os.path.normpath(folder))
+    for root, _, files in os.walk(folder):
+        relative = os.path.relpath(root, folder)
+        category = folder_name if relative == os.curdir else relative.split(os.sep)[0]
+        for file in files:
+            if file.lower().endswith(".wem.wav"):
+                path = os.path.join(root, file)
+                paths[path] = path
+                ids[path] = [source_key(category, file)]
+    return paths, ids
+
+def analyze_all(paths: Dict[str, str],
+                ids: Dict[str, List[str]],
+                num_processes: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Analyse every file in a process pool and report the throughput
+
+    Args:
+        paths: Key -> WAV path, from collect_from_store() or collect_from_folder()
+        ids: Key -> source keys sharing that file
+        num_processes: Pool size (defaults to the CPU count)
+
+    Returns:
+        Dictionary mapping source keys ("<category>/<sound id>") to their
+        analysis; missing or unreadable files get an "error" entry
+    """
+    keys = list(paths)
+    # Missing files count as empty here and get their error from analyze_wav()
+    total_bytes = sum(file_size(paths[key]) for key in keys)
+    start = time.perf_counter()
+    results: Dict[str, Dict[str, Any]] = {}
+    with ProcessPoolExecutor(max_workers=num_processes) as executor:
+        chunksize = max(1, len(keys) // ((num_processes or os.cpu_count() or 1) * 16))
+        for key, analysis in zip(keys, executor.map(analyze_wav, [paths[k] for k in keys], chunksize=chunksize)):
+            for sound_key in ids[key]:
+                results[sound_key] = analysis
+    elapsed = time.perf_counter() - start
+    if elapsed > 0:
+        logger.info(f"Analysed {len(keys)} files ({total_bytes / 1e6:.1f} MB) in {elapsed:.2f}s: "
+                    f"{len(keys) / elapsed:.0f} files/s, {total_bytes / 1e6 / elapsed:.1f} MB/s")
+    return results
+
+def apply_to_dictionary(all_banks: Dict[str, Dict[str, Any]], results: Dict[str, Dict[str, Any]]) -> int:
+    """
+    Write analysis fields into the sound entries of a bank dictionary
+
+    Sounds are matched by category and ID. Sounds of categories without any
+    result (such as "Other") fall back to the ID alone when only one result
+    has that ID.
+
+    Args:
+        all_banks: Bank dictionary as written by app2.py
+        results: Source key -> analysis, from analyze_all()
+
+    Returns:
+        Number of sound entries updated
+    """
+    categories = set()
+    by_id: Dict[str, Optional[Dict[str, Any]]] = {}
+    for key, analysis in results.items():
+        category, _, sound_id = key.partition("/")
+        categories.add(category)
+        # None marks IDs that are ambiguous without their category
+        by_id[sound_id] = None if sound_id in by_id else analysis
+    updated = 0
+    for category, banks in all_banks.items():
+        for bank_info in banks.values():
+            for sound_id, sound_info in bank_info.get("sound_files", {}).items():
+                if category in categories:
+                    analysis = results.get(f"{category}/{sound_id}")
+                else:
+                    analysis = by_id.get(sound_id)
+                if analysis is not None and "error" not in analysis:
+                    sound_info.update(analysis)
+                    updated += 1
+    return updated
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Measure duration, loudness and silence of converted sounds")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--store", help="Audio store folder (default from config)")
+    source.add_argument("--folder", help="Folder of <id>.wem.wav files")
+    parser.add_argument("--dictionary", help="Bank dictionary JSON to update in place")
+    parser.add_argument("--output", help="Side table JSON to write (<category>/<sound id> -> analysis)")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+
+    if not args.dictionary and not args.output:
+        parser.error("give --dictionary and/or --output")
+    if args.folder:
+        paths, ids = collect_from_folder(args.folder)
+    else:
+        paths, ids = collect_from_store(AudioStore(args.store or get_config("folder_audio_store")))
+    logger.info(f"Analysing {len(paths)} files")
+    results = analyze_all(paths, ids, args.processes)
+
+    failed = sum(1 for analysis in results.values() if "error" in analysis)
+    silent = sum(1 for analysis in results.values() if analysis.get("silent"))
+    logger.info(f"{len(results)} sounds analysed, {silent} silent, {failed} unreadable")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Wrote side table to {args.output}")
+    if args.dictionary:
+        with open(args.dictionary, "r", encoding="utf-8") as f:
+            all_banks = json.load(f)
+        updated = apply_to_dictionary(all_banks, results)
+        tmp_path = f"{args.dictionary}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(all_banks, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, args.dictionary)
+        logger.info(f"Updated {updated} sound entries in {args.dictionary}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+""" audio_store.py - Content-addressed store for converted audio
+Each converted WAV is stored once under its SHA-256 hash. The grouped,
+renamed and flat folder layouts are built from the store as link farms
+("views"), so changing the naming scheme or wiki mapping only rebuilds
+links instead of reconverting or moving files.
+
+Store layout:
+    <root>/objects/ab/abcdef....wav   converted audio, one file per hash
+    <root>/manifest.json              source key -> hash, size, mtime and converter version
+    <root>/tmp/                       scratch space for in-flight conversions
+"""
+
+import os
+import json
+import glob
+import shutil
+import hashlib
+import logging
+import uuid
+from typing import Dict, Optional, Any, Callable
+
+from sound_mappings import read_bank_source_ids, wiki_id_map_for_bank, is_bank_xml
+
+logger = logging.getLogger(__name__)
+
+# Marker file written into every view folder; only folders carrying it are
+# ever deleted when a view is rebuilt.
+VIEW_MARKER = ".audio_store_view"
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def hash_file(path: str) -> str:
+    """Return the SHA-256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def source_key(category: str, wem_path: str) -> str:
+    """Build the manifest key for a WEM file: "<category>/<sound id>" """
+    sound_id = os.path.basename(wem_path).split(".")[0]
+    return f"{category}/{sound_id}"
+
+class AudioStore:
+    """Content-addressed store of converted audio files"""
+
+    def __init__(self, root: str, tool_version: Optional[str] = None):
+        self.root = root
+        # Version of the converter; entries made by another version are out of date
+        self.tool_version = tool_version
+        self.objects_dir = os.path.join(root, "objects")
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self.sources: Dict[str, Dict[str, Any]] = {}
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self.load()
+
+    def load(self):
+        """Load the manifest from disk if it exists"""
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    self.sources = json.load(f).get("sources", {})
+            except Exception as e:
+                logger.error(f"Error loading audio store manifest: {e}")
+                self.sources = {}
+
+    def save(self):
+        """Write the manifest to disk"""
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "sources": self.sources}, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def object_path(self, digest: str) -> str:
+        """Path of the stored object for a hash"""
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}.wav")
+
+    def temp_path(self) -> str:
+        """A fresh scratch path to convert into before calling add()"""
+        return os.path.join(self.tmp_dir, f"{uuid.uuid4().hex}.wav")
+
+    def is_current(self, key: str, wem_path: str) -> bool:
+        """
+        Check whether a source has already been converted into the store
+
+        Args:
+            key: Source key (see source_key())
+            wem_path: Path to the source WEM file
+
+        Returns:
+            True if the source is unchanged since it was stored with the current
+            converter version and its object exists
+        """
+        entry = self.sources.get(key)
+        if entry is None:
+            return False
+        try:
+            stat = os.stat(wem_path)
+        except OSError:
+            return False
+        return (entry.get("size") == stat.st_size
+                and entry.get("mtime") == stat.st_mtime
+                and (self.tool_version is None or entry.get("tool") == self.tool_version)
+                and os.path.exists(self.object_path(entry["hash"])))
+
+    def add(self, key: str, wem_path: str, converted_path: str) -> str:
+        """
+        Move a converted file into the store and record its source
+
+        Args:
+            key: Source key (see source_key())
+            wem_path: Path to the source WEM file
+            converted_path: Path to the converted WAV, normally from temp_path()
+
+        Returns:
+            Hash of the stored object
+        """
+        digest = hash_file(converted_path)
+        object_path = self.object_path(digest)
+        if os.path.exists(object_path):
+            os.remove(converted_path)
+        else:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            os.replace(converted_path, object_path)
+        stat = os.stat(wem_path)
+        self.sources[key] = {
+            "hash": digest,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "source": wem_path,
+            "tool": self.tool_version,
+        }
+        return digest
+
+    def categories(self) -> Dict[str, Dict[str, str]]:
+        """Group stored sources as {category: {sound id: hash}}"""
+        grouped: Dict[str, Dict[str, str]] = {}
+        for key, entry in self.sources.items():
+            category, _, sound_id = key.partition("/")
+            grouped.setdefault(category, {})[sound_id] = entry["hash"]
+        return grouped
+
+def link_file(src: str, dst: str):
+    """Link dst to src, falling back to a symlink and then to a copy"""
+    try:
+        os.link(src, dst)
+        return
+    except OSError:
+        pass
+    try:
+        os.symlink(src, dst)
+        return
+    except OSError:
+        pass
+    shutil.copy2(src, dst)
+
+def _replace_view(view_dir: str, build: Callable[[str], int]) -> Optional[int]:
+    """Build a view in a scratch folder and swap it in place of view_dir"""
+    if os.path.exists(view_dir) and not os.path.exists(os.path.join(view_dir, VIEW_MARKER)):
+        logger.error(f"Refusing to replace {view_dir}: it was not created by the audio store")
+        return None
+    building_dir = f"{view_dir}.building"
+    shutil.rmtree(building_dir, ignore_errors=True)
+    os.makedirs(building_dir)
+    open(os.path.join(building_dir, VIEW_MARKER), "w").close()
+    count = build(building_dir)
+    shutil.rmtree(view_dir, ignore_errors=True)
+    os.rename(building_dir, view_dir)
+    return count
+
+def build_flat_view(store: AudioStore, dest_folder: str) -> Dict[str, int]:
+    """
+    Build the flat ID layout: <dest>/<category>/<sound id>.wem.wav
+
+    Args:
+        store: The audio store to read from
+        dest_folder: Folder that receives one view folder per category
+
+    Returns:
+        Dictionary with the number of linked files per category
+    """
+    counts = {}
+    for category, sounds in store.categories().items():
+        def build(view_dir, sounds=sounds):
+            for sound_id, digest in sounds.items():
+                link_file(store.object_path(digest), os.path.join(view_dir, f"{sound_id}.wem.wav"))
+            return len(sounds)
+        count = _replace_view(os.path.join(dest_folder, category), build)
+        if count is not None:
+            counts[category] = count
+    return counts
+
+def build_bank_view(store: AudioStore,
+                    dest_folder: str,
+                    banks_folder: str,
+                    wiki_data: Optional[Dict[str, Any]] = None) -> Dict[str, int]:
+    """
+    Build the grouped layout: <dest>/<category>/<bank>/<name>.wav
+
+    Sounds are linked into every bank whose decoded XML references them, and
+    named from the wiki mapping when wiki_data is given. Sounds not referenced
+    by any bank are linked at the category root, as grouping leaves them.
+
+    Args:
+        store: The audio store to read from
+        dest_folder: Folder that receives one view folder per category
+        banks_folder: Folder with decoded banks (<category>/<bank>/<bank>.bnk.xml, optionally compressed)
+        wiki_data: Optional wiki_data.json contents used for renaming
+
+    Returns:
+        Dictionary with the number of linked files per category
+    """
+    counts = {}
+    for category, sounds in store.categories().items():
+        def build(view_dir, category=category, sounds=sounds):
+            linked = 0
+            grouped = set()
+            xml_paths = [path for path in glob.glob(os.path.join(banks_folder, category, "*", "*.bnk.xml*"))
+                         if is_bank_xml(path)]
+            for xml_path in xml_paths:
+                bank_name = os.path.basename(os.path.dirname(xml_path))
+                id_map = wiki_id_map_for_bank(wiki_data, bank_name) if wiki_data else None
+                bank_dir = os.path.join(view_dir, bank_name)
+                os.makedirs(bank_dir, exist_ok=True)
+                for sound_id in read_bank_source_ids(xml_path):
+                    digest = sounds.get(sound_id)
+                    if digest is None:
+                        continue
+                    if id_map and sound_id in id_map:
+                        filename = f"{id_map[sound_id]}.wav"
+                    else:
+                        filename = f"{sound_id}.wem.wav"
+                    target = os.path.join(bank_dir, filename)
+                    if not os.path.exists(target):
+                        link_file(store.object_path(digest), target)
+                        linked += 1
+                    grouped.add(sound_id)
+            for sound_id, digest in sounds.items():
+                if sound_id not in grouped:
+                    link_file(store.object_path(digest), os.path.join(view_dir, f"{sound_id}.wem.wav"))
+                    linked += 1
+            return linked
+        count = _replace_view(os.path.join(dest_folder, category), build)
+        if count is not None:
+            counts[category] = count
+    return counts
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+""" bank_archives.py - One archive of converted audio per bank
+Packs each grouped bank folder (ConvertedAudio/<category>/<bank>/) into
+<output>/<category>/<bank>.zip (entries stored, not compressed, since WAV
+data barely shrinks) or <bank>.tar, for handing out banks one at a time.
+The files are streamed from the bank folder into the archive, so nothing
+is copied first, and several banks are packed at once.
+
+Every archive starts with a manifest.json listing its files with their
+sound IDs and sizes, plus the bank's entry from the app2.py dictionary
+when one is available. The manifest also keeps a signature of what went
+into the archive: file names, sizes, link targets and modification times,
+the dictionary entry and the wiki names. An archive is only rebuilt when
+that signature changes, so audio store views, which recreate every bank
+folder, do not make archives look out of date.
+
+Usage:
+    python bank_archives.py --audio ConvertedAudio --output BankArchives --format zip
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import hashlib
+import tarfile
+import zipfile
+import logging
+import argparse
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Any, Callable, Tuple
+
+from config_manager import get_config
+from sound_mappings import load_wiki_data, wiki_id_map_for_bank
+from sound_filter import SoundFilter
+from adaptive_pool import AdaptiveConcurrency, StageProgress, run_adaptive, DEFAULT_MAX_WORKERS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARCHIVE_FOLDER = os.path.join(os.getcwd(), "BankArchives")
+ARCHIVE_FORMATS = ("zip", "tar")
+MANIFEST_NAME = "manifest.json"
+CATEGORIES = ("Shared", "SharedDev")
+
+def find_bank_folders(audio_folder: str,
+                      sound_filter: Optional[SoundFilter] = None) -> List[Tuple[str, str, str]]:
+    """
+    Grouped bank folders under the converted audio folder
+
+    Sounds left at the category root (not in any bank) are not archived.
+
+    Returns:
+        List of (category, bank name, folder) tuples, sorted
+    """
+    banks = []
+    for category in CATEGORIES:
+        category_dir = os.path.join(audio_folder, category)
+        if not os.path.isdir(category_dir):
+            continue
+        for entry in sorted(os.scandir(category_dir), key=lambda entry: entry.name):
+            if not entry.is_dir() or entry.name.endswith(".building"):
+                continue
+            if sound_filter is not None and not sound_filter.wants_bank(category, entry.name):
+                continue
+            banks.append((category, entry.name, entry.path))
+    return banks
+
+def load_bank_dictionary(path: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    """Bank dictionary written by app2.py, or an empty one if it is missing or unreadable"""
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Error loading bank dictionary {path}: {e}")
+        return {}
+
+def archive_path(output_folder: str, category: str, bank_name: str, archive_format: str) -> str:
+    """Where the archive of a bank goes: <output>/<category>/<bank>.<format>"""
+    return os.path.join(output_folder, category, f"{bank_name}.{archive_format}")
+
+def content_signature(files: List[os.DirEntry],
+                      bank_info: Optional[Dict[str, Any]] = None,
+                      id_map: Optional[Dict[str, str]] = None) -> str:
+    """
+    Signature of everything that goes into a bank archive
+
+    Files are identified by name, size and modification time, and symlinks
+    also by their target. Links into the audio store keep the time of the
+    stored object, so rebuilding a view does not change the signature.
+
+    Args:
+        files: Files that go into the archive
+        bank_info: The bank's entry from the app2.py dictionary, if any
+        id_map: Wiki ID -> name mapping of the bank, if any
+
+    Returns:
+        SHA-256 hex digest
+
+    Raises:
+        OSError: If a file cannot be read
+    """
+    entries = []
+    for entry in files:
+        stat = entry.stat()
+        target = os.readlink(entry.path) if entry.is_symlink() else None
+        entries.append([entry.name, stat.st_size, stat.st_mtime_ns, target])
+    data = json.dumps({"files": entries, "dictionary": bank_info, "names": id_map},
+                      sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+def read_archive_manifest(archive: str) -> Optional[Dict[str, Any]]:
+    """The manifest of an existing bank archive, or None if it is missing or unreadable"""
+    try:
+        if archive.endswith(".zip"):
+            with zipfile.ZipFile(archive) as source:
+                return json.loads(source.read(MANIFEST_NAME))
+        with tarfile.open(archive) as source:
+            # The manifest is written first, so the rest of the archive is not read
+            member = source.next()
+            if member is None or member.name != MANIFEST_NAME:
+                return None
+            return json.load(source.extractfile(member))
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile, tarfile.TarError):
+        return None
+
+def is_up_to_date(archive: str, signature: str) -> bool:
+    """Whether an archive was written from content with this signature (see content_signature())"""
+    manifest = read_archive_manifest(archive)
+    return manifest is not None and manifest.get("signature") == signature
+
+def build_manifest(category: str,
+                   bank_name: str,
+                   files: List[os.DirEntry],
+                   archive_format: str,
+                   bank_info: Optional[Dict[str, Any]] = None,
+                   id_map: Optional[Dict[str, str]] = None,
+                   signature: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Manifest of one bank archive
+
+    Args:
+        category: Category of the bank
+        bank_name: Bank name
+        files: Files that go into the archive
+        archive_format: "zip" or "tar"
+        bank_info: The bank's entry from the app2.py dictionary, if any
+        id_map: Wiki ID -> name mapping of the bank, to find the IDs of renamed files
+        signature: content_signature() of the archive, checked on later exports
+
+    Returns:
+        Manifest dictionary
+    """
+    ids_by_name = {f"{name}.wav": sound_id for sound_id, name in (id_map or {}).items()}
+    entries = []
+    for entry in files:
+        if entry.name.endswith(".wem.wav"):
+            sound_id = entry.name.split(".")[0]
+        else:
+            sound_id = ids_by_name.get(entry.name)
+        entries.append({"path": entry.name, "sound_id": sound_id, "size": entry.stat().st_size})
+    return {
+        "version": 1,
+        "bank": bank_name,
+        "category": category,
+        "format": archive_format,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "signature": signature,
+        "files": entries,
+        "dictionary": bank_info,
+    }
+
+def write_bank_archive(archive: str, files: List[os.DirEntry], manifest: Dict[str, Any], archive_format: str) -> int:
+    """
+    Write one bank archive, manifest first, streaming each file into it
+
+    The archive is written next to its final path and moved into place
+    once complete, so a cancelled or failed run never leaves a partial
+    archive behind.
+
+    Returns:
+        Bytes of audio written
+    """
+    os.makedirs(os.path.dirname(archive), exist_ok=True)
+    tmp_path = f"{archive}.tmp"
+    manifest_bytes = json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8")
+    written = 0
+    try:
+        if archive_format == "zip":
+            with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_STORED, allowZip64=True) as output:
+                output.writestr(MANIFEST_NAME, manifest_bytes)
+                for entry in files:
+                    output.write(entry.path, entry.name)
+                    written += entry.stat().st_size
+        else:
+            with tarfile.open(tmp_path, "w") as output:
+                info = tarfile.TarInfo(MANIFEST_NAME)
+                info.size = len(manifest_bytes)
+                info.mtime = int(time.time())
+                output.addfile(info, io.BytesIO(manifest_bytes))
+                for entry in files:
+                    # Links from the audio store view are stored as the files they point to
+                    stat = os.stat(entry.path)
+                    info = tarfile.TarInfo(entry.name)
+                    info.size = stat.st_size
+                    info.mtime = int(stat.st_mtime)
+                    info.mode = 0o644
+                    with open(entry.path, "rb") as source:
+                        output.addfile(info, source)
+                    written += info.size
+        os.replace(tmp_path, archive)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return written
+
+def export_bank_archives(audio_folder: str,
+                         output_folder: str = DEFAULT_ARCHIVE_FOLDER,
+                         archive_format: str = "zip",
+                         dictionary_path: Optional[str] = None,
+                         wiki_json_path: Optional[str] = None,
+                         max_workers: int = DEFAULT_MAX_WORKERS,
+                         adaptive: bool = False,
+                         sound_filter: Optional[SoundFilter] = None,
+                         force: bool = False,
+                         should_continue: Optional[Callable[[], bool]] = None,
+                         log: Optional[Callable[[str], None]] = None) -> Dict[str, int]:
+    """
+    Write one archive per grouped bank folder, several banks at a time
+
+    Args:
+        audio_folder: Converted audio folder with <category>/<bank>/ folders
+        output_folder: Folder receiving <category>/<bank>.<format>
+        archive_format: "zip" (stored entries) or "tar"
+        dictionary_path: Optional app2.py dictionary whose bank entries go into the manifests
+        wiki_json_path: Optional wiki_data.json, to give renamed files their sound IDs
+        max_workers: Banks packed at once (the upper limit when adaptive)
+        adaptive: Tune the number of banks packed at once to the measured throughput
+        sound_filter: Optional filter; only the banks it selects are archived
+        force: Rebuild archives that are up to date
+        should_continue: Optional callback; when it returns False no new archives are started
+        log: Optional callback for status messages
+
+    Returns:
+        Dictionary with the "archives", "skipped", "files" and "bytes" counts
+
+    Raises:
+        ValueError: If the archive format is unknown
+    """
+    if archive_format not in ARCHIVE_FORMATS:
+        raise ValueError(f"Unknown archive format {archive_format!r} (use {', '.join(ARCHIVE_FORMATS)})")
+    log = log or logger.info
+    dictionary = load_bank_dictionary(dictionary_path)
+    wiki_data = load_wiki_data(wiki_json_path) if wiki_json_path else None
+    banks = find_bank_folders(audio_folder, sound_filter)
+    log(f"Exporting {len(banks)} banks as {archive_format} archives to {output_folder}")
+
+    def export_bank(task: Tuple[str, str, str]) -> Optional[Tuple[int, int]]:
+        category, bank_name, folder = task
+        files = sorted((entry for entry in os.scandir(folder) if entry.is_file()), key=lambda entry: entry.name)
+        archive = archive_path(output_folder, category, bank_name, archive_format)
+        bank_info = dictionary.get(category, {}).get(bank_name)
+        id_map = wiki_id_map_for_bank(wiki_data, bank_name) if wiki_data else None
+        signature = content_signature(files, bank_info, id_map)
+        if not force and is_up_to_date(archive, signature):
+            return None
+        manifest = build_manifest(category, bank_name, files, archive_format, bank_info, id_map, signature)
+        return len(files), write_bank_archive(archive, files, manifest, archive_format)
+
+    counts = {"archives": 0, "skipped": 0, "files": 0, "bytes": 0}
+    controller = AdaptiveConcurrency("export", max_workers=max_workers, adaptive=adaptive, log=log)
+    progress = StageProgress("export", total=lambda: len(banks), log=log)
+    for task, result in run_adaptive(export_bank, banks, controller,
+                                     should_continue=should_continue, progress=progress):
+        if result is None:
+            counts["skipped"] += 1
+            continue
+        counts["archives"] += 1
+        counts["files"] += result[0]
+        counts["bytes"] += result[1]
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack each converted bank folder into its own archive")
+    parser.add_argument("--audio", default=get_config("folder_audio_converted"),
+                        help="Converted audio folder with <category>/<bank>/ folders")
+    parser.add_argument("--output", default=get_config("folder_bank_archives") or DEFAULT_ARCHIVE_FOLDER,
+                        help="Folder receiving <category>/<bank>.zip or .tar")
+    parser.add_argument("--format", choices=ARCHIVE_FORMATS, default=get_config("archive_format", "zip"))
+    parser.add_argument("--dictionary", default=get_config("output_json"),
+                        help="Bank dictionary from app2.py to embed in the manifests, if it exists")
+    parser.add_argument("--threads", type=int, default=get_config("max_workers", DEFAULT_MAX_WORKERS))
+    parser.add_argument("--force", action="store_true", help="Rebuild archives that are up to date")
+    parser.add_argument("--bank", action="append", dest="banks", metavar="GLOB",
+                        help="Only banks whose name matches (repeat to add more)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    if not os.path.isdir(args.audio or ""):
+        logger.error(f"Converted audio folder not found: {args.audio}")
+        sys.exit(1)
+    counts = export_bank_archives(args.audio, args.output, args.format, args.dictionary,
+                                  get_config("folder_bg3sids_wiki"), max_workers=args.threads,
+                                  adaptive=get_config("adaptive_workers", False),
+                                  sound_filter=SoundFilter(banks=args.banks) if args.banks else None,
+                                  force=args.force)
+    logger.info(f"Wrote {counts['archives']} archives with {counts['files']} files "
+                f"({counts['bytes'] / 1e6:.1f} MB); {counts['skipped']} were up to date")
+
+if __name__ == "__main__":
+    main()
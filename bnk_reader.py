@@ -0,0 +1,67 @@
+""" bnk_reader.py - Minimal binary reader for Wwise sound banks
+Reads the section table of a .bnk file and the embedded media index (DIDX),
+so single WEMs can be pulled out of a bank without decoding it with wwiser.
+
+A bank is a sequence of sections: 4-byte tag, little-endian uint32 size,
+then the payload. DIDX holds 12-byte entries (media ID, offset, size) whose
+offsets are relative to the start of the DATA payload.
+"""
+
+import os
+import struct
+from typing import Dict, Tuple
+
+SECTION_HEADER = struct.Struct("<4sI")
+DIDX_ENTRY = struct.Struct("<III")
+
+def read_sections(bnk_path: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Read the section table of a bank
+
+    Args:
+        bnk_path: Path to the .bnk file
+
+    Returns:
+        Dictionary mapping section tags (e.g. "DIDX") to (payload offset, payload size)
+    """
+    sections = {}
+    file_size = os.path.getsize(bnk_path)
+    with open(bnk_path, "rb") as f:
+        offset = 0
+        while offset + SECTION_HEADER.size <= file_size:
+            f.seek(offset)
+            tag, size = SECTION_HEADER.unpack(f.read(SECTION_HEADER.size))
+            payload = offset + SECTION_HEADER.size
+            sections[tag.decode("ascii", errors="replace")] = (payload, size)
+            offset = payload + size
+    return sections
+
+def read_embedded_index(bnk_path: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Read the embedded media index of a bank
+
+    Args:
+        bnk_path: Path to the .bnk file
+
+    Returns:
+        Dictionary mapping media IDs (as strings, like the bank dictionary keys)
+        to (absolute file offset, size); empty if the bank embeds no media
+    """
+    sections = read_sections(bnk_path)
+    if "DIDX" not in sections or "DATA" not in sections:
+        return {}
+    didx_offset, didx_size = sections["DIDX"]
+    data_offset, _ = sections["DATA"]
+    index = {}
+    with open(bnk_path, "rb") as f:
+        f.seek(didx_offset)
+        table = f.read(didx_size)
+    for media_id, offset, size in DIDX_ENTRY.iter_unpack(table[:len(table) - len(table) % DIDX_ENTRY.size]):
+        index[str(media_id)] = (data_offset + offset, size)
+    return index
+
+def read_embedded_wem(bnk_path: str, offset: int, size: int) -> bytes:
+    """Read one embedded WEM given its entry from read_embedded_index()"""
+    with open(bnk_path, "rb") as f:
+        f.seek(offset)
+        return f.read(size)
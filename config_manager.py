@@ -1,7 +1,49 @@
 import os
 import json
+import time
+import atexit
 import logging
+import threading
 from pathlib import Path
+from concurrent.futures import Future
+
+# Saves are delayed by this long so a burst of changes is written once
+SAVE_DELAY_SECONDS = 0.5
+# A lock file older than this is left over from a crashed writer
+STALE_LOCK_SECONDS = 10.0
+LOCK_TIMEOUT_SECONDS = 5.0
+
+class FileLock:
+    """
+    Lock shared between processes, held by creating a lock file exclusively
+    """
+    
+    def __init__(self, lock_path):
+        self.lock_path = lock_path
+    
+    def __enter__(self):
+        deadline = time.monotonic() + LOCK_TIMEOUT_SECONDS
+        while True:
+            try:
+                os.close(os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.lock_path) > STALE_LOCK_SECONDS:
+                        os.remove(self.lock_path)
+                        continue
+                except OSError:
+                    # Released in the meantime
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Config file is locked: {self.lock_path}")
+                time.sleep(0.05)
+    
+    def __exit__(self, *exc_info):
+        try:
+            os.remove(self.lock_path)
+        except OSError:
+            pass
 
 class ConfigManager:
     """
@@ -12,18 +54,59 @@ class ConfigManager:
     
     def __init__(self, config_file="bg3_sounds_config.json"):
         """Initialize the config manager with default paths"""
-        self.config_file = config_file
+        # Absolute, so a later os.chdir() (app.py changes into the vgmstream folder) cannot move it
+        self.config_file = os.path.abspath(config_file)
         self.config = {
             "folder_unpacked_data": "",
             "folder_vgmstream": os.path.join(os.getcwd(), "dependencies", "vgmstream-win64"),
             "folder_audio_converted": os.path.join(os.getcwd(), "ConvertedAudio"),
             "folder_banks_converted": os.path.join(os.getcwd(), "ConvertedBanks"),
+            "folder_audio_store": os.path.join(os.getcwd(), "AudioStore"),
+            "use_audio_store": False,
             "folder_bg3sids_wiki": os.path.join(os.getcwd(), "wiki_data.json"),
             "wwiser_pyz": os.path.join(os.getcwd(), "dependencies", "wwiser.pyz"),
             "output_json": os.path.join(os.getcwd(), "bg3_sounds.json"),
-            "xml_output_folder": ""
+            "xml_output_folder": "",
+            "max_workers": os.cpu_count() or 4,
+            "adaptive_workers": False,
+            "largest_first": True,
+            "category_priority": [],
+            "skip_duplicates": False,
+            "skip_near_duplicates": False,
+            "fingerprint_index": os.path.join(os.getcwd(), "fingerprints.json"),
+            "batch_convert": True,
+            "batch_max_files": 64,
+            "batch_max_mb": 64,
+            "throughput_history": os.path.join(os.getcwd(), "throughput.json"),
+            "profile_run": False,
+            "decode_timeout": 600,
+            "convert_timeout": 120,
+            "filter_banks": [],
+            "filter_exclude_banks": [],
+            "filter_categories": [],
+            "filter_exclude_categories": [],
+            "filter_ids": [],
+            "filter_ids_file": "",
+            "filter_exclude_ids_file": "",
+            "filter_wiki_pages": [],
+            "watch_state": os.path.join(os.getcwd(), "watch_state.json"),
+            "watch_interval": 10,
+            "xml_compression": "none",
+            "folder_bank_archives": os.path.join(os.getcwd(), "BankArchives"),
+            "archive_format": "zip"
         }
+        # Keys changed by this process since the last write; only these overwrite the file
+        self.dirty = set()
+        self.lock = threading.RLock()
+        # Held for a whole write, so writes from the timer and from flush_config() never interleave
+        self.write_lock = threading.Lock()
+        self.save_timer = None
+        # Future of the write scheduled by save_config()
+        self.pending_save = None
+        # Error of the last failed write, None after a successful one
+        self.last_save_error = None
         self.load_config()
+        atexit.register(self.flush_pending)
     
     def load_config(self):
         """Load configuration from JSON file if it exists"""
@@ -31,8 +114,10 @@ class ConfigManager:
             if os.path.exists(self.config_file):
                 with open(self.config_file, 'r') as f:
                     loaded_config = json.load(f)
-                    # Update config with loaded values
-                    self.config.update(loaded_config)
+                    # Update config with loaded values, keeping unsaved changes
+                    with self.lock:
+                        self.config.update({key: value for key, value in loaded_config.items()
+                                            if key not in self.dirty})
                     return True
             return False
         except Exception as e:
@@ -40,14 +125,106 @@ class ConfigManager:
             return False
     
     def save_config(self):
-        """Save current configuration to JSON file"""
+        """
+        Schedule a save of the configuration
+
+        The file is written on a background thread after SAVE_DELAY_SECONDS,
+        so repeated calls in quick succession write it only once.
+
+        Returns:
+            Future of the scheduled write, shared by the calls it covers; its
+            result is True once the file is written, or False if writing
+            failed (the error is logged and kept in last_save_error)
+        """
+        with self.lock:
+            if self.save_timer is not None:
+                self.save_timer.cancel()
+            if self.pending_save is None:
+                self.pending_save = Future()
+            future = self.pending_save
+            self.save_timer = threading.Timer(SAVE_DELAY_SECONDS, self.flush)
+            self.save_timer.daemon = True
+            self.save_timer.start()
+        return future
+    
+    def flush(self):
+        """
+        Write pending changes to the JSON file now
+
+        The file is re-read under a lock file and only the keys changed by
+        this process are written over it, so app.py and app2.py running at
+        the same time keep each other's settings. The write goes to a
+        temporary file that replaces the config file, so a crash cannot leave
+        it half written.
+
+        The changed keys are copied first, so set() is never blocked while
+        this waits for the lock file. Keys changed again during the write
+        stay pending for the next save.
+
+        Returns:
+            True if the file was written (or nothing needed writing), False on failure
+        """
+        with self.write_lock:
+            with self.lock:
+                if self.save_timer is not None:
+                    self.save_timer.cancel()
+                    self.save_timer = None
+                future, self.pending_save = self.pending_save, None
+                changed = {key: self.config[key] for key in self.dirty}
+                snapshot = dict(self.config)
+            if not changed and os.path.exists(self.config_file):
+                ok = True
+            else:
+                ok = self._write(changed, snapshot)
+        if future is not None:
+            future.set_result(ok)
+        return ok
+    
+    def flush_pending(self):
+        """
+        Write the config only if something is waiting to be saved
+
+        Registered with atexit, so a process that merely imported the module
+        never creates a config file.
+
+        Returns:
+            True if nothing was pending or the write succeeded, False on failure
+        """
+        with self.lock:
+            pending = bool(self.dirty) or self.pending_save is not None
+        return self.flush() if pending else True
+    
+    def _write(self, changed, snapshot):
+        """Merge the changed keys into the file on disk; runs without holding self.lock"""
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(self.config, f, indent=4)
-            return True
+            with FileLock(f"{self.config_file}.lock"):
+                on_disk = self._read_file()
+                on_disk.update(changed)
+                tmp_path = f"{self.config_file}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump(dict(snapshot, **on_disk), f, indent=4)
+                os.replace(tmp_path, self.config_file)
         except Exception as e:
             logging.error(f"Error saving config: {e}")
+            with self.lock:
+                self.last_save_error = str(e)
             return False
+        with self.lock:
+            self.last_save_error = None
+            for key, value in changed.items():
+                if self.config.get(key) == value:
+                    self.dirty.discard(key)
+            # Pick up what other instances saved in the meantime
+            self.config.update({key: value for key, value in on_disk.items() if key not in self.dirty})
+        return True
+    
+    def _read_file(self):
+        """Read the config file, or an empty dict if it is missing or unreadable"""
+        try:
+            with open(self.config_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
     
     def get(self, key, default=None):
         """Get a configuration value"""
@@ -55,7 +232,9 @@ class ConfigManager:
     
     def set(self, key, value):
         """Set a configuration value"""
-        self.config[key] = value
+        with self.lock:
+            self.config[key] = value
+            self.dirty.add(key)
         return True
     
     def get_all(self):
@@ -84,4 +263,9 @@ def load_config():
 
 def get_all_config():
     """Get all configuration values"""
-    return config_manager.get_all()
\ No newline at end of file
+    return config_manager.get_all()
+
+
+def flush_config():
+    """Write pending configuration changes now instead of after the save delay"""
+    return config_manager.flush()
@@ -0,0 +1,329 @@
+""" dependency_downloader.py - Parallel, resumable dependency downloads
+Downloads the external tools several at a time. Each file is streamed into
+"<name>.part" and an interrupted download continues from there with an HTTP
+Range request, guarded by If-Range with the ETag or Last-Modified of the
+file it started on, so a newer build is never appended to an older one.
+Zips are extracted in parallel.
+
+The SHA-256 and size of each finished file are recorded in
+dependencies/manifest.json and checked on later runs, so a local copy that
+was damaged or truncated after it was downloaded is fetched again. This is
+not a check of what the server sent: a first download, and any new download
+of an unpinned file (e.g. the vgmstream nightly build), is recorded as it
+arrived. Only entries marked "pinned", which have to be added to the
+manifest by hand (none are shipped), are enforced on new downloads.
+"""
+
+import os
+import json
+import time
+import shutil
+import logging
+import zipfile
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Any, Tuple
+
+from audio_store import hash_file
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+CHUNK_SIZE = 256 * 1024
+DEFAULT_DOWNLOAD_WORKERS = 4
+REQUEST_TIMEOUT = 30
+# Minimum seconds between byte progress messages
+PROGRESS_INTERVAL = 1.0
+
+class DownloadCancelled(Exception):
+    """Raised inside a download when the caller asked to stop"""
+
+class DownloadManifest:
+    """File name -> URL, SHA-256 and size of the downloaded dependencies"""
+
+    def __init__(self, folder: str):
+        self.path = os.path.join(folder, MANIFEST_NAME)
+        self.lock = threading.Lock()
+        self.files: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.files = json.load(f).get("files", {})
+            except Exception as e:
+                logger.error(f"Error loading download manifest: {e}")
+
+    def get(self, name: str) -> Dict[str, Any]:
+        with self.lock:
+            return dict(self.files.get(name, {}))
+
+    def record(self, name: str, url: str, sha256: str, size: int):
+        """Remember a finished download, keeping its pinned flag"""
+        with self.lock:
+            entry = self.files.setdefault(name, {})
+            entry.update({"url": url, "sha256": sha256, "size": size})
+
+    def save(self):
+        """Write the manifest to disk"""
+        with self.lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "files": self.files}, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+def _total_size(response, offset: int) -> Optional[int]:
+    """Full size of the file from Content-Range, or Content-Length plus the resume offset"""
+    content_range = response.headers.get("Content-Range", "")
+    if "/" in content_range and not content_range.endswith("/*"):
+        return int(content_range.rsplit("/", 1)[1])
+    length = response.headers.get("Content-Length")
+    return int(length) + offset if length is not None else None
+
+def _range_start(response) -> Optional[int]:
+    """First byte of a 206 response, from "Content-Range: bytes <start>-<end>/<size>" """
+    content_range = response.headers.get("Content-Range", "")
+    try:
+        return int(content_range.split()[1].split("-")[0])
+    except (IndexError, ValueError):
+        return None
+
+def _validator(response) -> Optional[str]:
+    """Strong ETag, or else Last-Modified, of a response; weak ETags cannot be used in If-Range"""
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("Last-Modified")
+
+def _read_validator(part_path: str, url: str) -> Optional[str]:
+    """Validator saved next to a partial download of url, if any"""
+    try:
+        with open(f"{part_path}.json", "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data.get("validator") if data.get("url") == url else None
+
+def _write_validator(part_path: str, url: str, validator: Optional[str]):
+    """Save the validator of the file a partial download belongs to"""
+    if validator is None:
+        _remove(f"{part_path}.json")
+        return
+    with open(f"{part_path}.json", "w", encoding="utf-8") as f:
+        json.dump({"url": url, "validator": validator}, f)
+
+def _remove(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+def _discard_part(part_path: str):
+    """Remove a partial download and its validator"""
+    _remove(part_path)
+    _remove(f"{part_path}.json")
+
+def download_file(url: str,
+                  destination: str,
+                  expected_sha256: Optional[str] = None,
+                  progress: Optional[Callable[[int, Optional[int]], None]] = None,
+                  should_continue: Optional[Callable[[], bool]] = None) -> str:
+    """
+    Download a file, resuming from "<destination>.part" if it exists
+
+    A partial download is only resumed when the ETag or Last-Modified of
+    the file it came from was saved next to it ("<destination>.part.json").
+    It is sent as If-Range, so a server whose file changed since then sends
+    the new file whole and the download starts over. A partial file without
+    a validator is discarded.
+
+    Args:
+        url: URL to download
+        destination: Final path; only written once the download is complete and verified
+        expected_sha256: Hash the file must have, if known
+        progress: Optional callback with (bytes done, total bytes or None)
+        should_continue: Optional callback; when it returns False the download
+            stops and the partial file is kept for the next attempt
+
+    Returns:
+        SHA-256 of the downloaded file
+
+    Raises:
+        DownloadCancelled: If should_continue returned False
+        ValueError: If the file does not match expected_sha256
+        IOError: If the connection ended before the whole file arrived
+    """
+    part_path = f"{destination}.part"
+    validator = _read_validator(part_path, url) if os.path.exists(part_path) else None
+    if validator is None:
+        _discard_part(part_path)
+    offset = os.path.getsize(part_path) if validator is not None else 0
+    request = urllib.request.Request(url, headers={"User-Agent": "bg3-sounds-converter"})
+    if offset:
+        request.add_header("Range", f"bytes={offset}-")
+        request.add_header("If-Range", validator)
+
+    done = offset
+    total = None
+    try:
+        response = urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT)
+    except urllib.error.HTTPError as e:
+        if e.code != 416 or not offset:
+            raise
+        # 416 with a matching validator: nothing left after the offset. The
+        # partial file is only complete if "Content-Range: bytes */<size>" agrees
+        content_range = e.headers.get("Content-Range", "")
+        e.close()
+        if content_range.rsplit("/", 1)[-1] != str(offset):
+            _discard_part(part_path)
+            return download_file(url, destination, expected_sha256, progress, should_continue)
+        response = None
+    if response is not None:
+        with response:
+            if offset and (response.status != 206 or _range_start(response) != offset):
+                # The server ignored the Range header or the file changed: it sends the whole file
+                offset = done = 0
+            if not offset:
+                _write_validator(part_path, url, _validator(response))
+            total = _total_size(response, offset)
+            with open(part_path, "ab" if offset else "wb") as f:
+                while True:
+                    if should_continue is not None and not should_continue():
+                        raise DownloadCancelled(url)
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    done += len(chunk)
+                    if progress is not None:
+                        progress(done, total)
+        if total is not None and done < total:
+            raise IOError(f"connection closed after {done} of {total} bytes")
+
+    digest = hash_file(part_path)
+    if expected_sha256 and digest != expected_sha256.lower():
+        _discard_part(part_path)
+        raise ValueError(f"checksum mismatch: expected {expected_sha256}, got {digest}")
+    os.replace(part_path, destination)
+    _remove(f"{part_path}.json")
+    return digest
+
+def extract_zip(zip_path: str, extract_folder: str):
+    """Extract a zip into a temporary folder and swap it in, so a failed extraction leaves nothing half done"""
+    tmp_folder = f"{extract_folder}.tmp"
+    if os.path.exists(tmp_folder):
+        shutil.rmtree(tmp_folder)
+    with zipfile.ZipFile(zip_path, "r") as zip_ref:
+        zip_ref.extractall(tmp_folder)
+    if os.path.exists(extract_folder):
+        shutil.rmtree(extract_folder)
+    os.replace(tmp_folder, extract_folder)
+
+class ByteProgress:
+    """Aggregates byte counts of concurrent downloads into throttled log messages"""
+
+    def __init__(self, log: Callable[[str], None]):
+        self.log = log
+        self.lock = threading.Lock()
+        self.files: Dict[str, Tuple[int, Optional[int]]] = {}
+        self.last_report = 0.0
+
+    def update(self, name: str, done: int, total: Optional[int]):
+        with self.lock:
+            self.files[name] = (done, total)
+            now = time.monotonic()
+            if now - self.last_report < PROGRESS_INTERVAL:
+                return
+            self.last_report = now
+            done_bytes = sum(d for d, _ in self.files.values())
+            total_bytes = sum(t or d for d, t in self.files.values())
+        self.log(f"Downloaded {done_bytes / 1e6:.1f} / {total_bytes / 1e6:.1f} MB "
+                 f"({len(self.files)} files)")
+
+def download_dependencies(urls: List[str],
+                          folder: str,
+                          log: Callable[[str], None],
+                          should_continue: Optional[Callable[[], bool]] = None,
+                          max_workers: int = DEFAULT_DOWNLOAD_WORKERS) -> List[str]:
+    """
+    Download the dependencies, check local copies against the manifest and extract them
+
+    Args:
+        urls: URLs to download; files are named after the last URL component
+        folder: Dependencies folder
+        log: Callback for progress messages
+        should_continue: Optional callback; when it returns False, downloads stop
+            (partial files are kept) and no more zips are extracted
+        max_workers: Number of files downloaded or extracted at once
+
+    Returns:
+        Names of the files that could not be downloaded or extracted
+    """
+    os.makedirs(folder, exist_ok=True)
+    manifest = DownloadManifest(folder)
+    byte_progress = ByteProgress(log)
+    failed: List[str] = []
+
+    def fetch(url: str) -> Tuple[str, bool]:
+        """Make sure one file is present and matches its recorded hash; returns (name, downloaded now)"""
+        name = url.split("/")[-1]
+        destination = os.path.join(folder, name)
+        entry = manifest.get(name)
+        if os.path.exists(destination):
+            if entry.get("sha256"):
+                if hash_file(destination) == entry["sha256"]:
+                    log(f"{name} already exists (checksum OK).")
+                    return name, False
+                log(f"{name} does not match its checksum, downloading it again.")
+                os.remove(destination)
+            else:
+                # Unknown file from an older version: it may be truncated or an
+                # older build, so it is replaced rather than trusted or resumed
+                log(f"{name} is not in the manifest, downloading it again.")
+        log(f"Downloading {name}...")
+        expected = entry.get("sha256") if entry.get("pinned") else None
+        digest = download_file(url, destination, expected,
+                               progress=lambda done, total: byte_progress.update(name, done, total),
+                               should_continue=should_continue)
+        manifest.record(name, url, digest, os.path.getsize(destination))
+        log(f"Downloaded {name}")
+        return name, True
+
+    def run_parallel(func, items) -> List[Any]:
+        results = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(func, item): item for item in items}
+            for future, item in futures.items():
+                name = str(item).split("/")[-1]
+                try:
+                    results.append(future.result())
+                except DownloadCancelled:
+                    log(f"{name} cancelled.")
+                    failed.append(name)
+                except Exception as e:
+                    log(f"Error with {name}: {e}")
+                    failed.append(name)
+        return results
+
+    fetched = run_parallel(fetch, urls)
+    manifest.save()
+
+    to_extract = []
+    for name, downloaded_now in fetched:
+        if not name.lower().endswith(".zip"):
+            continue
+        extract_folder = os.path.join(folder, name[:-4])
+        if os.path.exists(extract_folder) and not downloaded_now:
+            log(f"{name} already extracted.")
+        else:
+            to_extract.append(name)
+
+    def extract(name: str) -> str:
+        if should_continue is not None and not should_continue():
+            raise DownloadCancelled(name)
+        log(f"Extracting {name}...")
+        extract_folder = os.path.join(folder, name[:-4])
+        extract_zip(os.path.join(folder, name), extract_folder)
+        log(f"Extracted {name} to {extract_folder}")
+        return name
+
+    run_parallel(extract, to_extract)
+    return failed
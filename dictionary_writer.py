@@ -0,0 +1,90 @@
+""" dictionary_writer.py - Incremental writer for the bank dictionary JSON
+Writes the {category: {bank name: bank info}} dictionary built by app2.py one
+bank at a time. Each finished bank is serialized straight away into a spool
+file per category, so only the bank being written is held in memory. When
+all banks are done the spools are stitched into the final JSON, which is
+formatted exactly like json.dump(all_banks, indent=2, ensure_ascii=False).
+"""
+
+import os
+import json
+import shutil
+import logging
+import tempfile
+from typing import Dict, Optional, Any, BinaryIO, Iterable, Mapping, Tuple
+
+logger = logging.getLogger(__name__)
+
+class DictionaryWriter:
+    """Streams bank results into the dictionary JSON file"""
+
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(output_dir, exist_ok=True)
+        self.spool_dir = tempfile.mkdtemp(prefix=".bg3_dictionary_", dir=output_dir)
+        self.spools: Dict[str, BinaryIO] = {}
+        # Category -> bank name -> (offset, length) of its JSON in the spool
+        self.entries: Dict[str, Dict[str, Tuple[int, int]]] = {}
+        self.bank_count = 0
+        self.sound_count = 0
+
+    def add(self, category: str, bank_name: str, bank_info: Dict[str, Any]):
+        """Serialize one finished bank"""
+        spool = self.spools.get(category)
+        if spool is None:
+            spool = open(os.path.join(self.spool_dir, f"{len(self.spools)}.json"), "w+b")
+            self.spools[category] = spool
+            self.entries[category] = {}
+        data = json.dumps(bank_info, indent=2, ensure_ascii=False).encode("utf-8")
+        spool.seek(0, os.SEEK_END)
+        self.entries[category][bank_name] = (spool.tell(), len(data))
+        spool.write(data)
+        self.bank_count += 1
+        self.sound_count += len(bank_info.get("sound_files", {}))
+
+    def close(self, order: Optional[Mapping[str, Iterable[str]]] = None):
+        """
+        Write the final JSON file and remove the spools
+
+        Args:
+            order: Optional category -> bank names giving the order to write
+                banks in (e.g. discovery order); banks not in it follow in the
+                order they finished, names without a result are skipped
+        """
+        categories = list(order or {}) + [c for c in self.entries if c not in (order or {})]
+        tmp_path = f"{self.output_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as out:
+                written_categories = 0
+                for category in categories:
+                    entries = self.entries.get(category)
+                    if not entries:
+                        continue
+                    names = [name for name in (order or {}).get(category, ()) if name in entries]
+                    listed = set(names)
+                    names += [name for name in entries if name not in listed]
+                    out.write("{\n  " if written_categories == 0 else ",\n  ")
+                    out.write(json.dumps(category, ensure_ascii=False) + ": {")
+                    spool = self.spools[category]
+                    for index, name in enumerate(names):
+                        offset, length = entries[name]
+                        spool.seek(offset)
+                        text = spool.read(length).decode("utf-8").replace("\n", "\n    ")
+                        out.write("\n    " if index == 0 else ",\n    ")
+                        out.write(json.dumps(name, ensure_ascii=False) + ": " + text)
+                    out.write("\n  }")
+                    written_categories += 1
+                out.write("\n}" if written_categories else "{}")
+            os.replace(tmp_path, self.output_path)
+        finally:
+            self.discard()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def discard(self):
+        """Drop everything written so far without touching the output file"""
+        for spool in self.spools.values():
+            spool.close()
+        self.spools = {}
+        shutil.rmtree(self.spool_dir, ignore_errors=True)
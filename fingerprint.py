@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+""" fingerprint.py - Silent and duplicate sound detection
+Hashes the raw WEM files and computes a cheap spectral fingerprint of the
+decoded PCM (the converted WAVs), then groups sounds that are byte-identical
+or sound the same under different IDs. The convert stage of app.py reads the
+index to skip silent placeholders and duplicates.
+
+Usage:
+    python fingerprint.py --unpacked <UnpackedData> --store AudioStore
+    python fingerprint.py --unpacked <UnpackedData> --folder ConvertedAudio
+"""
+
+import os
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Any, Tuple
+
+from config_manager import get_config
+from audio_store import AudioStore, hash_file
+from sound_scanner import SoundScanner
+from tool_registry import tool_version, cache_tag
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = os.path.join(os.getcwd(), "fingerprints.json")
+
+# Spectral fingerprint layout: energy in BANDS log-spaced bands, averaged over
+# SEGMENTS equal slices of the sound, one bit per cell (above/below median)
+FRAME_SIZE = 2048
+BANDS = 16
+SEGMENTS = 8
+# Only the start of long sounds is fingerprinted
+MAX_SECONDS = 20.0
+# Cells this far (in log10 energy, i.e. 10 dB steps) below the loudest are
+# noise floor and always 0, so quantization noise cannot flip them
+NOISE_FLOOR = 6.0
+# Fingerprints differing in at most this many bits are near-duplicates. The
+# fingerprint is split into LSH_BANDS chunks; by pigeonhole, near-duplicates
+# share at least one chunk exactly, so only those pairs are compared.
+MAX_HAMMING = 7
+LSH_BANDS = MAX_HAMMING + 1
+
+def spectral_fingerprint(wav_path: str) -> Dict[str, Any]:
+    """
+    Compute the fingerprint of a decoded WAV
+
+    Args:
+        wav_path: Path to the WAV file
+
+    Returns:
+        Dictionary with fingerprint (hex string), duration and silent,
+        or with an "error" entry if the file cannot be read
+    """
+    # NumPy is only needed here, so app.py can read the index without it
+    import numpy as np
+    from audio_analysis import read_wav_layout, analyze_wav
+
+    analysis = analyze_wav(wav_path)
+    if "error" in analysis:
+        return analysis
+    result = {"duration": analysis["duration"], "silent": analysis["silent"], "fingerprint": ""}
+    if analysis["silent"]:
+        return result
+    try:
+        dtype, channels, sample_rate, offset, size = read_wav_layout(wav_path)
+        frames = min(size // (dtype.itemsize * channels), int(MAX_SECONDS * sample_rate))
+        if frames < FRAME_SIZE:
+            frames_used = frames
+        else:
+            frames_used = frames - frames % FRAME_SIZE
+        samples = np.memmap(wav_path, dtype=dtype, mode="r", offset=offset, shape=(frames_used * channels,))
+        mono = samples.reshape(-1, channels).astype(np.float64).mean(axis=1)
+        del samples
+        if mono.shape[0] < FRAME_SIZE:
+            mono = np.pad(mono, (0, FRAME_SIZE - mono.shape[0]))
+        spectrum = np.abs(np.fft.rfft(mono.reshape(-1, FRAME_SIZE) * np.hanning(FRAME_SIZE), axis=1)) ** 2
+        edges = np.unique(np.geomspace(1, spectrum.shape[1], BANDS + 1).astype(int))
+        bands = np.add.reduceat(spectrum, edges[:-1], axis=1)
+        segments = np.array_split(bands, min(SEGMENTS, bands.shape[0]), axis=0)
+        cells = np.log10(np.concatenate([segment.mean(axis=0) for segment in segments]) + 1e-12)
+        bits = (cells > np.median(cells)) & (cells > cells.max() - NOISE_FLOOR)
+        result["fingerprint"] = np.packbits(bits).tobytes().hex()
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+# Entry fields computed from the decoded audio, which depend on the vgmstream version
+DECODED_FIELDS = ("fingerprint", "silent", "duration")
+
+class FingerprintIndex:
+    """Sound ID -> raw hash and fingerprint, with duplicate grouping"""
+
+    def __init__(self, index_path: str = DEFAULT_INDEX_PATH, tool: Optional[str] = None):
+        """
+        Args:
+            index_path: Index file
+            tool: cache_tag() of the vgmstream version the WAVs are decoded with;
+                fingerprints of audio decoded by another version are dropped
+                (raw hashes are kept) and made again by build_index()
+        """
+        self.index_path = index_path
+        self.tool = tool
+        self.sounds: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, "r", encoding="utf-8") as f:
+                    self.sounds = json.load(f).get("sounds", {})
+            except Exception as e:
+                logger.error(f"Error loading fingerprint index: {e}")
+        if tool:
+            stale = 0
+            for entry in self.sounds.values():
+                if entry.get("tool") != tool and any(field in entry for field in DECODED_FIELDS):
+                    for field in DECODED_FIELDS:
+                        entry.pop(field, None)
+                    stale += 1
+            if stale:
+                logger.info(f"Dropped {stale} fingerprints of audio decoded by another vgmstream version")
+
+    def save(self):
+        """Write the index to disk"""
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "sounds": self.sounds}, f, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+    def duplicate_groups(self, near_duplicates: bool = True) -> List[List[str]]:
+        """
+        Group sound IDs that are byte-identical or have the same fingerprint and length
+
+        Args:
+            near_duplicates: Also group by fingerprint; otherwise only byte-identical WEMs
+
+        Returns:
+            Groups of two or more sound IDs; the first ID of each group is the canonical one
+        """
+        parent = {sound_id: sound_id for sound_id in self.sounds}
+
+        def find(sound_id):
+            while parent[sound_id] != sound_id:
+                parent[sound_id] = parent[parent[sound_id]]
+                sound_id = parent[sound_id]
+            return sound_id
+
+        def union_by(key_of):
+            first: Dict[Any, str] = {}
+            for sound_id, entry in self.sounds.items():
+                key = key_of(entry)
+                if key is None:
+                    continue
+                if key in first:
+                    parent[find(sound_id)] = find(first[key])
+                else:
+                    first[key] = sound_id
+
+        union_by(lambda entry: entry.get("raw_hash"))
+        if near_duplicates:
+            self._union_near_duplicates(find, parent)
+
+        groups: Dict[str, List[str]] = {}
+        for sound_id in self.sounds:
+            groups.setdefault(find(sound_id), []).append(sound_id)
+        return [sorted(group) for group in groups.values() if len(group) > 1]
+
+    def _union_near_duplicates(self, find, parent):
+        """Join sounds of the same length whose fingerprints differ in at most MAX_HAMMING bits"""
+        fingerprints = {}
+        buckets: Dict[Tuple[float, int, str], List[str]] = {}
+        for sound_id, entry in self.sounds.items():
+            fingerprint = entry.get("fingerprint")
+            if not fingerprint:
+                continue
+            fingerprints[sound_id] = int(fingerprint, 16)
+            duration = round(entry.get("duration", 0.0), 1)
+            chunk = -(-len(fingerprint) // LSH_BANDS)
+            for band in range(LSH_BANDS):
+                key = (duration, band, fingerprint[band * chunk:(band + 1) * chunk])
+                buckets.setdefault(key, []).append(sound_id)
+        for candidates in buckets.values():
+            for i, sound_id in enumerate(candidates):
+                for other_id in candidates[i + 1:]:
+                    if find(sound_id) == find(other_id):
+                        continue
+                    if bin(fingerprints[sound_id] ^ fingerprints[other_id]).count("1") <= MAX_HAMMING:
+                        parent[find(other_id)] = find(sound_id)
+
+    def skip_plan(self, near_duplicates: bool = False) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Work out which sounds the convert stage can skip
+
+        Near-duplicates are opt-in: a skipped sound gets its canonical sound's
+        audio, which is only exact for byte-identical WEMs.
+
+        Args:
+            near_duplicates: Also skip sounds that only share a fingerprint
+
+        Returns:
+            Tuple of (duplicate ID -> canonical ID, silent IDs)
+        """
+        duplicates = {}
+        for group in self.duplicate_groups(near_duplicates):
+            for sound_id in group[1:]:
+                duplicates[sound_id] = group[0]
+        silent = [sound_id for sound_id, entry in self.sounds.items() if entry.get("silent")]
+        return duplicates, silent
+
+def build_index(index: FingerprintIndex,
+                wem_paths: List[str],
+                wav_paths: Dict[str, str],
+                num_processes: Optional[int] = None) -> int:
+    """
+    Update the index with raw hashes and fingerprints
+
+    Unchanged WEMs (same size and mtime) keep their previous entry. New
+    fingerprints are tagged with the index's vgmstream version.
+
+    Args:
+        index: Index to update
+        wem_paths: Raw WEM files
+        wav_paths: Sound ID -> converted WAV to fingerprint
+        num_processes: Pool size for fingerprinting (defaults to the CPU count)
+
+    Returns:
+        Number of sounds (re)processed
+    """
+    todo = []
+    for wem_path in wem_paths:
+        sound_id = os.path.basename(wem_path).split(".")[0]
+        stat = os.stat(wem_path)
+        entry = index.sounds.get(sound_id)
+        if entry and entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime \
+                and (entry.get("fingerprint") or entry.get("silent") or sound_id not in wav_paths):
+            continue
+        index.sounds[sound_id] = {
+            "path": wem_path,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "raw_hash": hash_file(wem_path),
+        }
+        if sound_id in wav_paths:
+            todo.append(sound_id)
+
+    with ProcessPoolExecutor(max_workers=num_processes) as executor:
+        for sound_id, result in zip(todo, executor.map(spectral_fingerprint, [wav_paths[i] for i in todo], chunksize=16)):
+            if "error" in result:
+                logger.warning(f"Cannot fingerprint {sound_id}: {result['error']}")
+            index.sounds[sound_id].update({k: v for k, v in result.items() if k != "error"})
+            if index.tool:
+                index.sounds[sound_id]["tool"] = index.tool
+    return len(todo)
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Find silent and duplicate BG3 sounds")
+    parser.add_argument("--unpacked", default=get_config("folder_unpacked_data"), help="UnpackedData folder")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--store", help="Audio store with the converted sounds (default from config)")
+    source.add_argument("--folder", help="Folder of converted <id>.wem.wav files")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="Fingerprint index file")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+
+    start = time.perf_counter()
+    scanner = SoundScanner(extensions=(".wem",))
+    wem_paths = list(scanner.scan_parallel(args.unpacked))
+    logger.info(scanner.rate_message())
+
+    vgmstream_version = tool_version("vgmstream")
+    wav_paths = {}
+    if args.folder:
+        for root, _, files in os.walk(args.folder):
+            for file in files:
+                if file.lower().endswith(".wem.wav"):
+                    wav_paths[file.split(".")[0]] = os.path.join(root, file)
+    else:
+        store = AudioStore(args.store or get_config("folder_audio_store"), vgmstream_version)
+        for key, entry in store.sources.items():
+            # Sounds converted by an older vgmstream are fingerprinted once they are converted again
+            if vgmstream_version is None or entry.get("tool") == vgmstream_version:
+                wav_paths[key.partition("/")[2]] = store.object_path(entry["hash"])
+
+    index = FingerprintIndex(args.index, cache_tag(vgmstream_version))
+    processed = build_index(index, wem_paths, wav_paths, args.processes)
+    index.save()
+    duplicates, silent = index.skip_plan()
+    logger.info(f"Fingerprinted {processed} sounds in {time.perf_counter() - start:.1f}s; "
+                f"{len(index.duplicate_groups())} duplicate groups, {len(duplicates)} duplicates, "
+                f"{len(silent)} silent of {len(index.sounds)} sounds")
+
+if __name__ == "__main__":
+    main()
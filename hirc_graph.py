@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+""" hirc_graph.py - Event -> sound resolution over the Wwise object hierarchy
+Loads the HIRC objects (events, actions, containers, sounds, music nodes)
+from the bank XMLs written by wwiser into compact integer arrays, follows
+Event -> Play action -> containers -> Sound/MusicTrack edges with memoized
+traversal, and writes an index of the sounds and media (WEM) IDs each event
+can play. The graph spans all banks, so events that play sounds stored in
+another bank are resolved too.
+
+Usage:
+    python hirc_graph.py build --xml ConvertedBanks
+    python hirc_graph.py lookup 123456789
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import xml.etree.ElementTree as ET
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Any, Iterator, Tuple, FrozenSet
+
+from config_manager import get_config
+from tool_registry import tool_version
+from name_resolver import load_name_resolver
+from sound_filter import bank_name_of
+from sound_mappings import open_bank_xml, is_bank_xml, XML_READ_ERRORS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = os.path.join(os.getcwd(), "event_index.json")
+
+# Reference fields followed from an object to the objects it plays:
+# event -> actions, play action -> target, container -> children, music playlist -> segments
+EDGE_FIELDS = {"ulActionID", "idExt", "ulChildID", "SegmentID"}
+# Fields naming the media (WEM) a sound or music track plays
+MEDIA_FIELDS = {"sourceID"}
+
+KIND_OTHER = 0
+KIND_EVENT = 1
+KIND_ACTION = 2
+KIND_PLAY = 3
+KIND_SOUND = 4
+
+def _kind_of(object_name: str) -> int:
+    if object_name == "CAkEvent":
+        return KIND_EVENT
+    if object_name.startswith("CAkActionPlay"):
+        return KIND_PLAY
+    if object_name.startswith("CAkAction"):
+        return KIND_ACTION
+    if object_name in ("CAkSound", "CAkMusicTrack"):
+        return KIND_SOUND
+    return KIND_OTHER
+
+def iter_hirc_objects(xml_path: str) -> Iterator[Tuple[int, int, List[int], List[int], str]]:
+    """
+    Stream the HIRC objects of one bank XML
+
+    Args:
+        xml_path: Path to a .bnk.xml file produced by wwiser, optionally compressed
+
+    Yields:
+        Tuples of (object ID, kind, referenced object IDs, media IDs, name);
+        name is the hashname wwiser resolved for the ID, or ""
+    """
+    with open_bank_xml(xml_path) as xml_file:
+        for _, element in ET.iterparse(xml_file, events=("end",)):
+            if element.tag != "object" or not element.get("name", "").startswith("CAk"):
+                continue
+            id_field = next((child for child in element
+                             if child.tag == "field" and child.get("name") == "ulID"), None)
+            if id_field is None:
+                # A sub-structure (e.g. a stinger) of the enclosing HIRC object
+                continue
+            refs, media = [], []
+            for field in element.iter("field"):
+                field_name = field.get("name")
+                if field_name in EDGE_FIELDS or field_name in MEDIA_FIELDS:
+                    value = field.get("value", "")
+                    if value.isdigit() and value != "0":
+                        (refs if field_name in EDGE_FIELDS else media).append(int(value))
+            yield (int(id_field.get("value")), _kind_of(element.get("name")), refs, media,
+                   id_field.get("hashname", ""))
+            element.clear()
+
+def read_bank_objects(xml_path: str) -> Tuple[str, List[Tuple[int, int, List[int], List[int], str]]]:
+    """Read every HIRC object of a bank XML; runs in a worker process"""
+    try:
+        return xml_path, list(iter_hirc_objects(xml_path))
+    except (ET.ParseError, ValueError) + XML_READ_ERRORS as e:
+        logger.error(f"Cannot parse {xml_path}: {e}")
+        return xml_path, []
+
+class HircGraph:
+    """All HIRC objects of the loaded banks, as integer-indexed arrays"""
+
+    def __init__(self):
+        self.index_of: Dict[int, int] = {}
+        self.ids = array("I")
+        self.kinds = array("B")
+        self.banks: List[str] = []
+        self.bank_of = array("H")
+        self.names: Dict[int, str] = {}
+        # Edges and media in compressed sparse row form, filled by finalize()
+        self.edge_start = array("I")
+        self.edges = array("I")
+        self.media_start = array("I")
+        self.media = array("I")
+        self._pending: List[Tuple[List[int], List[int]]] = []
+
+    def add_bank(self, bank_name: str, objects: List[Tuple[int, int, List[int], List[int], str]]):
+        """Add the objects of one bank; objects already loaded from another bank are kept"""
+        bank = len(self.banks)
+        self.banks.append(bank_name)
+        for object_id, kind, refs, media, name in objects:
+            if object_id in self.index_of:
+                continue
+            self.index_of[object_id] = len(self.ids)
+            self.ids.append(object_id)
+            self.kinds.append(kind)
+            self.bank_of.append(bank)
+            if name:
+                self.names[object_id] = name
+            self._pending.append((refs, media))
+
+    def finalize(self):
+        """Turn the collected references into index arrays; call once all banks are added"""
+        self.edge_start = array("I", [0])
+        self.media_start = array("I", [0])
+        for node, (refs, media) in enumerate(self._pending):
+            kind = self.kinds[node]
+            # Only play actions lead to sounds; stop/pause/set actions do not
+            if kind != KIND_ACTION:
+                for ref in refs:
+                    target = self.index_of.get(ref)
+                    if target is not None and target != node:
+                        self.edges.append(target)
+            self.edge_start.append(len(self.edges))
+            self.media.extend(media)
+            self.media_start.append(len(self.media))
+        self._pending = []
+
+    def resolve(self, node: int,
+                memo: Dict[int, Tuple[FrozenSet[int], FrozenSet[int]]]) -> Tuple[FrozenSet[int], FrozenSet[int]]:
+        """
+        Sounds and media reachable from an object
+
+        Walks the graph depth first without recursion, so deep container
+        chains cannot hit the recursion limit. Edges back into the current
+        path (cycles) are skipped.
+
+        Args:
+            node: Object index
+            memo: Results of earlier calls; shared subtrees are resolved once
+
+        Returns:
+            Tuple of (sound object IDs, media IDs)
+        """
+        if node in memo:
+            return memo[node]
+        stack = [(node, self.edge_start[node])]
+        on_path = {node}
+        while stack:
+            current, position = stack[-1]
+            end = self.edge_start[current + 1]
+            while position < end:
+                target = self.edges[position]
+                position += 1
+                if target not in memo and target not in on_path:
+                    stack[-1] = (current, position)
+                    stack.append((target, self.edge_start[target]))
+                    on_path.add(target)
+                    break
+            else:
+                # Every child is resolved (or on the path): combine them
+                sounds = {self.ids[current]} if self.kinds[current] == KIND_SOUND else set()
+                media = set(self.media[self.media_start[current]:self.media_start[current + 1]])
+                for target in self.edges[self.edge_start[current]:end]:
+                    child = memo.get(target)
+                    if child is not None:
+                        sounds |= child[0]
+                        media |= child[1]
+                memo[current] = (frozenset(sounds), frozenset(media))
+                on_path.discard(current)
+                stack.pop()
+        return memo[node]
+
+    def resolve_events(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Resolve every event
+
+        Returns:
+            Dictionary mapping event IDs to their name, bank, sound IDs and media IDs
+        """
+        memo: Dict[int, Tuple[FrozenSet[int], FrozenSet[int]]] = {}
+        events = {}
+        for node, kind in enumerate(self.kinds):
+            if kind != KIND_EVENT:
+                continue
+            sounds, media = self.resolve(node, memo)
+            event_id = self.ids[node]
+            events[str(event_id)] = {
+                "name": self.names.get(event_id, ""),
+                "bank": self.banks[self.bank_of[node]],
+                "sounds": sorted(sounds),
+                "media": sorted(media),
+            }
+        return events
+
+def find_bank_xmls(folder: str) -> List[str]:
+    """All .bnk.xml files (compressed or not) under a folder"""
+    xml_paths = []
+    for root, _, files in os.walk(folder):
+        for file in files:
+            if is_bank_xml(file):
+                xml_paths.append(os.path.join(root, file))
+    return sorted(xml_paths)
+
+def build_graph(xml_paths: List[str], num_processes: Optional[int] = None) -> HircGraph:
+    """
+    Load the HIRC objects of the given bank XMLs, parsing them in a process pool
+
+    Args:
+        xml_paths: Bank XML files
+        num_processes: Pool size (defaults to the CPU count)
+
+    Returns:
+        The finalized graph
+    """
+    graph = HircGraph()
+    with ProcessPoolExecutor(max_workers=num_processes) as executor:
+        # Banks are added in path order so the result does not depend on timing
+        for xml_path, objects in executor.map(read_bank_objects, xml_paths, chunksize=4):
+            graph.add_bank(bank_name_of(xml_path), objects)
+    graph.finalize()
+    return graph
+
+def save_index(events: Dict[str, Dict[str, Any]], index_path: str):
+    """Write the event index, recording the wwiser version the XMLs came from"""
+    tmp_path = f"{index_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "wwiser": tool_version("wwiser"), "events": events}, f)
+    os.replace(tmp_path, index_path)
+
+def load_index(index_path: str) -> Dict[str, Dict[str, Any]]:
+    """Read the events of an index written by save_index()"""
+    with open(index_path, "r", encoding="utf-8") as f:
+        return json.load(f).get("events", {})
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Resolve Wwise events to the sounds they play")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="Event index file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Build the event index from bank XMLs")
+    build_parser.add_argument("--xml", default=get_config("xml_output_folder") or get_config("folder_banks_converted"),
+                              help="Folder with the .bnk.xml files (searched recursively)")
+    build_parser.add_argument("--processes", type=int, default=None)
+    lookup_parser = subparsers.add_parser("lookup", help="Show what events play")
+    lookup_parser.add_argument("events", nargs="+", help="Event IDs or names")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+
+    if args.command == "build":
+        xml_paths = find_bank_xmls(args.xml)
+        if not xml_paths:
+            logger.error(f"No .bnk.xml files found in {args.xml}")
+            sys.exit(1)
+        start = time.perf_counter()
+        graph = build_graph(xml_paths, args.processes)
+        loaded = time.perf_counter()
+        events = graph.resolve_events()
+        resolved = time.perf_counter()
+        resolver = load_name_resolver()
+        if resolver is not None:
+            for event_id, event in events.items():
+                if not event["name"]:
+                    event["name"] = resolver.lookup(int(event_id)) or ""
+        save_index(events, args.index)
+        logger.info(f"Loaded {len(graph.ids)} objects from {len(xml_paths)} banks in {loaded - start:.2f}s, "
+                    f"resolved {len(events)} events in {resolved - loaded:.2f}s")
+        logger.info(f"{sum(1 for event in events.values() if event['media'])} events play at least one sound; "
+                    f"index written to {args.index}")
+    else:
+        if not os.path.exists(args.index):
+            logger.error(f"Index not found: {args.index}; run 'hirc_graph.py build' first")
+            sys.exit(1)
+        events = load_index(args.index)
+        by_name = {event["name"].lower(): event_id for event_id, event in events.items() if event["name"]}
+        for query in args.events:
+            event_id = query if query in events else by_name.get(query.lower())
+            if event_id is None:
+                print(f"{query}: not found")
+                continue
+            event = events[event_id]
+            print(f"{event_id} {event['name']} ({event['bank']}): "
+                  f"{len(event['sounds'])} sounds, media {', '.join(map(str, event['media'])) or '-'}")
+
+if __name__ == "__main__":
+    main()
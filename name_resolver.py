@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+""" name_resolver.py - Wwise ID -> name lookup from wwnames.db3
+Loads the FNV hash -> name table from wwiser's wwnames.db3 once into a
+sorted hash array plus one UTF-8 name blob, and caches that in a binary
+file that loads in a few milliseconds. Lookups are a binary search.
+
+The cache is keyed on the wwnames.db3 version reported by the tool
+registry, so it is rebuilt when the database is updated.
+
+Usage:
+    python name_resolver.py lookup 123456789
+    python name_resolver.py enrich --dictionary bg3_sounds.json
+"""
+
+import os
+import sys
+import json
+import time
+import struct
+import sqlite3
+import logging
+import argparse
+from array import array
+from bisect import bisect_left
+from typing import Dict, List, Optional, Any, Tuple
+
+from config_manager import get_config
+from tool_registry import tool_registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(os.getcwd(), "wwnames_cache.bin")
+CACHE_MAGIC = b"WWNC"
+CACHE_FORMAT_VERSION = 1
+# magic, format version, name count, blob size, source version length
+CACHE_HEADER = struct.Struct("<4sIIII")
+
+def _native(values: array) -> array:
+    """Convert little-endian cache arrays to the machine byte order (and back)"""
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+class NameResolver:
+    """Sorted hash array with the matching names"""
+
+    def __init__(self, hashes: array, offsets: array, blob: bytes):
+        self.hashes = hashes
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def lookup(self, hash_value: int) -> Optional[str]:
+        """Name for a Wwise ID, or None if wwnames does not know it"""
+        index = bisect_left(self.hashes, hash_value)
+        if index == len(self.hashes) or self.hashes[index] != hash_value:
+            return None
+        return self.blob[self.offsets[index]:self.offsets[index + 1]].decode("utf-8")
+
+    @classmethod
+    def from_rows(cls, rows: List[Tuple[int, str]]) -> "NameResolver":
+        """Build from (hash, name) rows; the first name of a repeated hash wins"""
+        rows = sorted(rows, key=lambda row: row[0])
+        hashes = array("I")
+        offsets = array("I", [0])
+        parts = []
+        size = 0
+        previous = None
+        for hash_value, name in rows:
+            if hash_value == previous or not name:
+                continue
+            previous = hash_value
+            encoded = name.encode("utf-8")
+            hashes.append(hash_value)
+            parts.append(encoded)
+            size += len(encoded)
+            offsets.append(size)
+        return cls(hashes, offsets, b"".join(parts))
+
+    @classmethod
+    def from_db3(cls, db_path: str) -> "NameResolver":
+        """Read the names table of wwnames.db3"""
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(names)")]
+            hash_column = "hash" if "hash" in columns else "id"
+            rows = [(hash_value & 0xFFFFFFFF, name) for hash_value, name in
+                    conn.execute(f"SELECT {hash_column}, name FROM names WHERE name IS NOT NULL")]
+        finally:
+            conn.close()
+        return cls.from_rows(rows)
+
+    def save(self, cache_path: str, source_version: str):
+        """Write the binary cache"""
+        version = source_version.encode("utf-8")
+        tmp_path = f"{cache_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_FORMAT_VERSION, len(self.hashes), len(self.blob), len(version)))
+            f.write(version)
+            f.write(_native(array("I", self.hashes)).tobytes())
+            f.write(_native(array("I", self.offsets)).tobytes())
+            f.write(self.blob)
+        os.replace(tmp_path, cache_path)
+
+    @classmethod
+    def load(cls, cache_path: str, source_version: str) -> Optional["NameResolver"]:
+        """Read the binary cache, or None if it is missing, damaged or for another source version"""
+        try:
+            with open(cache_path, "rb") as f:
+                magic, format_version, count, blob_size, version_size = CACHE_HEADER.unpack(f.read(CACHE_HEADER.size))
+                if magic != CACHE_MAGIC or format_version != CACHE_FORMAT_VERSION:
+                    return None
+                if f.read(version_size).decode("utf-8") != source_version:
+                    return None
+                hashes = array("I")
+                hashes.frombytes(f.read(count * 4))
+                offsets = array("I")
+                offsets.frombytes(f.read((count + 1) * 4))
+                blob = f.read(blob_size)
+        except (OSError, struct.error, ValueError, UnicodeDecodeError):
+            return None
+        if len(hashes) != count or len(offsets) != count + 1 or len(blob) != blob_size:
+            return None
+        return cls(_native(hashes), _native(offsets), blob)
+
+def load_name_resolver(db_path: Optional[str] = None,
+                       cache_path: str = DEFAULT_CACHE_PATH) -> Optional[NameResolver]:
+    """
+    Load the resolver from the binary cache, building the cache from wwnames.db3 if needed
+
+    Args:
+        db_path: wwnames.db3 to use; defaults to the one the tool registry finds
+        cache_path: Binary cache file
+
+    Returns:
+        The resolver, or None if no wwnames.db3 is available
+    """
+    info = tool_registry.probe("wwnames", db_path)
+    if info is None:
+        return None
+    start = time.perf_counter()
+    resolver = NameResolver.load(cache_path, info["version"])
+    if resolver is not None:
+        logger.info(f"Loaded {len(resolver)} names from {cache_path} in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return resolver
+    try:
+        resolver = NameResolver.from_db3(info["path"])
+    except sqlite3.Error as e:
+        logger.error(f"Cannot read {info['path']}: {e}")
+        return None
+    logger.info(f"Read {len(resolver)} names from {info['path']} in {time.perf_counter() - start:.2f}s")
+    try:
+        resolver.save(cache_path, info["version"])
+    except OSError as e:
+        logger.warning(f"Cannot write name cache: {e}")
+    return resolver
+
+def enrich_bank(bank_info: Dict[str, Any], resolver: NameResolver) -> int:
+    """
+    Add "wwise_name" to a bank entry and its sound entries where wwnames knows the ID
+
+    Bank entries are looked up by their name when it is numeric (a bank ID).
+
+    Returns:
+        Number of names added
+    """
+    added = 0
+    bank_name = bank_info.get("name", "")
+    if bank_name.isdigit():
+        name = resolver.lookup(int(bank_name))
+        if name:
+            bank_info["wwise_name"] = name
+            added += 1
+    for sound_id, sound_info in bank_info.get("sound_files", {}).items():
+        if sound_id.isdigit():
+            name = resolver.lookup(int(sound_id))
+            if name:
+                sound_info["wwise_name"] = name
+                added += 1
+    return added
+
+def enrich_dictionary(all_banks: Dict[str, Dict[str, Any]], resolver: NameResolver) -> int:
+    """Run enrich_bank() over every bank of a dictionary; returns the number of names added"""
+    return sum(enrich_bank(bank_info, resolver)
+               for banks in all_banks.values() for bank_info in banks.values())
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Resolve Wwise IDs to names with wwnames.db3")
+    parser.add_argument("--db", default=None, help="wwnames.db3 (default: found by the tool registry)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="Binary name cache")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    lookup_parser = subparsers.add_parser("lookup", help="Look up IDs")
+    lookup_parser.add_argument("ids", nargs="+", type=int)
+    enrich_parser = subparsers.add_parser("enrich", help="Add names to a bank dictionary in place")
+    enrich_parser.add_argument("--dictionary", default=get_config("output_json"), help="Bank dictionary JSON from app2.py")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+
+    resolver = load_name_resolver(args.db, args.cache)
+    if resolver is None:
+        logger.error("wwnames.db3 not found; use --db or download the dependencies first")
+        sys.exit(1)
+
+    if args.command == "lookup":
+        for hash_value in args.ids:
+            print(f"{hash_value}: {resolver.lookup(hash_value) or '-'}")
+    else:
+        with open(args.dictionary, "r", encoding="utf-8") as f:
+            all_banks = json.load(f)
+        added = enrich_dictionary(all_banks, resolver)
+        tmp_path = f"{args.dictionary}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(all_banks, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, args.dictionary)
+        logger.info(f"Added {added} names to {args.dictionary}")
+
+if __name__ == "__main__":
+    main()
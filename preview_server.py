@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+""" preview_server.py - Local audio preview service for BG3 sounds
+Serves single sounds as WAV on request, decoding the loose or bank-embedded
+WEM with vgmstream-cli, so nothing has to be converted up front. Decoded
+sounds are kept in a size-bounded LRU cache in memory and on disk.
+
+Endpoints:
+    GET /                   small search-and-play page
+    GET /sound/<id>.wav     decoded sound
+    GET /search?q=<text>    JSON list of matching sounds (IDs, banks, wiki names),
+                            answered from the search_index.py index when it exists
+
+Usage:
+    python preview_server.py --dictionary bg3_sounds.json --unpacked <UnpackedData>
+"""
+
+import os
+import sys
+import json
+import logging
+import argparse
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from typing import Dict, List, Optional, Any, Tuple
+
+from config_manager import get_config
+from sound_scanner import SoundScanner
+from sound_mappings import load_wiki_data, wiki_id_map_for_bank
+from bnk_reader import read_embedded_index, read_embedded_wem
+from search_index import SearchIndex, DEFAULT_INDEX_PATH
+from tool_registry import tool_registry, cache_tag
+from process_runner import ProcessRunner, process_runner, DEFAULT_CONVERT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+DEFAULT_MEMORY_CACHE_MB = 256
+DEFAULT_DISK_CACHE_MB = 2048
+
+class PreviewCache:
+    """Two-level LRU cache of decoded sounds, bounded by bytes in memory and on disk"""
+
+    def __init__(self, cache_dir: str, max_memory_bytes: int, max_disk_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self.memory_bytes = 0
+        self.disk: "OrderedDict[str, int]" = OrderedDict()
+        self.disk_bytes = 0
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        # Rebuild the disk LRU order from file modification times
+        entries = []
+        for entry in os.scandir(cache_dir):
+            if entry.is_file() and entry.name.endswith(".wav"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self.disk[key] = size
+            self.disk_bytes += size
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return cached audio, promoting disk hits into memory"""
+        with self.lock:
+            data = self.memory.get(key)
+            if data is not None:
+                self.memory.move_to_end(key)
+                return data
+            if key not in self.disk:
+                return None
+            self.disk.move_to_end(key)
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                data = f.read()
+            os.utime(self._disk_path(key))
+        except OSError:
+            with self.lock:
+                self.disk_bytes -= self.disk.pop(key, 0)
+            return None
+        with self.lock:
+            self._put_memory(key, data)
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Store decoded audio in both cache levels"""
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.disk_bytes -= self.disk.pop(key, 0)
+            self.disk[key] = len(data)
+            self.disk_bytes += len(data)
+            while self.disk_bytes > self.max_disk_bytes and len(self.disk) > 1:
+                old_key, size = self.disk.popitem(last=False)
+                self.disk_bytes -= size
+                try:
+                    os.remove(self._disk_path(old_key))
+                except OSError:
+                    pass
+            self._put_memory(key, data)
+
+    def _put_memory(self, key: str, data: bytes):
+        if len(data) > self.max_memory_bytes:
+            return
+        if key in self.memory:
+            self.memory_bytes -= len(self.memory.pop(key))
+        self.memory[key] = data
+        self.memory_bytes += len(data)
+        while self.memory_bytes > self.max_memory_bytes:
+            _, old = self.memory.popitem(last=False)
+            self.memory_bytes -= len(old)
+
+class SoundCatalog:
+    """Locates the WEM data of a sound and answers searches over the bank dictionary"""
+
+    def __init__(self,
+                 all_banks: Dict[str, Dict[str, Any]],
+                 unpacked_data_folder: str,
+                 wiki_data: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            all_banks: Bank dictionary as written by app2.py
+            unpacked_data_folder: Folder holding the loose .wem and .bnk files
+            wiki_data: Optional wiki_data.json contents for names
+        """
+        self.loose_wems: Dict[str, str] = {}
+        self.bank_files: Dict[str, str] = {}
+        self.sound_banks: Dict[str, List[str]] = {}
+        self.entries: List[Dict[str, str]] = []
+        self.embedded: Dict[str, Dict[str, Tuple[int, int]]] = {}
+        self.lock = threading.Lock()
+
+        scanner = SoundScanner(extensions=(".bnk", ".wem"))
+        for path in scanner.scan_parallel(unpacked_data_folder):
+            name = os.path.basename(path)
+            if name.lower().endswith(".wem"):
+                self.loose_wems[name[:-4]] = path
+            else:
+                self.bank_files[name[:-4]] = path
+        logger.info(scanner.rate_message())
+
+        for category, banks in all_banks.items():
+            for bank_name, bank_info in banks.items():
+                id_map = wiki_id_map_for_bank(wiki_data, bank_name) if wiki_data else None
+                for sound_id, sound_info in bank_info.get("sound_files", {}).items():
+                    self.sound_banks.setdefault(sound_id, []).append(bank_name)
+                    name = sound_info.get("friendly_name") or (id_map or {}).get(sound_id, "")
+                    self.entries.append({
+                        "id": sound_id,
+                        "bank": bank_name,
+                        "category": category,
+                        "name": name,
+                        "source_path": sound_info.get("source_path", ""),
+                    })
+        # Loose files the dictionary does not know about are still searchable by ID
+        known = set(self.sound_banks)
+        for sound_id in self.loose_wems:
+            if sound_id not in known:
+                self.entries.append({"id": sound_id, "bank": "", "category": "", "name": "", "source_path": ""})
+        logger.info(f"Catalog has {len(self.entries)} entries, {len(self.loose_wems)} loose WEMs, "
+                    f"{len(self.bank_files)} banks")
+
+    def _bank_index(self, bank_name: str) -> Dict[str, Tuple[int, int]]:
+        with self.lock:
+            index = self.embedded.get(bank_name)
+        if index is None:
+            bnk_path = self.bank_files.get(bank_name)
+            index = read_embedded_index(bnk_path) if bnk_path else {}
+            with self.lock:
+                self.embedded[bank_name] = index
+        return index
+
+    def read_wem(self, sound_id: str) -> Optional[Tuple[str, Optional[bytes]]]:
+        """
+        Find the WEM data of a sound
+
+        Returns:
+            (path, None) for a loose file, (bank path, data) for an embedded one,
+            or None if the sound cannot be found
+        """
+        if sound_id in self.loose_wems:
+            return (self.loose_wems[sound_id], None)
+        for bank_name in self.sound_banks.get(sound_id, []):
+            entry = self._bank_index(bank_name).get(sound_id)
+            if entry is not None:
+                bnk_path = self.bank_files[bank_name]
+                return (bnk_path, read_embedded_wem(bnk_path, *entry))
+        return None
+
+    def search(self, query: str, limit: int = 50) -> List[Dict[str, str]]:
+        """Return entries whose ID, bank, name or source path contain every query word"""
+        words = query.lower().split()
+        results = []
+        for entry in self.entries:
+            haystack = f"{entry['id']} {entry['bank']} {entry['name']} {entry['source_path']}".lower()
+            if all(word in haystack for word in words):
+                results.append(entry)
+                if len(results) >= limit:
+                    break
+        return results
+
+class PreviewService:
+    """Decodes sounds on demand through the cache"""
+
+    def __init__(self,
+                 catalog: SoundCatalog,
+                 cache: PreviewCache,
+                 vgmstream_cli: str,
+                 search_index: Optional[SearchIndex] = None,
+                 vgmstream_version: Optional[str] = None,
+                 runner: Optional[ProcessRunner] = None,
+                 timeout: float = DEFAULT_CONVERT_TIMEOUT):
+        self.catalog = catalog
+        self.cache = cache
+        self.vgmstream_cli = vgmstream_cli
+        self.runner = runner or process_runner
+        # Seconds one decode may take before vgmstream-cli is killed
+        self.timeout = timeout
+        # Sounds decoded by another vgmstream version are cached under other keys
+        self.key_suffix = f"-{cache_tag(vgmstream_version)}" if vgmstream_version else ""
+        self.search_index = search_index
+        self.tmp_dir = os.path.join(cache.cache_dir, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def search(self, query: str, limit: int = 50) -> List[Dict[str, str]]:
+        """Search with the prebuilt index when there is one, else scan the catalog"""
+        if self.search_index is None:
+            return self.catalog.search(query, limit)
+        return [{"id": row["sound_id"], "bank": row["bank"], "category": row["category"],
+                 "name": row["name"], "source_path": row["source_path"]}
+                for row in self.search_index.search(query, limit)]
+
+    def get_wav(self, sound_id: str) -> Optional[bytes]:
+        """Return the decoded WAV for a sound ID, or None if it cannot be found or decoded"""
+        cache_key = f"{sound_id}{self.key_suffix}"
+        data = self.cache.get(cache_key)
+        if data is not None:
+            return data
+        located = self.catalog.read_wem(sound_id)
+        if located is None:
+            return None
+        start = time.perf_counter()
+        path, embedded = located
+        token = uuid.uuid4().hex
+        wem_path = path
+        if embedded is not None:
+            wem_path = os.path.join(self.tmp_dir, f"{token}.wem")
+            with open(wem_path, "wb") as f:
+                f.write(embedded)
+        wav_path = os.path.join(self.tmp_dir, f"{token}.wav")
+        try:
+            result = self.runner.run([self.vgmstream_cli, "-o", wav_path, wem_path],
+                                     timeout=self.timeout, name="vgmstream-cli", job=path)
+            if not result.ok or not os.path.exists(wav_path):
+                logger.error(f"vgmstream-cli could not decode {sound_id} from {path}: {result.describe()}")
+                return None
+            with open(wav_path, "rb") as f:
+                data = f.read()
+        finally:
+            for tmp_path in (wav_path, wem_path if embedded is not None else None):
+                if tmp_path and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        self.cache.put(cache_key, data)
+        logger.info(f"Decoded {sound_id} in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return data
+
+INDEX_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>BG3 Sound Preview</title></head>
+<body style="font-family: sans-serif; background: #2b2b2b; color: #f0f0f0">
+<input id="q" placeholder="Search IDs, banks, names" size="50" autofocus>
+<audio id="player" controls></audio>
+<ul id="results"></ul>
+<script>
+const q = document.getElementById("q");
+q.addEventListener("input", async () => {
+  const response = await fetch("/search?q=" + encodeURIComponent(q.value));
+  const list = document.getElementById("results");
+  list.innerHTML = "";
+  for (const entry of await response.json()) {
+    const item = document.createElement("li");
+    item.textContent = `${entry.id}  ${entry.bank}  ${entry.name}`;
+    item.style.cursor = "pointer";
+    item.onclick = () => { const p = document.getElementById("player"); p.src = `/sound/${entry.id}.wav`; p.play(); };
+    list.appendChild(item);
+  }
+});
+</script></body></html>
+"""
+
+def make_handler(service: PreviewService):
+    """Build the request handler class bound to a preview service"""
+
+    class PreviewHandler(BaseHTTPRequestHandler):
+        def _send(self, status: int, content_type: str, body: bytes):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/":
+                self._send(200, "text/html; charset=utf-8", INDEX_PAGE.encode("utf-8"))
+            elif url.path.startswith("/sound/") and url.path.endswith(".wav"):
+                sound_id = url.path[len("/sound/"):-len(".wav")]
+                data = service.get_wav(sound_id) if sound_id.isdigit() else None
+                if data is None:
+                    self._send(404, "text/plain", f"Sound {sound_id} not found".encode("utf-8"))
+                else:
+                    self._send(200, "audio/wav", data)
+            elif url.path == "/search":
+                params = parse_qs(url.query)
+                query = params.get("q", [""])[0]
+                try:
+                    limit = int(params.get("limit", ["50"])[0])
+                except ValueError:
+                    limit = 0
+                if limit < 1:
+                    self._send(400, "text/plain", b"limit must be a positive integer")
+                    return
+                results = service.search(query, limit)
+                self._send(200, "application/json", json.dumps(results).encode("utf-8"))
+            else:
+                self._send(404, "text/plain", b"Not found")
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return PreviewHandler
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Preview BG3 sounds without converting them up front")
+    parser.add_argument("--dictionary", default=get_config("output_json"), help="Bank dictionary JSON from app2.py")
+    parser.add_argument("--unpacked", default=get_config("folder_unpacked_data"), help="UnpackedData folder")
+    parser.add_argument("--vgmstream", default=get_config("folder_vgmstream"), help="Folder containing vgmstream-cli")
+    parser.add_argument("--wiki", default=get_config("folder_bg3sids_wiki"), help="wiki_data.json for names")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="Search index from search_index.py, if built")
+    parser.add_argument("--cache-dir", default=os.path.join(os.getcwd(), "PreviewCache"))
+    parser.add_argument("--memory-mb", type=int, default=DEFAULT_MEMORY_CACHE_MB)
+    parser.add_argument("--disk-mb", type=int, default=DEFAULT_DISK_CACHE_MB)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--timeout", type=float, default=get_config("convert_timeout") or DEFAULT_CONVERT_TIMEOUT,
+                        help="Seconds one sound may take to decode")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+
+    vgmstream = tool_registry.probe("vgmstream", args.vgmstream)
+    if vgmstream is None:
+        logger.error("vgmstream-cli not found; use --vgmstream or download the dependencies first")
+        sys.exit(1)
+
+    all_banks = {}
+    if args.dictionary and os.path.exists(args.dictionary):
+        with open(args.dictionary, "r", encoding="utf-8") as f:
+            all_banks = json.load(f)
+    else:
+        logger.warning("No bank dictionary found; only loose WEMs can be previewed")
+
+    catalog = SoundCatalog(all_banks, args.unpacked, load_wiki_data(args.wiki))
+    cache = PreviewCache(args.cache_dir, args.memory_mb * 1024 * 1024, args.disk_mb * 1024 * 1024)
+    search_index = SearchIndex(args.index) if os.path.exists(args.index) else None
+    runner = ProcessRunner()
+    service = PreviewService(catalog, cache, vgmstream["path"], search_index, vgmstream["version"],
+                             runner=runner, timeout=args.timeout)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    logger.info(f"Preview server listening on http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Kill decodes still running for open requests
+        runner.cancel()
+        server.server_close()
+        for line in runner.summary():
+            logger.info(line)
+
+if __name__ == "__main__":
+    main()
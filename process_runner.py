@@ -0,0 +1,202 @@
+""" process_runner.py - Running wwiser and vgmstream-cli child processes
+Every external tool call goes through a ProcessRunner, which:
+- takes an argument list and never starts a shell, so paths with spaces,
+  quotes or "&" need no quoting and no extra shell process is spawned
+- kills a job that runs longer than its timeout
+- keeps only the last few KB of stderr, however much a tool prints
+- starts each job in its own process group, so cancel() also kills any
+  processes the tool started itself
+- counts runs, failures, timeouts and time per tool for the end-of-run summary
+"""
+
+import os
+import sys
+import time
+import shutil
+import signal
+import logging
+import threading
+import subprocess
+from typing import Dict, List, Optional, Any, NamedTuple, Sequence
+
+from profiling import subprocess_timer
+
+logger = logging.getLogger(__name__)
+
+# Seconds one bank may take to decode
+DEFAULT_DECODE_TIMEOUT = 600
+# Seconds one .wem file may take to convert (a batch gets this per file)
+DEFAULT_CONVERT_TIMEOUT = 120
+# Bytes of stderr kept per job
+STDERR_TAIL_BYTES = 4096
+
+class ProcessResult(NamedTuple):
+    """Outcome of one job"""
+    returncode: Optional[int]
+    seconds: float
+    stderr_tail: str
+    timed_out: bool = False
+    cancelled: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not self.timed_out and not self.cancelled
+
+    def describe(self) -> str:
+        """Short reason for a failed job, for log messages"""
+        if self.cancelled:
+            return "cancelled"
+        if self.timed_out:
+            return f"timed out after {self.seconds:.0f}s"
+        if self.returncode is None:
+            return f"could not start: {self.stderr_tail}"
+        lines = self.stderr_tail.strip().splitlines()
+        reason = f": {lines[-1]}" if lines else ""
+        return f"exit code {self.returncode}{reason}"
+
+class ProcessRunner:
+    """Runs child processes for one processing run and keeps their statistics"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.processes: Dict[int, subprocess.Popen] = {}
+        self.cancelled = False
+        self.stats: Dict[str, Dict[str, Any]] = {}
+
+    def run(self,
+            args: Sequence[str],
+            timeout: Optional[float] = None,
+            name: Optional[str] = None,
+            job: Optional[str] = None,
+            cwd: Optional[str] = None) -> ProcessResult:
+        """
+        Run one job and wait for it
+
+        Args:
+            args: Program and arguments
+            timeout: Seconds before the job is killed; None waits forever
+            name: Tool name for the statistics; defaults to the program's file name
+            job: What the job works on (e.g. the input file), for the slowest-job report
+            cwd: Working directory of the job
+
+        Returns:
+            The job's ProcessResult; a job that could not be started has returncode None
+        """
+        name = name or os.path.splitext(os.path.basename(args[0]))[0]
+        if self.cancelled:
+            return ProcessResult(None, 0.0, "", cancelled=True)
+        start = time.perf_counter()
+        with subprocess_timer():
+            try:
+                process = subprocess.Popen(list(args), cwd=cwd, stdin=subprocess.DEVNULL,
+                                           stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                           **_new_group_options())
+            except OSError as e:
+                result = ProcessResult(None, time.perf_counter() - start, str(e))
+                self._record(name, job, result)
+                return result
+            with self.lock:
+                self.processes[process.pid] = process
+                # cancel() may have run between the check above and Popen
+                if self.cancelled:
+                    _kill_group(process)
+            tail = bytearray()
+            reader = threading.Thread(target=_read_tail, args=(process.stderr, tail), daemon=True)
+            reader.start()
+            timed_out = False
+            try:
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                timed_out = True
+                _kill_group(process)
+                process.wait()
+            finally:
+                with self.lock:
+                    self.processes.pop(process.pid, None)
+            reader.join()
+            process.stderr.close()
+        result = ProcessResult(process.returncode, time.perf_counter() - start,
+                               tail.decode("utf-8", errors="replace"),
+                               timed_out=timed_out,
+                               cancelled=self.cancelled and not timed_out and process.returncode != 0)
+        self._record(name, job, result)
+        return result
+
+    def cancel(self):
+        """Kill every running job with its process group; later jobs are not started"""
+        with self.lock:
+            self.cancelled = True
+            processes = list(self.processes.values())
+        for process in processes:
+            _kill_group(process)
+
+    def _record(self, name: str, job: Optional[str], result: ProcessResult):
+        with self.lock:
+            stats = self.stats.setdefault(name, {"runs": 0, "failed": 0, "timed_out": 0, "cancelled": 0,
+                                                 "seconds": 0.0, "slowest": 0.0, "slowest_job": None})
+            stats["runs"] += 1
+            stats["seconds"] += result.seconds
+            if result.cancelled:
+                stats["cancelled"] += 1
+            elif result.timed_out:
+                stats["timed_out"] += 1
+            elif not result.ok:
+                stats["failed"] += 1
+            if result.seconds > stats["slowest"]:
+                stats["slowest"] = result.seconds
+                stats["slowest_job"] = job
+
+    def summary(self) -> List[str]:
+        """One line of statistics per tool"""
+        lines = []
+        with self.lock:
+            for name, stats in sorted(self.stats.items()):
+                line = (f"{name}: {stats['runs']} runs, {stats['failed']} failed, "
+                        f"{stats['timed_out']} timed out, {stats['seconds']:.1f}s total")
+                if stats["cancelled"]:
+                    line += f", {stats['cancelled']} cancelled"
+                if stats["slowest_job"]:
+                    line += f", slowest {stats['slowest']:.1f}s ({os.path.basename(stats['slowest_job'])})"
+                lines.append(line)
+        return lines
+
+# Used by callers that do not pass a runner of their own
+process_runner = ProcessRunner()
+
+def python_command() -> str:
+    """
+    Python interpreter for running wwiser.pyz
+
+    In the PyInstaller build sys.executable is the app itself, so the
+    python on PATH is used there instead.
+    """
+    if getattr(sys, "frozen", False):
+        return shutil.which("python") or "python"
+    return sys.executable
+
+def _new_group_options() -> Dict[str, Any]:
+    """Popen options that give the child a process group of its own"""
+    if sys.platform == "win32":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.CREATE_NO_WINDOW}
+    return {"start_new_session": True}
+
+def _kill_group(process: subprocess.Popen):
+    """Kill a child and everything it started"""
+    if process.poll() is not None:
+        return
+    try:
+        if sys.platform == "win32":
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except OSError as e:
+        logger.debug(f"Could not kill process group {process.pid}: {e}")
+        process.kill()
+
+def _read_tail(stream, tail: bytearray):
+    """Read a stream to the end, keeping only its last STDERR_TAIL_BYTES"""
+    for chunk in iter(lambda: stream.read(65536), b""):
+        tail.extend(chunk)
+        if len(tail) > STDERR_TAIL_BYTES:
+            del tail[:-STDERR_TAIL_BYTES]
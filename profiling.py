@@ -0,0 +1,228 @@
+""" profiling.py - Optional CPU and memory profiling of a processing run
+Wraps each stage of a run in cProfile and takes tracemalloc snapshots before
+and after it, so a slow or memory hungry run can be looked at afterwards.
+Work done on pool threads is profiled too when the job function is wrapped
+with RunProfiler.wrap(). Time spent waiting for wwiser/vgmstream is counted
+separately, because cProfile only sees it as one blocking call.
+
+Reports go to Profiles/<timestamp>-<run name>/:
+    <stage>.prof         pstats data (e.g. for snakeviz or pstats)
+    <stage>.txt          functions sorted by cumulative and own time
+    <stage>.memory.txt   allocation sites that grew during the stage
+    summary.txt          wall, CPU and subprocess time per stage
+
+When profiling is off, every method is a cheap no-op.
+"""
+
+import os
+import re
+import io
+import time
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Any, Iterator
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_FOLDER = os.path.join(os.getcwd(), "Profiles")
+# Entries listed in the log per stage
+LOG_TOP = 5
+# Entries written to the report files
+REPORT_TOP = 40
+# Stack depth recorded for each allocation
+TRACE_FRAMES = 5
+
+# The profiler of the running stage, for subprocess_timer()
+_active: Optional["RunProfiler"] = None
+
+class RunProfiler:
+    """Collects per-stage profiles for one run"""
+
+    def __init__(self,
+                 run_name: str,
+                 enabled: bool = False,
+                 output_root: str = DEFAULT_PROFILE_FOLDER,
+                 log: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            run_name: Name used in the report folder, e.g. "app" or "app2"
+            enabled: If False nothing is measured or written
+            output_root: Folder receiving one timestamped folder per run
+            log: Optional callback for the summaries, in addition to the logger
+        """
+        self.enabled = enabled
+        self.log = log
+        self.lock = threading.Lock()
+        self.stages: List[Dict[str, Any]] = []
+        self.current: Optional[Dict[str, Any]] = None
+        self.local = threading.local()
+        self.finished = False
+        self.output_dir = None
+        if enabled:
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            self.output_dir = os.path.join(output_root, f"{stamp}-{run_name}")
+            os.makedirs(self.output_dir, exist_ok=True)
+
+    def report(self, message: str):
+        """Log a message and forward it to the log callback"""
+        logger.info(message)
+        if self.log is not None:
+            self.log(message)
+
+    def start(self):
+        """Begin the run: start tracing allocations and make this the active profiler"""
+        global _active
+        if not self.enabled:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+        _active = self
+        self.report(f"Profiling this run; reports go to {self.output_dir}")
+
+    def finish(self):
+        """End the run: write the summary and stop tracing; later calls do nothing"""
+        global _active
+        if not self.enabled or self.finished:
+            return
+        self.finished = True
+        if _active is self:
+            _active = None
+        tracemalloc.stop()
+        lines = [f"{'stage':<30} {'wall s':>9} {'cpu s':>9} {'subproc s':>10} {'calls':>7} {'peak MB':>9}"]
+        for stage in self.stages:
+            lines.append(f"{stage['name']:<30} {stage['wall']:>9.2f} {stage['cpu']:>9.2f} "
+                         f"{stage['subprocess']:>10.2f} {stage['subprocess_calls']:>7} {stage['peak_mb']:>9.1f}")
+        with open(os.path.join(self.output_dir, "summary.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        self.report(f"Profile reports written to {self.output_dir}")
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Profile the code in the with block as one stage"""
+        if not self.enabled:
+            yield
+            return
+        stage = {"name": name, "profiles": [], "subprocess": 0.0, "subprocess_calls": 0}
+        profile = cProfile.Profile()
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        before = _snapshot()
+        with self.lock:
+            self.current = stage
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active on this thread; the pool threads are still profiled
+            profile = None
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+                stage["profiles"].append(profile)
+            stage["wall"] = time.perf_counter() - wall_start
+            stage["cpu"] = time.process_time() - cpu_start
+            stage["peak_mb"] = tracemalloc.get_traced_memory()[1] / 1e6
+            after = _snapshot()
+            with self.lock:
+                self.current = None
+            self._write_stage(stage, before, after)
+            stage.pop("profiles")
+            self.stages.append(stage)
+
+    def wrap(self, func: Callable[..., Any]) -> Callable[..., Any]:
+        """Profile every call of a job function on whatever thread runs it"""
+        if not self.enabled:
+            return func
+        def profiled(*args, **kwargs):
+            with self.lock:
+                stage = self.current
+            if stage is None:
+                return func(*args, **kwargs)
+            # One profile per thread and stage, merged into the stage report
+            profiles = getattr(self.local, "profiles", None)
+            if profiles is None:
+                profiles = self.local.profiles = {}
+            profile = profiles.get(id(stage))
+            if profile is None:
+                profile = profiles[id(stage)] = cProfile.Profile()
+                with self.lock:
+                    stage["profiles"].append(profile)
+            try:
+                profile.enable()
+            except ValueError:
+                return func(*args, **kwargs)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+        return profiled
+
+    def add_subprocess_time(self, seconds: float):
+        """Count time spent waiting for a child process in the current stage"""
+        with self.lock:
+            if self.current is not None:
+                self.current["subprocess"] += seconds
+                self.current["subprocess_calls"] += 1
+
+    def _write_stage(self, stage: Dict[str, Any], before: tracemalloc.Snapshot, after: tracemalloc.Snapshot):
+        """Write the reports of a finished stage and log its hot spots"""
+        base = os.path.join(self.output_dir, re.sub(r"[^\w.-]+", "_", stage["name"]))
+        summary = (f"[profile] {stage['name']}: {stage['wall']:.2f}s wall, {stage['cpu']:.2f}s CPU, "
+                   f"{stage['subprocess']:.2f}s in {stage['subprocess_calls']} subprocesses, "
+                   f"peak {stage['peak_mb']:.1f} MB traced")
+        self.report(summary)
+
+        profiles = [profile for profile in stage["profiles"] if profile.getstats()]
+        if profiles:
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(f"{base}.prof")
+            text = io.StringIO()
+            stats.stream = text
+            stats.sort_stats("cumulative").print_stats(REPORT_TOP)
+            stats.sort_stats("tottime").print_stats(REPORT_TOP)
+            with open(f"{base}.txt", "w", encoding="utf-8") as f:
+                f.write(text.getvalue())
+            # Own time is what points at the hot code
+            hot = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:LOG_TOP]
+            for (filename, line, function), (_, calls, own, cumulative, _) in hot:
+                self.report(f"[profile]   {own:8.3f}s own {cumulative:8.3f}s total {calls:>8} calls  "
+                            f"{function} ({os.path.basename(filename)}:{line})")
+
+        growth = [diff for diff in after.compare_to(before, "lineno") if diff.size_diff > 0]
+        with open(f"{base}.memory.txt", "w", encoding="utf-8") as f:
+            for diff in growth[:REPORT_TOP]:
+                f.write(f"{diff}\n")
+        for diff in growth[:LOG_TOP]:
+            frame = diff.traceback[0]
+            self.report(f"[profile]   +{diff.size_diff / 1e6:8.2f} MB in {diff.count_diff:+} blocks at "
+                        f"{os.path.basename(frame.filename)}:{frame.lineno}")
+
+def _snapshot() -> tracemalloc.Snapshot:
+    """Allocation snapshot without the profiler's own bookkeeping"""
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ))
+
+@contextmanager
+def subprocess_timer() -> Iterator[None]:
+    """Count the wall time of the with block as subprocess time of the running stage, if profiling"""
+    profiler = _active
+    if profiler is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.add_subprocess_time(time.perf_counter() - start)
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+""" run_planner.py - Dry run of the processing stages in app.py
+Works out what Worker.run would do with the given settings without starting
+any subprocess: the banks to decode, the WEMs to convert (after the audio
+store and fingerprint skips), and the files to group, rename, link or export. Each
+stage gets a byte count and an estimated duration from the throughput
+recorded by earlier runs (throughput.json).
+
+Usage:
+    python run_planner.py --unpacked <UnpackedData> --stages decode,convert
+"""
+
+import os
+import sys
+import glob
+import json
+import logging
+import argparse
+from typing import Dict, List, Optional, Any, Iterable, Tuple, Callable
+
+from config_manager import get_config
+from sound_scanner import SoundScanner, CategoryMatcher, find_category_roots, BANK_LAYOUTS, SOUND_LAYOUTS
+from audio_store import AudioStore, source_key
+from fingerprint import FingerprintIndex
+from tool_registry import tool_registry, find_tool, cache_tag
+from adaptive_pool import file_size, DEFAULT_MAX_WORKERS
+from sharding import parse_shard
+from bank_archives import (find_bank_folders, archive_path, is_up_to_date, content_signature,
+                           load_bank_dictionary, DEFAULT_ARCHIVE_FOLDER)
+from sound_mappings import load_wiki_data, wiki_id_map_for_bank
+from sound_filter import SoundFilter, config_filter_settings, add_filter_arguments, filter_settings_from_args
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_PATH = os.path.join(os.getcwd(), "throughput.json")
+# Weight of the newest run in the recorded rates; older runs fade out
+HISTORY_WEIGHT = 0.5
+STAGES = ("decode", "convert", "group", "rename", "export")
+
+def split_skips(wems: Iterable[str],
+                duplicates: Dict[str, str],
+                silent: Iterable[str]) -> Tuple[List[str], List[Tuple[str, str]], int]:
+    """
+    Apply a fingerprint skip plan to a list of WEMs
+
+    Args:
+        wems: WEM paths
+        duplicates: Duplicate sound ID -> canonical sound ID
+        silent: Silent sound IDs
+
+    Returns:
+        Tuple of (WEMs to convert, (duplicate WEM, canonical WEM) pairs, number of silent WEMs)
+    """
+    silent = set(silent)
+    by_id = {os.path.basename(wem).split(".")[0]: wem for wem in wems}
+    kept, duplicate_wems, silent_count = [], [], 0
+    for sound_id, wem in by_id.items():
+        if sound_id in silent:
+            silent_count += 1
+        elif duplicates.get(sound_id) in by_id:
+            duplicate_wems.append((wem, by_id[duplicates[sound_id]]))
+        else:
+            kept.append(wem)
+    return kept, duplicate_wems, silent_count
+
+class ThroughputHistory:
+    """Files and bytes per second of each stage, averaged over earlier runs"""
+
+    def __init__(self, path: str = DEFAULT_HISTORY_PATH):
+        self.path = path
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.stages = json.load(f).get("stages", {})
+            except Exception as e:
+                logger.error(f"Error loading throughput history: {e}")
+
+    def record(self, stage: str, files: int, bytes_done: int, seconds: float, workers: int):
+        """Blend a finished stage into the recorded rates"""
+        if files <= 0 or seconds <= 0:
+            return
+        files_per_second = files / seconds
+        bytes_per_second = bytes_done / seconds
+        entry = self.stages.get(stage)
+        if entry is not None:
+            files_per_second = HISTORY_WEIGHT * files_per_second + (1 - HISTORY_WEIGHT) * entry["files_per_second"]
+            bytes_per_second = HISTORY_WEIGHT * bytes_per_second + (1 - HISTORY_WEIGHT) * entry["bytes_per_second"]
+        self.stages[stage] = {
+            "files_per_second": files_per_second,
+            "bytes_per_second": bytes_per_second,
+            "workers": workers,
+            "runs": (entry or {}).get("runs", 0) + 1,
+        }
+
+    def estimate(self, stage: str, files: int, bytes_total: int) -> Optional[float]:
+        """Seconds a stage should take, or None if it has never been measured"""
+        entry = self.stages.get(stage)
+        if entry is None:
+            return None
+        if bytes_total and entry["bytes_per_second"] > 0:
+            return bytes_total / entry["bytes_per_second"]
+        if entry["files_per_second"] > 0:
+            return files / entry["files_per_second"]
+        return None
+
+    def save(self):
+        """Write the history to disk"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "stages": self.stages}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+def plan_run(settings: Dict[str, Any], history: Optional[ThroughputHistory] = None) -> List[Dict[str, Any]]:
+    """
+    Work out what Worker.run would do with these settings
+
+    Only scans folders and reads the store, fingerprint, history and tool
+    cache files; nothing is written and no tool is started. Without a cached
+    vgmstream version the store cannot tell which sounds are up to date, so
+    they are all counted as new.
+
+    Args:
+        settings: The settings dictionary passed to Worker
+        history: Recorded throughput (defaults to throughput.json)
+
+    Returns:
+        One dictionary per enabled stage with "stage", "files", "bytes",
+        "seconds" (None without recorded throughput) and "note"
+
+    Raises:
+        ValueError: If the filter settings are invalid (see SoundFilter.from_settings)
+    """
+    if history is None:
+        history = ThroughputHistory(settings.get("throughput_history") or DEFAULT_HISTORY_PATH)
+    folder_unpacked_data = settings.get("folder_unpacked_data", "")
+    folder_audio_converted = settings.get("folder_audio_converted", "")
+    use_audio_store = settings.get("use_audio_store", False)
+    batch_convert = settings.get("batch_convert", True)
+    store = None
+    # Whether store entries can be checked against the current vgmstream version
+    store_version_known = False
+    if use_audio_store:
+        # Only the cached version is used: probing would run vgmstream-cli
+        vgmstream = tool_registry.cached("vgmstream", settings.get("folder_vgmstream", ""))
+        store_version_known = vgmstream is not None
+        store = AudioStore(settings.get("folder_audio_store", os.path.join(os.getcwd(), "AudioStore")),
+                           vgmstream["version"] if vgmstream else None)
+
+    sound_dirs = {
+        "Shared": os.path.join(folder_unpacked_data, "SharedSounds", "Public", "Shared", "Assets", "Sound"),
+        "SharedDev": os.path.join(folder_unpacked_data, "SharedSounds", "Public", "SharedDev", "Assets", "Sound"),
+    }
+    bank_dirs = {
+        "Shared": os.path.join(folder_unpacked_data, "SharedSoundBanks", "Public", "Shared", "Assets", "Sound"),
+        "SharedDev": os.path.join(folder_unpacked_data, "SharedSoundBanks", "Public", "SharedDev", "Assets", "Sound"),
+    }
+    shard = parse_shard(settings.get("shard"))
+    sound_filter = SoundFilter.from_settings(settings)
+    if sound_filter.banks or sound_filter.wiki_pages:
+        # Bank filters select the sounds of banks decoded by earlier runs
+        for category in sound_dirs:
+            sound_filter.load_bank_sounds(os.path.join(settings.get("folder_banks_converted", ""), category), category)
+    # The recursive fallback searches the whole UnpackedData folder; do it at most once per extension
+    scans: Dict[str, List[str]] = {}
+    def find(source_dir: str, category: str, extension: str) -> List[str]:
+        if not sound_filter.wants_category(category):
+            return []
+        found = glob.glob(os.path.join(source_dir, f"*{extension}"))
+        if not found:
+            if extension not in scans:
+                scans[extension] = list(SoundScanner(extensions=(extension,), shared_only=True).scan_parallel(folder_unpacked_data))
+            matcher = CategoryMatcher(find_category_roots(
+                folder_unpacked_data, BANK_LAYOUTS if extension == ".bnk" else SOUND_LAYOUTS))
+            found = [path for path in scans[extension] if matcher.categorize(path) == category]
+        if extension == ".bnk":
+            found = [path for path in found if sound_filter.wants_bank(category, path)]
+        else:
+            found = [path for path in found if sound_filter.wants_sound(category, path)]
+        if shard is not None:
+            found = [path for path in found if shard.owns(category, path)]
+        return found
+
+    def stage(name: str, history_key: str, files: int, bytes_total: int, note: str = "") -> Dict[str, Any]:
+        return {"stage": name, "files": files, "bytes": bytes_total,
+                "seconds": history.estimate(history_key, files, bytes_total) if files else 0.0,
+                "note": note}
+
+    plan = []
+    if settings.get("should_decode_banks", False):
+        banks = [bank for category, source_dir in bank_dirs.items() for bank in find(source_dir, category, ".bnk")]
+        plan.append(stage("decode", "decode", len(banks), sum(file_size(bank) for bank in banks)))
+
+    # Sound files that end up in the converted folders, for the group/rename/link estimates
+    converted_names = {category: set() for category in sound_dirs}
+    if settings.get("should_convert", False):
+        to_convert, skipped, up_to_date = [], 0, 0
+        skip_plan = None
+        if settings.get("skip_duplicates", False):
+            fingerprint_path = settings.get("fingerprint_index") or os.path.join(os.getcwd(), "fingerprints.json")
+            if os.path.exists(fingerprint_path):
+                vgmstream = tool_registry.cached("vgmstream", settings.get("folder_vgmstream", ""))
+                index = FingerprintIndex(fingerprint_path, cache_tag(vgmstream["version"]) if vgmstream else None)
+                skip_plan = index.skip_plan(settings.get("skip_near_duplicates", False))
+        for category, source_dir in sound_dirs.items():
+            wems = find(source_dir, category, ".wem")
+            converted_names[category].update(os.path.basename(wem) + ".wav" for wem in wems)
+            if skip_plan is not None:
+                wems, duplicate_wems, silent_count = split_skips(wems, *skip_plan)
+                skipped += len(duplicate_wems) + silent_count
+            if store_version_known:
+                current = [wem for wem in wems if store.is_current(source_key(category, wem), wem)]
+                up_to_date += len(current)
+                current = set(current)
+                wems = [wem for wem in wems if wem not in current]
+            to_convert.extend(wems)
+        notes = []
+        if store_version_known:
+            notes.append(f"{up_to_date} up to date in the store")
+        elif store is not None:
+            notes.append("up to date in the store: unknown until vgmstream's version is cached, counted as new")
+        if skip_plan is not None:
+            notes.append(f"{skipped} silent or duplicate skipped")
+        if (sound_filter.banks or sound_filter.wiki_pages) and settings.get("should_decode_banks", False):
+            notes.append("sounds of banks not decoded yet are not counted")
+        plan.append(stage("convert", "convert_batch" if batch_convert else "convert",
+                          len(to_convert), sum(file_size(wem) for wem in to_convert), ", ".join(notes)))
+
+    if shard is not None:
+        # Sharded runs leave grouping, renaming and the store views to after the merge
+        return plan
+
+    if store is not None:
+        # With the store, grouping and renaming are done by rebuilding the link views
+        new = sum(1 for category, names in converted_names.items()
+                  for name in names if source_key(category, name) not in store.sources)
+        plan.append(stage("link", "link", len(store.sources) + new, 0, "views rebuilt from the audio store"))
+        plan_export(settings, plan, stage, sound_filter)
+        return plan
+
+    if settings.get("should_group", False):
+        files = 0
+        for category, names in converted_names.items():
+            dest_dir = os.path.join(folder_audio_converted, category)
+            existing = {os.path.basename(path) for path in glob.glob(os.path.join(dest_dir, "*.wem.wav"))}
+            files += len(existing | names)
+        plan.append(stage("group", "group", files, 0, "upper bound: files not in any bank stay in place"))
+
+    if settings.get("should_rename", False):
+        if not os.path.exists(settings.get("folder_bg3sids_wiki", "")):
+            plan.append({"stage": "rename", "files": 0, "bytes": 0, "seconds": 0.0,
+                         "note": "wiki_data.json is missing, renaming is skipped"})
+        else:
+            files = sum(len(glob.glob(os.path.join(folder_audio_converted, category, "*", "*.wem.wav")))
+                        for category in sound_dirs)
+            if settings.get("should_group", False):
+                files += plan[-1]["files"]
+            plan.append(stage("rename", "rename", files, 0, "upper bound: only sounds named in the wiki are renamed"))
+    plan_export(settings, plan, stage, sound_filter)
+    return plan
+
+def plan_export(settings: Dict[str, Any],
+                plan: List[Dict[str, Any]],
+                stage: Callable[..., Dict[str, Any]],
+                sound_filter: SoundFilter):
+    """Add the export stage: bank folders whose archive is missing or out of date"""
+    if not settings.get("should_export", False):
+        return
+    output_folder = settings.get("folder_bank_archives") or DEFAULT_ARCHIVE_FOLDER
+    archive_format = settings.get("archive_format") or "zip"
+    # The same inputs as export_bank_archives(), so the same archives count as up to date
+    dictionary = load_bank_dictionary(settings.get("bank_dictionary"))
+    wiki_json_path = settings.get("folder_bg3sids_wiki")
+    wiki_data = load_wiki_data(wiki_json_path) if wiki_json_path else None
+    files, bytes_total, banks = 0, 0, 0
+    for category, bank_name, folder in find_bank_folders(settings.get("folder_audio_converted", ""), sound_filter):
+        entries = sorted((entry for entry in os.scandir(folder) if entry.is_file()), key=lambda entry: entry.name)
+        archive = archive_path(output_folder, category, bank_name, archive_format)
+        id_map = wiki_id_map_for_bank(wiki_data, bank_name) if wiki_data else None
+        signature = content_signature(entries, dictionary.get(category, {}).get(bank_name), id_map)
+        if is_up_to_date(archive, signature):
+            continue
+        banks += 1
+        files += len(entries)
+        bytes_total += sum(entry.stat().st_size for entry in entries)
+    plan.append(stage("export", "export", files, bytes_total,
+                      f"{banks} {archive_format} archives, from the bank folders as they are before this run"))
+
+def format_duration(seconds: Optional[float]) -> str:
+    """Human readable duration, "unknown" for None"""
+    if seconds is None:
+        return "unknown"
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {seconds:02d}s"
+    return f"{seconds}s"
+
+def format_plan(plan: List[Dict[str, Any]]) -> List[str]:
+    """Log lines describing a plan, one per stage plus a total"""
+    lines = []
+    for entry in plan:
+        line = (f"{entry['stage']}: {entry['files']} files, {entry['bytes'] / 1e6:.1f} MB, "
+                f"ETA {format_duration(entry['seconds'])}")
+        if entry["seconds"] is None:
+            line += " (no recorded throughput yet)"
+        if entry["note"]:
+            line += f" - {entry['note']}"
+        lines.append(line)
+    known = [entry["seconds"] for entry in plan if entry["seconds"] is not None]
+    total = format_duration(sum(known)) if known else "unknown"
+    if len(known) < len(plan):
+        total += " plus unmeasured stages"
+    lines.append(f"Total: {sum(entry['files'] for entry in plan)} files, "
+                 f"{sum(entry['bytes'] for entry in plan) / 1e6:.1f} MB, ETA {total}")
+    return lines
+
+def settings_from_config(stages: Iterable[str], **overrides: Any) -> Dict[str, Any]:
+    """
+    Worker settings from the saved configuration, for runs without the window
+
+    Args:
+        stages: Stages to enable (see STAGES)
+        overrides: Settings that replace the configured ones
+
+    Returns:
+        The settings dictionary for Worker or plan_run()
+    """
+    stages = set(stages)
+    settings = {
+        "folder_unpacked_data": get_config("folder_unpacked_data"),
+        "wwiser_pyz": find_tool("wwiser", get_config("wwiser_pyz")) or get_config("wwiser_pyz"),
+        "folder_vgmstream": get_config("folder_vgmstream"),
+        "folder_audio_converted": get_config("folder_audio_converted"),
+        "folder_banks_converted": get_config("folder_banks_converted"),
+        "folder_bg3sids_wiki": get_config("folder_bg3sids_wiki"),
+        "should_convert": "convert" in stages,
+        "should_decode_banks": "decode" in stages,
+        "should_group": "group" in stages,
+        "should_rename": "rename" in stages,
+        "should_export": "export" in stages,
+        "use_audio_store": get_config("use_audio_store", False),
+        "folder_audio_store": get_config("folder_audio_store"),
+        "max_workers": get_config("max_workers", DEFAULT_MAX_WORKERS),
+        "adaptive_workers": get_config("adaptive_workers", False),
+        "largest_first": get_config("largest_first", True),
+        "skip_duplicates": get_config("skip_duplicates", False),
+        "batch_convert": get_config("batch_convert", True),
+        "batch_max_files": get_config("batch_max_files"),
+        "batch_max_mb": get_config("batch_max_mb"),
+        "skip_near_duplicates": get_config("skip_near_duplicates", False),
+        "fingerprint_index": get_config("fingerprint_index"),
+        "throughput_history": get_config("throughput_history"),
+        "profile": get_config("profile_run", False),
+        "decode_timeout": get_config("decode_timeout"),
+        "convert_timeout": get_config("convert_timeout"),
+        "xml_compression": get_config("xml_compression", "none"),
+        "folder_bank_archives": get_config("folder_bank_archives"),
+        "archive_format": get_config("archive_format", "zip"),
+        "bank_dictionary": get_config("output_json"),
+        **config_filter_settings(),
+    }
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+    return settings
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Show what a processing run would do, without doing it")
+    parser.add_argument("--unpacked", default=get_config("folder_unpacked_data"), help="UnpackedData folder")
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help=f"Comma separated stages to plan ({', '.join(STAGES)})")
+    parser.add_argument("--history", default=get_config("throughput_history"), help="Throughput history file")
+    parser.add_argument("--shard", default=None, help="Plan only shard i of N, e.g. 2/4")
+    add_filter_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+
+    stages = {name.strip() for name in args.stages.split(",") if name.strip()}
+    unknown = stages - set(STAGES)
+    if unknown:
+        logger.error(f"Unknown stages: {', '.join(sorted(unknown))}")
+        sys.exit(1)
+    settings = settings_from_config(stages, folder_unpacked_data=args.unpacked,
+                                    throughput_history=args.history, shard=args.shard,
+                                    **filter_settings_from_args(args))
+    try:
+        plan = plan_run(settings)
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
+    for line in format_plan(plan):
+        print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+""" search_index.py - Full-text and ID search over BG3 sounds
+Builds a SQLite index of bank names, sound IDs, wiki names and MediaSource
+paths from the bank dictionary (app2.py) and wiki_data.json, and queries it.
+Uses an FTS5 table when SQLite supports it, with a LIKE fallback otherwise.
+
+Usage:
+    python search_index.py build --dictionary bg3_sounds.json --wiki wiki_data.json
+    python search_index.py query "combat music"
+    python search_index.py query 123456789
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import logging
+import argparse
+from typing import Dict, List, Optional, Any, Iterator, Tuple
+
+from config_manager import get_config
+from sound_mappings import load_wiki_data, wiki_id_map_for_bank
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = os.path.join(os.getcwd(), "bg3_sounds_index.db3")
+
+COLUMNS = ("sound_id", "bank", "category", "name", "source_path")
+
+def fts5_available(conn: sqlite3.Connection) -> bool:
+    """Check whether the SQLite build supports FTS5"""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp.fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+def iter_index_rows(all_banks: Dict[str, Dict[str, Any]],
+                    wiki_data: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[str, str, str, str, str]]:
+    """
+    Yield one index row per sound of every bank
+
+    Args:
+        all_banks: Bank dictionary as written by app2.py
+        wiki_data: Optional wiki_data.json contents for names
+
+    Yields:
+        Tuples of (sound_id, bank, category, name, source_path)
+    """
+    for category, banks in all_banks.items():
+        for bank_name, bank_info in banks.items():
+            id_map = wiki_id_map_for_bank(wiki_data, bank_name) if wiki_data else None
+            sound_files = bank_info.get("sound_files", {})
+            if not sound_files:
+                # Keep empty banks findable by name
+                yield ("", bank_name, category, "", "")
+            for sound_id, sound_info in sound_files.items():
+                name = sound_info.get("friendly_name") or (id_map or {}).get(sound_id, "")
+                yield (sound_id, bank_name, category, name, sound_info.get("source_path", ""))
+
+def build_index(all_banks: Dict[str, Dict[str, Any]],
+                index_path: str,
+                wiki_data: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Build (or rebuild) the search index
+
+    Args:
+        all_banks: Bank dictionary as written by app2.py
+        index_path: SQLite file to write
+        wiki_data: Optional wiki_data.json contents for names
+
+    Returns:
+        Number of indexed rows
+    """
+    tmp_path = f"{index_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("CREATE TABLE sounds (sound_id TEXT, bank TEXT, category TEXT, name TEXT, source_path TEXT)")
+        conn.executemany("INSERT INTO sounds VALUES (?, ?, ?, ?, ?)", iter_index_rows(all_banks, wiki_data))
+        # Exact ID lookups never need the text index
+        conn.execute("CREATE INDEX sounds_id ON sounds (sound_id)")
+        if fts5_available(conn):
+            # Index words and ID prefixes; "_" and path separators split tokens
+            conn.execute("CREATE VIRTUAL TABLE sounds_fts USING fts5("
+                         "sound_id, bank, name, source_path, content='sounds', "
+                         "tokenize=\"unicode61 separators '_/\\.'\", prefix='2 3 4')")
+            conn.execute("INSERT INTO sounds_fts (rowid, sound_id, bank, name, source_path) "
+                         "SELECT rowid, sound_id, bank, name, source_path FROM sounds")
+        count = conn.execute("SELECT COUNT(*) FROM sounds").fetchone()[0]
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, index_path)
+    return count
+
+class SearchIndex:
+    """Read-only access to an index built by build_index()"""
+
+    def __init__(self, index_path: str):
+        self.conn = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True, check_same_thread=False)
+        self.has_fts = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sounds_fts'").fetchone() is not None
+
+    def close(self):
+        self.conn.close()
+
+    def _rows(self, sql: str, params: Tuple) -> List[Dict[str, str]]:
+        return [dict(zip(COLUMNS, row)) for row in self.conn.execute(sql, params)]
+
+    def search(self, query: str, limit: int = 50) -> List[Dict[str, str]]:
+        """
+        Search sounds by ID, bank, wiki name or source path
+
+        A purely numeric query is looked up as an exact sound ID first. Other
+        queries match every word as a prefix anywhere in the indexed fields.
+
+        Args:
+            query: Search text
+            limit: Maximum number of results
+
+        Returns:
+            List of rows with the keys sound_id, bank, category, name and source_path
+        """
+        query = query.strip()
+        if not query:
+            return []
+        select = "SELECT sounds.sound_id, sounds.bank, sounds.category, sounds.name, sounds.source_path FROM sounds"
+        if query.isdigit():
+            rows = self._rows(f"{select} WHERE sound_id = ? LIMIT ?", (query, limit))
+            if rows:
+                return rows
+        words = query.replace('"', " ").split()
+        if not words:
+            return []
+        if self.has_fts:
+            match = " ".join(f'"{word}"*' for word in words)
+            return self._rows(f"{select} JOIN sounds_fts ON sounds_fts.rowid = sounds.rowid "
+                              f"WHERE sounds_fts MATCH ? ORDER BY rank LIMIT ?", (match, limit))
+        haystack = "(sound_id || ' ' || bank || ' ' || name || ' ' || source_path)"
+        conditions = " AND ".join(f"{haystack} LIKE ?" for _ in words)
+        return self._rows(f"{select} WHERE {conditions} LIMIT ?",
+                          tuple(f"%{word}%" for word in words) + (limit,))
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Build and query the BG3 sounds search index")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="Index file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Build the index")
+    build_parser.add_argument("--dictionary", default=get_config("output_json"), help="Bank dictionary JSON from app2.py")
+    build_parser.add_argument("--wiki", default=get_config("folder_bg3sids_wiki"), help="wiki_data.json for names")
+    query_parser = subparsers.add_parser("query", help="Search the index")
+    query_parser.add_argument("text", nargs="+", help="Words or a sound ID")
+    query_parser.add_argument("--limit", type=int, default=50)
+    query_parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+
+    if args.command == "build":
+        if not os.path.exists(args.dictionary):
+            logger.error(f"Bank dictionary not found: {args.dictionary}")
+            sys.exit(1)
+        start = time.perf_counter()
+        with open(args.dictionary, "r", encoding="utf-8") as f:
+            all_banks = json.load(f)
+        count = build_index(all_banks, args.index, load_wiki_data(args.wiki))
+        logger.info(f"Indexed {count} rows into {args.index} in {time.perf_counter() - start:.2f}s")
+    else:
+        if not os.path.exists(args.index):
+            logger.error(f"Index not found: {args.index}; run 'search_index.py build' first")
+            sys.exit(1)
+        index = SearchIndex(args.index)
+        start = time.perf_counter()
+        results = index.search(" ".join(args.text), args.limit)
+        elapsed = (time.perf_counter() - start) * 1000
+        if args.json:
+            print(json.dumps(results, indent=2, ensure_ascii=False))
+        else:
+            for row in results:
+                print(f"{row['sound_id']:>12}  {row['category']:<10} {row['bank']:<30} {row['name']}  {row['source_path']}")
+            logger.info(f"{len(results)} results in {elapsed:.1f} ms")
+        index.close()
+
+if __name__ == "__main__":
+    main()
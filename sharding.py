@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+""" sharding.py - Split a full-game run across machines and merge the results
+A shard "i/N" (1 <= i <= N) owns every bank and WEM whose "<category>/<name>"
+key hashes to bucket i, so N machines (or N local processes) given the same
+UnpackedData each do a disjoint part of the work without coordinating. The
+hash is CRC32, which is the same on every platform and Python version.
+
+Each shard writes its own dictionary (app2.py --headless --shard i/N) or its
+own audio store and converted folders (app.py --headless --shard i/N), plus a
+small "<name>.shard.json" record saying which shard produced it. The merge
+commands combine them:
+
+Usage:
+    python sharding.py merge-dictionary shard1.json shard2.json --output bg3_sounds.json
+    python sharding.py merge-store AudioStore1 AudioStore2 --output AudioStore
+    python sharding.py merge-tree ConvertedBanks1 ConvertedBanks2 --output ConvertedBanks
+"""
+
+import os
+import sys
+import json
+import zlib
+import logging
+import argparse
+from typing import Dict, List, Optional, NamedTuple
+
+from audio_store import AudioStore, source_key, link_file
+from dictionary_writer import DictionaryWriter
+
+logger = logging.getLogger(__name__)
+
+SHARD_SUFFIX = ".shard.json"
+
+class Shard(NamedTuple):
+    """Shard number (1-based) and shard count"""
+    index: int
+    count: int
+
+    @classmethod
+    def parse(cls, text: str) -> "Shard":
+        """
+        Parse "i/N"
+
+        Raises:
+            ValueError: If the text is not of the form i/N with 1 <= i <= N
+        """
+        index, sep, count = text.partition("/")
+        if not sep or not index.strip().isdigit() or not count.strip().isdigit():
+            raise ValueError(f"shard must look like i/N, got {text!r}")
+        shard = cls(int(index), int(count))
+        if not 1 <= shard.index <= shard.count:
+            raise ValueError(f"shard {text} is out of range: i must be between 1 and N")
+        return shard
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+    def owns(self, category: str, path: str) -> bool:
+        """Whether a bank or WEM file belongs to this shard"""
+        key = source_key(category, path).encode("utf-8")
+        return zlib.crc32(key) % self.count == self.index - 1
+
+def parse_shard(text: Optional[str]) -> Optional[Shard]:
+    """Parse an optional shard setting; empty means no sharding"""
+    return Shard.parse(text) if text else None
+
+def write_shard_record(output_path: str, shard: Shard, **counts: int):
+    """Write "<output>.shard.json" next to a shard's output"""
+    record_path = output_path.rstrip("/\\") + SHARD_SUFFIX
+    with open(record_path, "w", encoding="utf-8") as f:
+        json.dump({"shard": str(shard), **counts}, f, indent=2)
+
+def check_shards(paths: List[str]) -> bool:
+    """
+    Check that shard outputs form one complete set (1/N ... N/N)
+
+    Outputs without a shard record are accepted without checks.
+
+    Returns:
+        True if no shard is missing or given twice
+    """
+    seen: Dict[int, str] = {}
+    counts = set()
+    for path in paths:
+        record_path = path.rstrip("/\\") + SHARD_SUFFIX
+        if not os.path.exists(record_path):
+            logger.warning(f"No shard record for {path}; cannot check it")
+            continue
+        with open(record_path, "r", encoding="utf-8") as f:
+            shard = Shard.parse(json.load(f)["shard"])
+        counts.add(shard.count)
+        if shard.index in seen:
+            logger.error(f"Shard {shard} given twice: {seen[shard.index]} and {path}")
+            return False
+        seen[shard.index] = path
+    if len(counts) > 1:
+        logger.error(f"Outputs come from different shard counts: {sorted(counts)}")
+        return False
+    if counts and len(seen) == len(paths):
+        missing = [i for i in range(1, counts.pop() + 1) if i not in seen]
+        if missing:
+            logger.error(f"Missing shards: {', '.join(map(str, missing))}")
+            return False
+    return True
+
+def merge_dictionaries(paths: List[str], output_path: str) -> Dict[str, int]:
+    """
+    Merge shard dictionaries written by app2.py into one
+
+    Categories keep the order they first appear in; banks are sorted by name
+    within a category so the result does not depend on the shard count.
+
+    Returns:
+        Dictionary with the "banks" and "sounds" counts of the result
+    """
+    merged: Dict[str, Dict[str, str]] = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            banks = json.load(f)
+        for category, category_banks in banks.items():
+            target = merged.setdefault(category, {})
+            for bank_name in category_banks:
+                if bank_name in target:
+                    logger.warning(f"Bank {category}/{bank_name} is in {target[bank_name]} and {path}; keeping the first")
+                else:
+                    target[bank_name] = path
+
+    writer = DictionaryWriter(output_path)
+    try:
+        # One shard file in memory at a time
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as f:
+                banks = json.load(f)
+            for category, category_banks in banks.items():
+                for bank_name, bank_info in category_banks.items():
+                    if merged[category][bank_name] == path:
+                        writer.add(category, bank_name, bank_info)
+            del banks
+    except Exception:
+        writer.discard()
+        raise
+    writer.close({category: sorted(names) for category, names in merged.items()})
+    return {"banks": writer.bank_count, "sounds": writer.sound_count}
+
+def merge_stores(roots: List[str], output_root: str) -> int:
+    """
+    Merge shard audio stores into one
+
+    Objects are linked (or copied) into the output store, and the source
+    entries of the shard manifests are combined. Entries already in the
+    output store are kept.
+
+    Returns:
+        Number of source entries added
+    """
+    target = AudioStore(output_root)
+    added = 0
+    for root in roots:
+        shard_store = AudioStore(root)
+        for key, entry in shard_store.sources.items():
+            if key in target.sources:
+                continue
+            destination = target.object_path(entry["hash"])
+            if not os.path.exists(destination):
+                source = shard_store.object_path(entry["hash"])
+                if not os.path.exists(source):
+                    logger.warning(f"Object for {key} is missing in {root}")
+                    continue
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                link_file(source, destination)
+            target.sources[key] = dict(entry)
+            added += 1
+    target.save()
+    return added
+
+def merge_trees(roots: List[str], output_root: str) -> int:
+    """
+    Merge shard output folders (converted audio or decoded banks) into one
+
+    Files are linked (or copied); a file that already exists in the output
+    is left alone.
+
+    Returns:
+        Number of files added
+    """
+    added = 0
+    for root in roots:
+        for dirpath, _, files in os.walk(root):
+            relative = os.path.relpath(dirpath, root)
+            target_dir = os.path.normpath(os.path.join(output_root, relative))
+            os.makedirs(target_dir, exist_ok=True)
+            for file in files:
+                target = os.path.join(target_dir, file)
+                if not os.path.exists(target):
+                    link_file(os.path.join(dirpath, file), target)
+                    added += 1
+    return added
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Merge the outputs of sharded runs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command, help_text in (("merge-dictionary", "Merge bank dictionaries from app2.py"),
+                               ("merge-store", "Merge audio stores from app.py"),
+                               ("merge-tree", "Merge converted audio or decoded bank folders")):
+        sub = subparsers.add_parser(command, help=help_text)
+        sub.add_argument("inputs", nargs="+", help="Shard outputs")
+        sub.add_argument("--output", required=True, help="Merged output")
+        sub.add_argument("--force", action="store_true", help="Merge even if shards are missing")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+
+    if not check_shards(args.inputs) and not args.force:
+        logger.error("Refusing to merge an incomplete set of shards (use --force to merge anyway)")
+        sys.exit(1)
+
+    if args.command == "merge-dictionary":
+        counts = merge_dictionaries(args.inputs, args.output)
+        logger.info(f"Merged {counts['banks']} banks with {counts['sounds']} sounds into {args.output}")
+    elif args.command == "merge-store":
+        added = merge_stores(args.inputs, args.output)
+        logger.info(f"Added {added} sounds to {args.output}")
+    else:
+        added = merge_trees(args.inputs, args.output)
+        logger.info(f"Added {added} files to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+""" sound_filter.py - Selecting the banks and sounds a run works on
+Both tools normally process every bank. A SoundFilter limits a run to part
+of the game, checked as files are found so nothing outside it is decoded
+or converted:
+
+- bank name globs to include or exclude, e.g. "VO_*" or "*Ambience*"
+- categories to include or exclude (Shared, SharedDev, Other)
+- a file of sound IDs to include or exclude (one or more IDs per line, "#" comments),
+  or IDs listed directly in the filter_ids setting
+- BG3-SIDS wiki pages: their bank and the sound IDs listed on them
+
+With any include filter, a bank is processed if it matches a glob, a wiki
+page or the ID list (for banks named by their ID). A sound is converted if
+it is in the ID list, on a wiki page, or referenced by an included bank's
+decoded XML. Exclude filters win over include filters.
+"""
+
+import os
+import re
+import argparse
+import logging
+from fnmatch import fnmatchcase
+from typing import Dict, Optional, Any, Iterable, Set
+
+from config_manager import get_config
+from sound_mappings import read_bank_source_ids, load_wiki_data, parse_wiki_id_map, is_bank_xml
+
+logger = logging.getLogger(__name__)
+
+# Settings and config keys of the filters
+FILTER_KEYS = (
+    "filter_banks",
+    "filter_exclude_banks",
+    "filter_categories",
+    "filter_exclude_categories",
+    "filter_ids",
+    "filter_ids_file",
+    "filter_exclude_ids_file",
+    "filter_wiki_pages",
+)
+
+def bank_name_of(path: str) -> str:
+    """Bank name of a .bnk or decoded .bnk.xml(.gz/.zst) path"""
+    name = os.path.basename(path)
+    for suffix in (".gz", ".zst", ".xml", ".bnk"):
+        if name.lower().endswith(suffix):
+            name = name[:-len(suffix)]
+    return name
+
+def sound_id_of(path: str) -> str:
+    """Sound ID of a .wem (or converted .wem.wav) path"""
+    return os.path.basename(path).split(".")[0]
+
+def read_id_list(path: str) -> Set[str]:
+    """
+    Read a file of sound or bank IDs
+
+    Raises:
+        ValueError: If the file cannot be read
+    """
+    ids = set()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                ids.update(re.findall(r"\d+", line.split("#")[0]))
+    except OSError as e:
+        raise ValueError(f"Cannot read ID list {path}: {e}") from e
+    return ids
+
+class SoundFilter:
+    """Include/exclude rules for banks and sounds"""
+
+    def __init__(self,
+                 banks: Iterable[str] = (),
+                 exclude_banks: Iterable[str] = (),
+                 categories: Iterable[str] = (),
+                 exclude_categories: Iterable[str] = (),
+                 ids: Optional[Set[str]] = None,
+                 exclude_ids: Iterable[str] = (),
+                 wiki_pages: Optional[Dict[str, Dict[str, str]]] = None):
+        """
+        Args:
+            banks: Bank name globs to include (case-insensitive)
+            exclude_banks: Bank name globs to skip
+            categories: Categories to include; empty means all
+            exclude_categories: Categories to skip
+            ids: Sound (or bank) IDs to include, or None for no ID list
+            exclude_ids: Sound IDs to skip
+            wiki_pages: Selected wiki page title -> its ID -> name mapping
+        """
+        self.banks = [glob.lower() for glob in banks]
+        self.exclude_banks = [glob.lower() for glob in exclude_banks]
+        self.categories = {category.lower() for category in categories}
+        self.exclude_categories = {category.lower() for category in exclude_categories}
+        self.ids = ids
+        self.exclude_ids = set(exclude_ids)
+        self.wiki_pages = wiki_pages or {}
+        # Sounds selected by ID, wiki page or an included bank
+        self.sound_ids: Set[str] = set(ids or ())
+        for id_map in self.wiki_pages.values():
+            self.sound_ids.update(id_map)
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> "SoundFilter":
+        """
+        Build a filter from the filter_* settings (see FILTER_KEYS)
+
+        Wiki pages are looked up in the wiki data at settings["folder_bg3sids_wiki"].
+
+        Raises:
+            ValueError: If an ID list cannot be read or a wiki page is not found
+        """
+        ids = read_id_list(settings["filter_ids_file"]) if settings.get("filter_ids_file") else None
+        if settings.get("filter_ids"):
+            ids = (ids or set()) | {str(id_value) for id_value in settings["filter_ids"]}
+        exclude_ids = read_id_list(settings["filter_exclude_ids_file"]) if settings.get("filter_exclude_ids_file") else set()
+        wiki_pages = {}
+        if settings.get("filter_wiki_pages"):
+            wiki_data = load_wiki_data(settings.get("folder_bg3sids_wiki", ""))
+            if wiki_data is None:
+                raise ValueError("Wiki page filters need wiki_data.json")
+            for page in settings["filter_wiki_pages"]:
+                titles = [title for title in wiki_data if page.upper() in title.upper()]
+                if not titles:
+                    raise ValueError(f"No wiki page matches {page!r}")
+                for title in titles:
+                    wiki_pages[title] = parse_wiki_id_map(wiki_data[title].get("content", ""))
+        return cls(banks=settings.get("filter_banks") or (),
+                   exclude_banks=settings.get("filter_exclude_banks") or (),
+                   categories=settings.get("filter_categories") or (),
+                   exclude_categories=settings.get("filter_exclude_categories") or (),
+                   ids=ids,
+                   exclude_ids=exclude_ids,
+                   wiki_pages=wiki_pages)
+
+    @property
+    def includes(self) -> bool:
+        """Whether any include rule for banks or sounds is set"""
+        return bool(self.banks or self.ids is not None or self.wiki_pages)
+
+    @property
+    def active(self) -> bool:
+        """Whether the filter leaves anything out"""
+        return bool(self.includes or self.categories or self.exclude_categories
+                    or self.exclude_banks or self.exclude_ids)
+
+    def wants_category(self, category: str) -> bool:
+        """Whether files of a category can be selected at all"""
+        category = category.lower()
+        if category in self.exclude_categories:
+            return False
+        return not self.categories or category in self.categories
+
+    def wants_bank(self, category: str, path: str) -> bool:
+        """Whether a bank (.bnk or decoded .bnk.xml) is selected"""
+        if not self.wants_category(category):
+            return False
+        name = bank_name_of(path)
+        lower = name.lower()
+        if any(fnmatchcase(lower, glob) for glob in self.exclude_banks):
+            return False
+        if not self.includes:
+            return True
+        return (any(fnmatchcase(lower, glob) for glob in self.banks)
+                or (self.ids is not None and name in self.ids)
+                or any(name.upper() in title.upper() for title in self.wiki_pages))
+
+    def wants_sound(self, category: str, path: str) -> bool:
+        """Whether a sound (.wem or converted .wem.wav) is selected"""
+        if not self.wants_category(category):
+            return False
+        sound_id = sound_id_of(path)
+        if sound_id in self.exclude_ids:
+            return False
+        return not self.includes or sound_id in self.sound_ids
+
+    def load_bank_sounds(self, banks_dir: str, category: str) -> int:
+        """
+        Select the sounds referenced by the included banks decoded under banks_dir
+
+        Only needed for bank globs and wiki pages; sounds of other banks are
+        left out.
+
+        Returns:
+            Number of decoded banks read
+        """
+        if not (self.banks or self.wiki_pages):
+            return 0
+        read = 0
+        for root, _, files in os.walk(banks_dir):
+            for file in files:
+                if is_bank_xml(file) and self.wants_bank(category, file):
+                    self.sound_ids.update(read_bank_source_ids(os.path.join(root, file)))
+                    read += 1
+        return read
+
+    def describe(self) -> str:
+        """One line summary for the log"""
+        parts = []
+        if self.banks:
+            parts.append(f"banks {', '.join(self.banks)}")
+        if self.wiki_pages:
+            parts.append(f"wiki pages {', '.join(self.wiki_pages)}")
+        if self.ids is not None:
+            parts.append(f"{len(self.ids)} listed IDs")
+        if self.categories:
+            parts.append(f"categories {', '.join(sorted(self.categories))}")
+        if self.exclude_banks:
+            parts.append(f"not banks {', '.join(self.exclude_banks)}")
+        if self.exclude_categories:
+            parts.append(f"not categories {', '.join(sorted(self.exclude_categories))}")
+        if self.exclude_ids:
+            parts.append(f"not {len(self.exclude_ids)} excluded IDs")
+        return "; ".join(parts) if parts else "everything"
+
+def config_filter_settings() -> Dict[str, Any]:
+    """The filter_* settings saved in the configuration"""
+    return {key: get_config(key) for key in FILTER_KEYS}
+
+def add_filter_arguments(parser: argparse.ArgumentParser):
+    """Add the --bank/--category/--ids/--wiki-page options to a command line parser"""
+    group = parser.add_argument_group("filters", "Only process part of the game (repeat options to add more)")
+    group.add_argument("--bank", action="append", dest="filter_banks", metavar="GLOB",
+                       help="Only banks whose name matches, e.g. VO_*")
+    group.add_argument("--exclude-bank", action="append", dest="filter_exclude_banks", metavar="GLOB",
+                       help="Skip banks whose name matches")
+    group.add_argument("--category", action="append", dest="filter_categories",
+                       help="Only this category (Shared, SharedDev, Other)")
+    group.add_argument("--exclude-category", action="append", dest="filter_exclude_categories",
+                       help="Skip this category")
+    group.add_argument("--ids", dest="filter_ids_file", metavar="FILE",
+                       help="Only the sound (or bank) IDs listed in FILE")
+    group.add_argument("--exclude-ids", dest="filter_exclude_ids_file", metavar="FILE",
+                       help="Skip the sound IDs listed in FILE")
+    group.add_argument("--wiki-page", action="append", dest="filter_wiki_pages", metavar="TITLE",
+                       help="Only the bank and sounds of the BG3-SIDS wiki page whose title contains TITLE")
+
+def filter_settings_from_args(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    The filter_* settings given on the command line
+
+    Options left out are None, so they do not replace the configured filters
+    in settings_from_config().
+    """
+    return {key: getattr(args, key, None) for key in FILTER_KEYS}
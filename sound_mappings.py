@@ -0,0 +1,167 @@
+""" sound_mappings.py - Shared helpers for bank and wiki sound mappings
+Reads the sound IDs referenced by decoded bank XMLs and the ID -> name
+mapping published on the BG3-SIDS wiki (wiki_data.json).
+
+Decoded bank XMLs can be kept compressed (<bank>.bnk.xml.gz, or .zst with
+the optional zstandard package). open_bank_xml() reads any of them as a
+stream, so they are never unpacked to disk.
+"""
+
+import io
+import os
+import gzip
+import json
+import shutil
+import logging
+from typing import Dict, List, Optional, Any, BinaryIO
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Suffix each xml_compression setting adds to <bank>.bnk.xml
+XML_COMPRESSION_SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+BANK_XML_SUFFIXES = (".bnk.xml", ".bnk.xml.gz", ".bnk.xml.zst")
+# Levels with most of the size gain at a fraction of the slowest levels' time
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+COPY_CHUNK_BYTES = 1024 * 1024
+# Raised while reading a damaged or truncated compressed bank XML
+XML_READ_ERRORS = (OSError, EOFError) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+def is_bank_xml(path: str) -> bool:
+    """Whether a file is a decoded bank XML, compressed or not"""
+    return path.endswith(BANK_XML_SUFFIXES)
+
+def check_xml_compression(compression: str):
+    """
+    Check that an xml_compression setting can be used
+
+    Raises:
+        ValueError: If it is unknown, or "zstd" without the zstandard package
+    """
+    if compression not in XML_COMPRESSION_SUFFIXES:
+        raise ValueError(f"Unknown XML compression {compression!r} (use {', '.join(XML_COMPRESSION_SUFFIXES)})")
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("zstd compression needs the zstandard package (pip install zstandard)")
+
+def open_bank_xml(xml_path: str) -> BinaryIO:
+    """Open a decoded bank XML for reading, decompressing .gz and .zst files as they are read"""
+    if xml_path.endswith(".gz"):
+        return gzip.open(xml_path, "rb")
+    if xml_path.endswith(".zst"):
+        check_xml_compression("zstd")
+        # The zstd reader cannot read lines by itself
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(xml_path, "rb"), closefd=True))
+    return open(xml_path, "rb")
+
+def compress_bank_xml(xml_path: str, compression: str) -> str:
+    """
+    Compress a freshly decoded bank XML as set by xml_compression
+
+    The XML is streamed through the compressor into <xml_path>.gz or .zst
+    and then removed. Copies of the same bank XML in another format, left
+    by earlier runs, are removed too so readers find only the new one.
+
+    Args:
+        xml_path: Path of the uncompressed .bnk.xml file written by wwiser
+        compression: "none", "gzip" or "zstd"
+
+    Returns:
+        Path of the XML that was kept
+
+    Raises:
+        ValueError: If the compression cannot be used (see check_xml_compression)
+    """
+    check_xml_compression(compression)
+    target = xml_path + XML_COMPRESSION_SUFFIXES[compression]
+    if target != xml_path:
+        tmp_path = f"{target}.tmp"
+        with open(xml_path, "rb") as source, open(tmp_path, "wb") as raw:
+            if compression == "gzip":
+                with gzip.GzipFile(os.path.basename(xml_path), "wb", GZIP_LEVEL, raw, mtime=0) as output:
+                    shutil.copyfileobj(source, output, COPY_CHUNK_BYTES)
+            else:
+                zstandard.ZstdCompressor(level=ZSTD_LEVEL).copy_stream(source, raw, read_size=COPY_CHUNK_BYTES)
+        os.replace(tmp_path, target)
+        os.remove(xml_path)
+    for suffix in XML_COMPRESSION_SUFFIXES.values():
+        stale = xml_path + suffix
+        if stale != target and os.path.exists(stale):
+            os.remove(stale)
+    return target
+
+def read_bank_source_ids(xml_path: str) -> List[str]:
+    """
+    Read the sound IDs referenced by a decoded bank XML
+
+    Args:
+        xml_path: Path to a .bnk.xml file produced by wwiser, optionally compressed
+
+    Returns:
+        List of sound IDs in the order they appear in the XML
+    """
+    ids = []
+    with open_bank_xml(xml_path) as bank_file_content:
+        for line in bank_file_content:
+            if b'name="sourceID"' in line:
+                ids.append(line.split(b'"')[-2].decode("ascii"))
+    return ids
+
+def load_wiki_data(wiki_json_path: str) -> Optional[Dict[str, Any]]:
+    """Load wiki_data.json, returning None if it is missing or unreadable"""
+    if not wiki_json_path or not os.path.exists(wiki_json_path):
+        return None
+    try:
+        with open(wiki_json_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Error loading wiki data {wiki_json_path}: {e}")
+        return None
+
+def find_wiki_page(wiki_data: Dict[str, Any], bank_name: str) -> Optional[str]:
+    """Find the wiki page whose title contains the bank name"""
+    for key in wiki_data:
+        if bank_name.upper() in key.upper():
+            return key
+    return None
+
+def parse_wiki_id_map(content: str) -> Dict[str, str]:
+    """
+    Parse the content of a wiki page into an ID -> name mapping
+
+    Pages list entries as three lines: index, base name and a comma
+    separated list of IDs. Each ID is named "<base name>_<position>".
+
+    Args:
+        content: Text content of the wiki page
+
+    Returns:
+        Dictionary mapping sound IDs to names (without extension)
+    """
+    lines = [line.strip() for line in content.splitlines() if line.strip()]
+    start_index = 0
+    for i, line in enumerate(lines):
+        if line.isdigit():
+            start_index = i
+            break
+
+    id_dict = {}
+    for i in range(start_index, len(lines), 3):
+        if i + 2 < len(lines):
+            base_name = lines[i + 1]
+            ids_line = lines[i + 2]
+            ids = [x.strip() for x in ids_line.split(",") if x.strip()]
+            for idx, id_val in enumerate(ids):
+                id_dict[id_val] = f"{base_name}_{idx}"
+    return id_dict
+
+def wiki_id_map_for_bank(wiki_data: Dict[str, Any], bank_name: str) -> Optional[Dict[str, str]]:
+    """Return the ID -> name mapping for a bank, or None if the wiki has no page for it"""
+    page = find_wiki_page(wiki_data, bank_name)
+    if page is None:
+        return None
+    return parse_wiki_id_map(wiki_data[page].get("content", ""))
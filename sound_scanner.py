@@ -0,0 +1,227 @@
+""" sound_scanner.py - Fast discovery of BNK/WEM files in UnpackedData trees
+Walks only the parts of the tree that can hold sound data and categorizes
+files by normalized path prefix (Shared, SharedDev, ...).
+"""
+
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Iterator, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Folders that never hold sound data in unpacked BG3 paks. They are skipped
+# unless they sit inside a Sound folder.
+NON_SOUND_DIRS = {
+    "animations", "content", "effects", "fonts", "generated", "gui",
+    "levels", "materials", "meshes", "scripts", "stats",
+    "story", "textures", "timeline", "videos",
+}
+# Localization/<language>/Soundbanks holds the voice lines, so it is only
+# skipped by scans limited to the Shared/SharedDev sound folders
+LOCALIZATION_DIR = "localization"
+
+# Folder crawls run concurrently; they are I/O bound, so use more threads than cores
+DEFAULT_SCAN_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Inside an Assets folder only the Sound subtree holds .bnk/.wem files
+SOUND_DIR = "sound"
+ASSETS_DIR = "assets"
+
+def normalize_path(path: str) -> str:
+    """Normalize a path for prefix comparisons (absolute, case-folded on Windows)"""
+    return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+def prune_dirnames(root: str, dirpath: str, dirnames: List[str], shared_only: bool = False):
+    """
+    Remove subfolders that cannot hold sound data, in place
+
+    Args:
+        root: Folder the scan started from
+        dirpath: Folder being walked
+        dirnames: Its subfolder names, as given by os.walk/os.scandir
+        shared_only: Only the Shared/SharedDev sound folders are wanted, so
+            the Localization folders are skipped too
+    """
+    parts = [part.lower() for part in os.path.relpath(dirpath, root).split(os.sep)]
+    if SOUND_DIR in parts:
+        return
+    if parts and parts[-1] == ASSETS_DIR:
+        dirnames[:] = [d for d in dirnames if d.lower() == SOUND_DIR]
+    else:
+        dirnames[:] = [d for d in dirnames if d.lower() not in NON_SOUND_DIRS
+                       and not (shared_only and d.lower() == LOCALIZATION_DIR)]
+
+# Folders, relative to UnpackedData, that can hold the Shared and SharedDev
+# folders of the banks and of the loose sounds. The usual SharedSoundBanks and
+# SharedSounds layouts come last: they are looked up directly first, and the
+# recursive search only needs the roots when they are missing or empty.
+BANK_LAYOUTS = (("Public",), (), ("Data", "Public"), ("SharedSoundBanks", "Public"))
+SOUND_LAYOUTS = (("Public",), (), ("Data", "Public"), ("SharedSounds", "Public"))
+CATEGORIES = ("Shared", "SharedDev")
+
+def find_category_roots(unpacked_data_folder: str,
+                        layouts: Iterable[Tuple[str, ...]] = BANK_LAYOUTS) -> Dict[str, Optional[str]]:
+    """
+    Locate the Shared and SharedDev folders in the unpacked data folder
+
+    Args:
+        unpacked_data_folder: Path to the UnpackedData folder
+        layouts: Candidate parent folders (see BANK_LAYOUTS and SOUND_LAYOUTS)
+
+    Returns:
+        Dictionary mapping "Shared" and "SharedDev" to their folder, or None if not found
+    """
+    roots = {}
+    for category in CATEGORIES:
+        candidates = (os.path.join(unpacked_data_folder, *layout, category) for layout in layouts)
+        roots[category] = next((path for path in candidates if os.path.exists(path)), None)
+    return roots
+
+class CategoryMatcher:
+    """Categorize paths by the longest matching root folder"""
+
+    def __init__(self, roots: Dict[str, Optional[str]]):
+        """
+        Args:
+            roots: Category name -> root folder (None entries are ignored)
+        """
+        prefixes = [(normalize_path(root) + os.sep, category)
+                    for category, root in roots.items() if root]
+        # Longest prefix first, so nested roots win over their parents
+        self.prefixes: List[Tuple[str, str]] = sorted(prefixes, key=lambda p: len(p[0]), reverse=True)
+
+    def categorize(self, path: str) -> Optional[str]:
+        """Return the category of a path, or None if it is under no root"""
+        normalized = normalize_path(path)
+        for prefix, category in self.prefixes:
+            if normalized.startswith(prefix):
+                return category
+        return None
+
+class SoundScanner:
+    """Walks a tree for files with the given extensions and records the scan rate"""
+
+    def __init__(self, extensions: Iterable[str] = (".bnk", ".wem"), prune: bool = True, shared_only: bool = False):
+        """
+        Args:
+            extensions: File extensions to match
+            prune: Skip folders that cannot hold sound data
+            shared_only: The caller only wants the Shared/SharedDev sound
+                folders, so the Localization folders are skipped as well
+        """
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self.prune = prune
+        self.shared_only = shared_only
+        self.dirs_scanned = 0
+        self.files_scanned = 0
+        self.files_matched = 0
+        self.elapsed = 0.0
+
+    def scan(self, root: str) -> Iterator[str]:
+        """
+        Yield matching file paths under root
+
+        Args:
+            root: Folder to scan
+
+        Yields:
+            Paths of files whose extension matches
+        """
+        start = time.perf_counter()
+        try:
+            for dirpath, dirnames, filenames in os.walk(root):
+                self.dirs_scanned += 1
+                self.files_scanned += len(filenames)
+                if self.prune:
+                    prune_dirnames(root, dirpath, dirnames, self.shared_only)
+                for filename in filenames:
+                    if filename.lower().endswith(self.extensions):
+                        self.files_matched += 1
+                        yield os.path.join(dirpath, filename)
+        finally:
+            self.elapsed += time.perf_counter() - start
+
+    def scan_parallel(self, root: str, max_workers: int = DEFAULT_SCAN_WORKERS) -> Iterator[str]:
+        """
+        Yield matching file paths under root, crawling subfolders concurrently
+
+        Each folder is listed with os.scandir on a thread pool and its matches
+        are yielded as soon as they are found, so consumers can start working
+        before the scan finishes. Closing the generator stops the crawl.
+
+        Args:
+            root: Folder to scan
+            max_workers: Number of crawler threads
+
+        Yields:
+            Paths of files whose extension matches, in no particular order
+        """
+        start = time.perf_counter()
+        results: "queue.Queue" = queue.Queue()
+        done = object()
+        lock = threading.Lock()
+        pending = [1]  # folders submitted but not yet listed
+        stopped = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scan")
+
+        def visit(path: str):
+            matches: List[str] = []
+            subdirs: List[str] = []
+            file_count = 0
+            try:
+                if not stopped.is_set():
+                    with os.scandir(path) as entries:
+                        for entry in entries:
+                            try:
+                                is_dir = entry.is_dir(follow_symlinks=False)
+                            except OSError:
+                                continue
+                            if is_dir:
+                                subdirs.append(entry.name)
+                            else:
+                                file_count += 1
+                                if entry.name.lower().endswith(self.extensions):
+                                    matches.append(entry.path)
+                    if self.prune:
+                        prune_dirnames(root, path, subdirs, self.shared_only)
+            except OSError as e:
+                logger.warning(f"Cannot scan {path}: {e}")
+            finally:
+                results.put((matches, file_count))
+                with lock:
+                    pending[0] += len(subdirs) - 1
+                    finished = pending[0] == 0
+                try:
+                    for name in subdirs:
+                        executor.submit(visit, os.path.join(path, name))
+                except RuntimeError:
+                    # The consumer closed the generator and the pool was shut down
+                    pass
+                if finished:
+                    results.put(done)
+
+        executor.submit(visit, root)
+        try:
+            while True:
+                item = results.get()
+                if item is done:
+                    break
+                matches, file_count = item
+                self.dirs_scanned += 1
+                self.files_scanned += file_count
+                self.files_matched += len(matches)
+                yield from matches
+        finally:
+            stopped.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.elapsed += time.perf_counter() - start
+
+    def rate_message(self) -> str:
+        """Summary of the last scans, e.g. for the log"""
+        rate = self.files_scanned / self.elapsed if self.elapsed > 0 else 0.0
+        return (f"Scanned {self.dirs_scanned} folders and {self.files_scanned} files "
+                f"in {self.elapsed:.2f}s ({rate:.0f} files/s), {self.files_matched} matched")
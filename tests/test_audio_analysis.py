@@ -0,0 +1,117 @@
+""" Tests for audio_analysis.py on synthetic WAV files """
+
+import os
+import wave
+import logging
+
+import numpy as np
+
+from audio_analysis import (analyze_wav, analyze_all, apply_to_dictionary, collect_from_store,
+                            collect_from_folder, MIN_DBFS)
+from audio_store import AudioStore
+
+RATE = 8000
+
+def write_wav(path, samples, sample_width=2):
+    """Write mono PCM samples given as floats in [-1, 1]"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    samples = np.asarray(samples, dtype=np.float64)
+    if sample_width == 1:
+        data = np.clip(np.round(samples * 128 + 128), 0, 255).astype("u1")
+    else:
+        data = np.clip(np.round(samples * 32768), -32768, 32767).astype("<i2")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(sample_width)
+        f.setframerate(RATE)
+        f.writeframes(data.tobytes())
+    return path
+
+def sine(amplitude, seconds=1.0):
+    return amplitude * np.sin(2 * np.pi * 440 * np.arange(int(RATE * seconds)) / RATE)
+
+def test_normal_sound(tmp_path):
+    analysis = analyze_wav(write_wav(str(tmp_path / "normal.wav"), sine(0.5)))
+    assert analysis["duration"] == 1.0
+    assert abs(analysis["peak_dbfs"] - -6.02) < 0.05
+    # The RMS of a sine is 3 dB below its peak
+    assert abs(analysis["rms_dbfs"] - -9.03) < 0.05
+    assert analysis["silent"] is False
+
+def test_silent_sound(tmp_path):
+    analysis = analyze_wav(write_wav(str(tmp_path / "silent.wav"), np.zeros(RATE // 2)))
+    assert analysis == {"duration": 0.5, "peak_dbfs": MIN_DBFS, "rms_dbfs": MIN_DBFS, "silent": True}
+    # Noise far below the threshold is silent as well
+    assert analyze_wav(write_wav(str(tmp_path / "hiss.wav"), sine(0.0005)))["silent"] is True
+
+def test_clipped_sound(tmp_path):
+    analysis = analyze_wav(write_wav(str(tmp_path / "clipped.wav"), np.clip(sine(4.0), -1, 1)))
+    assert analysis["peak_dbfs"] == 0.0
+    assert -1.0 < analysis["rms_dbfs"] < 0.0
+    assert analysis["silent"] is False
+
+def test_8_bit_sound(tmp_path):
+    analysis = analyze_wav(write_wav(str(tmp_path / "8bit.wav"), sine(0.5), sample_width=1))
+    assert abs(analysis["peak_dbfs"] - -6.02) < 0.1
+
+def test_unreadable_and_missing_files(tmp_path):
+    broken = tmp_path / "broken.wav"
+    broken.write_bytes(b"not a wav")
+    assert "error" in analyze_wav(str(broken))
+    assert "error" in analyze_wav(str(tmp_path / "missing.wav"))
+
+def add_to_store(store, key, samples, tmp_path):
+    wem = tmp_path / "wem" / key.replace("/", "_")
+    wem.parent.mkdir(exist_ok=True)
+    wem.write_bytes(b"RIFF")
+    store.add(key, str(wem), write_wav(store.temp_path(), samples))
+
+def test_store_sounds_are_kept_apart_by_category(tmp_path, caplog):
+    store = AudioStore(str(tmp_path / "AudioStore"))
+    add_to_store(store, "Shared/100", sine(0.5), tmp_path)
+    add_to_store(store, "SharedDev/100", np.zeros(RATE), tmp_path)
+    add_to_store(store, "Shared/200", np.clip(sine(4.0), -1, 1), tmp_path)
+    add_to_store(store, "Shared/300", sine(0.25), tmp_path)
+    # A pruned object does not stop the run
+    os.remove(store.object_path(store.sources["Shared/300"]["hash"]))
+    paths, ids = collect_from_store(store)
+    with caplog.at_level(logging.INFO, logger="audio_analysis"):
+        results = analyze_all(paths, ids, num_processes=2)
+    assert results["Shared/100"]["silent"] is False
+    assert results["SharedDev/100"]["silent"] is True
+    assert results["Shared/200"]["peak_dbfs"] == 0.0
+    assert "error" in results["Shared/300"]
+    assert "files/s" in caplog.text
+
+    all_banks = {
+        "Shared": {"A": {"sound_files": {"100": {}, "200": {}, "300": {}}}},
+        "SharedDev": {"B": {"sound_files": {"100": {}}}},
+        "Other": {"C": {"sound_files": {"100": {}, "200": {}}}},
+    }
+    assert apply_to_dictionary(all_banks, results) == 4
+    assert all_banks["Shared"]["A"]["sound_files"]["100"]["silent"] is False
+    assert all_banks["SharedDev"]["B"]["sound_files"]["100"]["silent"] is True
+    assert all_banks["Shared"]["A"]["sound_files"]["300"] == {}
+    # Without a category of its own, only an unambiguous ID is matched
+    assert all_banks["Other"]["C"]["sound_files"]["100"] == {}
+    assert all_banks["Other"]["C"]["sound_files"]["200"]["peak_dbfs"] == 0.0
+
+def test_folder_sounds_take_their_category_from_the_folder(tmp_path):
+    root = tmp_path / "ConvertedAudio"
+    write_wav(str(root / "Shared" / "Bank" / "100.wem.wav"), sine(0.5))
+    write_wav(str(root / "SharedDev" / "100.wem.wav"), np.zeros(RATE))
+    paths, ids = collect_from_folder(str(root))
+    assert sorted(key for keys in ids.values() for key in keys) == ["Shared/100", "SharedDev/100"]
+    paths, ids = collect_from_folder(str(root / "SharedDev"))
+    assert list(ids.values()) == [["SharedDev/100"]]
+
+def test_throughput_over_many_files(tmp_path, caplog):
+    folder = tmp_path / "ConvertedAudio" / "Shared"
+    for i in range(200):
+        write_wav(str(folder / f"{i}.wem.wav"), sine(0.5, seconds=0.25) if i % 4 else np.zeros(RATE // 4))
+    paths, ids = collect_from_folder(str(folder))
+    with caplog.at_level(logging.INFO, logger="audio_analysis"):
+        results = analyze_all(paths, ids, num_processes=2)
+    assert len(results) == 200
+    assert sum(1 for analysis in results.values() if analysis["silent"]) == 50
+    assert "Analysed 200 files" in caplog.text
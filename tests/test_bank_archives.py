@@ -0,0 +1,125 @@
+""" Tests for bank_archives.py: archive contents and the up-to-date check """
+
+import os
+import json
+import shutil
+import tarfile
+import zipfile
+
+import pytest
+
+from audio_store import link_file
+from bank_archives import export_bank_archives, read_archive_manifest, archive_path, MANIFEST_NAME
+from run_planner import plan_export
+from sound_filter import SoundFilter
+
+SOUNDS = {"100": b"RIFF one", "200": b"RIFF two, longer"}
+
+@pytest.fixture
+def audio(tmp_path):
+    """
+    ConvertedAudio/Shared/VO_A/ linked to stored objects, as the audio store views build it
+
+    Returns:
+        (audio folder, objects folder, dictionary path, output folder)
+    """
+    objects = tmp_path / "objects"
+    objects.mkdir()
+    for sound_id, data in SOUNDS.items():
+        (objects / sound_id).write_bytes(data)
+    audio_folder = tmp_path / "ConvertedAudio"
+    build_view(str(audio_folder), str(objects))
+    dictionary = tmp_path / "bg3_sounds.json"
+    dictionary.write_text(json.dumps({"Shared": {"VO_A": {"name": "VO_A", "sound_files": {"100": {}, "200": {}}}}}))
+    return str(audio_folder), str(objects), str(dictionary), str(tmp_path / "BankArchives")
+
+def build_view(audio_folder, objects):
+    """Recreate the bank folder from scratch, as audio_store._replace_view does"""
+    bank = os.path.join(audio_folder, "Shared", "VO_A")
+    shutil.rmtree(bank, ignore_errors=True)
+    os.makedirs(bank)
+    for sound_id in SOUNDS:
+        link_file(os.path.join(objects, sound_id), os.path.join(bank, f"{sound_id}.wem.wav"))
+
+def export(audio, archive_format="zip"):
+    audio_folder, _, dictionary, output = audio
+    return export_bank_archives(audio_folder, output, archive_format, dictionary, max_workers=2,
+                                log=lambda message: None)
+
+@pytest.mark.parametrize("archive_format", ["zip", "tar"])
+def test_archive_round_trip(audio, archive_format):
+    counts = export(audio, archive_format)
+    assert counts == {"archives": 1, "skipped": 0, "files": 2, "bytes": sum(map(len, SOUNDS.values()))}
+    archive = archive_path(audio[3], "Shared", "VO_A", archive_format)
+    if archive_format == "zip":
+        with zipfile.ZipFile(archive) as source:
+            assert source.namelist()[0] == MANIFEST_NAME
+            assert all(info.compress_type == zipfile.ZIP_STORED for info in source.infolist())
+            contents = {name: source.read(name) for name in source.namelist()}
+    else:
+        with tarfile.open(archive) as source:
+            assert source.getnames()[0] == MANIFEST_NAME
+            contents = {member.name: source.extractfile(member).read() for member in source.getmembers()}
+    manifest = json.loads(contents.pop(MANIFEST_NAME))
+    assert contents == {f"{sound_id}.wem.wav": data for sound_id, data in SOUNDS.items()}
+    assert manifest["bank"] == "VO_A"
+    assert manifest["category"] == "Shared"
+    assert manifest["format"] == archive_format
+    assert manifest["files"] == [{"path": f"{sound_id}.wem.wav", "sound_id": sound_id, "size": len(data)}
+                                 for sound_id, data in SOUNDS.items()]
+    assert manifest["dictionary"]["sound_files"] == {"100": {}, "200": {}}
+    assert manifest == read_archive_manifest(archive)
+    assert not os.path.exists(f"{archive}.tmp")
+
+@pytest.mark.parametrize("archive_format", ["zip", "tar"])
+def test_rebuilt_view_keeps_archives_up_to_date(audio, archive_format):
+    audio_folder, objects, dictionary, output = audio
+    export(audio, archive_format)
+    archive = archive_path(output, "Shared", "VO_A", archive_format)
+    written = os.stat(archive).st_mtime_ns
+    build_view(audio_folder, objects)
+    assert export(audio, archive_format)["skipped"] == 1
+    assert os.stat(archive).st_mtime_ns == written
+
+def test_planner_agrees_with_the_export(audio):
+    audio_folder, objects, dictionary, output = audio
+    settings = {"should_export": True, "folder_audio_converted": audio_folder, "folder_bank_archives": output,
+                "bank_dictionary": dictionary, "archive_format": "zip"}
+
+    def planned():
+        plan = []
+        plan_export(settings, plan, lambda name, key, files, bytes_total, note="": files, SoundFilter())
+        return plan[0]
+
+    assert planned() == 2
+    export(audio)
+    build_view(audio_folder, objects)
+    assert planned() == 0
+
+def test_changes_rebuild_the_archive(audio):
+    audio_folder, objects, dictionary, output = audio
+    export(audio)
+    # Another sound in the store
+    with open(os.path.join(objects, "300"), "wb") as f:
+        f.write(b"RIFF three")
+    bank = os.path.join(audio_folder, "Shared", "VO_A")
+    os.remove(os.path.join(bank, "100.wem.wav"))
+    link_file(os.path.join(objects, "300"), os.path.join(bank, "100.wem.wav"))
+    assert export(audio)["archives"] == 1
+    # A renamed file
+    os.rename(os.path.join(bank, "200.wem.wav"), os.path.join(bank, "Goblin_Attack.wav"))
+    assert export(audio)["archives"] == 1
+    # A changed dictionary entry
+    with open(dictionary, "w", encoding="utf-8") as f:
+        json.dump({"Shared": {"VO_A": {"name": "VO_A", "sound_files": {"100": {"duration": 1.0}}}}}, f)
+    assert export(audio)["archives"] == 1
+    assert export(audio)["skipped"] == 1
+
+def test_archives_without_a_signature_are_rebuilt(audio):
+    audio_folder, _, dictionary, output = audio
+    archive = archive_path(output, "Shared", "VO_A", "zip")
+    os.makedirs(os.path.dirname(archive))
+    with zipfile.ZipFile(archive, "w") as target:
+        target.writestr(MANIFEST_NAME, json.dumps({"version": 1, "bank": "VO_A"}))
+    assert export(audio)["archives"] == 1
+    assert read_archive_manifest(archive)["signature"]
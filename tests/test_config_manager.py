@@ -0,0 +1,84 @@
+""" Tests for the debounced, merging saves of config_manager.py """
+
+import os
+import sys
+import json
+import time
+import threading
+import subprocess
+
+from config_manager import ConfigManager
+
+def test_save_reports_the_write(tmp_path):
+    path = str(tmp_path / "config.json")
+    manager = ConfigManager(path)
+    manager.set("max_workers", 3)
+    first = manager.save_config()
+    manager.set("max_workers", 5)
+    second = manager.save_config()
+    assert first is second
+    assert second.result(timeout=5) is True
+    with open(path) as f:
+        assert json.load(f)["max_workers"] == 5
+    assert not manager.dirty
+
+def test_failed_save_is_reported(tmp_path):
+    manager = ConfigManager(str(tmp_path / "missing" / "config.json"))
+    manager.set("max_workers", 3)
+    assert manager.save_config().result(timeout=5) is False
+    assert manager.last_save_error
+    assert "max_workers" in manager.dirty
+    os.makedirs(tmp_path / "missing")
+    assert manager.flush()
+
+def test_merges_keys_saved_by_another_instance(tmp_path):
+    path = str(tmp_path / "config.json")
+    first = ConfigManager(path)
+    second = ConfigManager(path)
+    first.set("max_workers", 3)
+    assert first.flush()
+    second.set("batch_max_files", 8)
+    assert second.flush()
+    with open(path) as f:
+        saved = json.load(f)
+    assert (saved["max_workers"], saved["batch_max_files"]) == (3, 8)
+    assert second.get("max_workers") == 3
+
+def test_set_is_not_blocked_by_a_waiting_flush(tmp_path):
+    path = str(tmp_path / "config.json")
+    manager = ConfigManager(path)
+    manager.set("max_workers", 3)
+    # Another instance holds the lock file
+    lock_path = f"{path}.lock"
+    open(lock_path, "w").close()
+    results = []
+    flusher = threading.Thread(target=lambda: results.append(manager.flush()))
+    flusher.start()
+    time.sleep(0.2)
+    start = time.monotonic()
+    manager.set("max_workers", 4)
+    assert time.monotonic() - start < 0.1
+    os.remove(lock_path)
+    flusher.join(timeout=5)
+    assert results == [True]
+    # Changed during the write: still pending, and not overwritten by the file
+    assert manager.get("max_workers") == 4
+    assert "max_workers" in manager.dirty
+    assert manager.flush()
+    with open(path) as f:
+        assert json.load(f)["max_workers"] == 4
+
+def test_import_and_exit_writes_nothing(tmp_path):
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=repo)
+    subprocess.run([sys.executable, "-c", "import config_manager"], cwd=tmp_path, env=env, check=True)
+    assert os.listdir(tmp_path) == []
+
+def test_exit_writes_pending_changes(tmp_path):
+    manager = ConfigManager(str(tmp_path / "config.json"))
+    assert manager.flush_pending()
+    assert not os.path.exists(tmp_path / "config.json")
+    manager.set("max_workers", 3)
+    assert manager.flush_pending()
+    with open(tmp_path / "config.json") as f:
+        assert json.load(f)["max_workers"] == 3
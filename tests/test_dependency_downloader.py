@@ -0,0 +1,172 @@
+""" Tests for dependency_downloader.py against a local HTTP stand-in """
+
+import os
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from dependency_downloader import download_file, download_dependencies, DownloadManifest, DownloadCancelled
+
+class FileServer:
+    """Serves one file at /tool.zip, with optional Range and If-Range support"""
+
+    def __init__(self, content: bytes, etag: str = '"v1"', ranges: bool = True):
+        self.content = content
+        self.etag = etag
+        self.ranges = ranges
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append(dict(self.headers))
+                body = server.content
+                status = 200
+                headers = {"ETag": server.etag}
+                range_header = self.headers.get("Range")
+                if_range = self.headers.get("If-Range")
+                if server.ranges and range_header and (if_range is None or if_range == server.etag):
+                    start = int(range_header.split("=")[1].split("-")[0])
+                    if start >= len(body):
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(body)}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    status = 206
+                    headers["Content-Range"] = f"bytes {start}-{len(body) - 1}/{len(body)}"
+                    body = body[start:]
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/tool.zip"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+@pytest.fixture
+def make_server():
+    servers = []
+
+    def make(*args, **kwargs) -> FileServer:
+        server = FileServer(*args, **kwargs)
+        servers.append(server)
+        return server
+
+    yield make
+    for server in servers:
+        server.close()
+
+CONTENT = bytes(range(256)) * 4000
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def test_download_saves_and_removes_validator(make_server, tmp_path):
+    server = make_server(CONTENT)
+    destination = tmp_path / "tool.zip"
+    assert download_file(server.url, str(destination)) == sha256(CONTENT)
+    assert destination.read_bytes() == CONTENT
+    assert not os.path.exists(f"{destination}.part")
+    assert not os.path.exists(f"{destination}.part.json")
+
+def test_resume_with_if_range(make_server, tmp_path):
+    server = make_server(CONTENT)
+    destination = tmp_path / "tool.zip"
+
+    chunks = []
+    with pytest.raises(DownloadCancelled):
+        download_file(server.url, str(destination), progress=lambda done, total: chunks.append(done),
+                      should_continue=lambda: not chunks)
+    offset = os.path.getsize(f"{destination}.part")
+    assert 0 < offset < len(CONTENT)
+
+    assert download_file(server.url, str(destination)) == sha256(CONTENT)
+    assert destination.read_bytes() == CONTENT
+    resumed = server.requests[-1]
+    assert resumed["Range"] == f"bytes={offset}-"
+    assert resumed["If-Range"] == '"v1"'
+
+def test_changed_file_restarts(make_server, tmp_path):
+    server = make_server(CONTENT)
+    destination = tmp_path / "tool.zip"
+    (tmp_path / "tool.zip.part").write_bytes(b"old build")
+    (tmp_path / "tool.zip.part.json").write_text(f'{{"url": "{server.url}", "validator": "\\"v0\\""}}')
+    assert download_file(server.url, str(destination)) == sha256(CONTENT)
+    assert destination.read_bytes() == CONTENT
+
+def test_part_without_validator_is_not_resumed(make_server, tmp_path):
+    server = make_server(CONTENT)
+    destination = tmp_path / "tool.zip"
+    (tmp_path / "tool.zip.part").write_bytes(CONTENT[:1000])
+    assert download_file(server.url, str(destination)) == sha256(CONTENT)
+    assert "Range" not in server.requests[-1]
+
+def test_complete_part_with_validator(make_server, tmp_path):
+    server = make_server(CONTENT)
+    destination = tmp_path / "tool.zip"
+    (tmp_path / "tool.zip.part").write_bytes(CONTENT)
+    (tmp_path / "tool.zip.part.json").write_text(f'{{"url": "{server.url}", "validator": "\\"v1\\""}}')
+    assert download_file(server.url, str(destination)) == sha256(CONTENT)
+    assert len(server.requests) == 1
+
+def test_longer_part_restarts_on_416(make_server, tmp_path):
+    server = make_server(CONTENT)
+    destination = tmp_path / "tool.zip"
+    (tmp_path / "tool.zip.part").write_bytes(CONTENT + b"garbage")
+    (tmp_path / "tool.zip.part.json").write_text(f'{{"url": "{server.url}", "validator": "\\"v1\\""}}')
+    assert download_file(server.url, str(destination)) == sha256(CONTENT)
+    assert destination.read_bytes() == CONTENT
+
+def test_server_ignoring_range(make_server, tmp_path):
+    server = make_server(CONTENT, ranges=False)
+    destination = tmp_path / "tool.zip"
+    (tmp_path / "tool.zip.part").write_bytes(CONTENT[:1000])
+    (tmp_path / "tool.zip.part.json").write_text(f'{{"url": "{server.url}", "validator": "\\"v1\\""}}')
+    assert download_file(server.url, str(destination)) == sha256(CONTENT)
+    assert destination.read_bytes() == CONTENT
+    assert server.requests[-1]["Range"] == "bytes=1000-"
+
+def test_checksum_mismatch(make_server, tmp_path):
+    server = make_server(CONTENT)
+    destination = tmp_path / "tool.zip"
+    with pytest.raises(ValueError):
+        download_file(server.url, str(destination), expected_sha256=sha256(b"other"))
+    assert not destination.exists()
+    assert not os.path.exists(f"{destination}.part")
+    assert not os.path.exists(f"{destination}.part.json")
+
+def test_unknown_existing_file_is_downloaded_again(make_server, tmp_path):
+    server = make_server(CONTENT)
+    # An older, shorter build left by a previous version
+    (tmp_path / "tool.zip").write_bytes(CONTENT[:5000])
+    messages = []
+    failed = download_dependencies([server.url], str(tmp_path), messages.append)
+    assert (tmp_path / "tool.zip").read_bytes() == CONTENT
+    assert "Range" not in server.requests[-1]
+    assert DownloadManifest(str(tmp_path)).get("tool.zip")["sha256"] == sha256(CONTENT)
+    # The payload is not a real zip, so only the extraction fails
+    assert failed == ["tool.zip"]
+
+def test_pinned_checksum_mismatch_fails(make_server, tmp_path):
+    server = make_server(CONTENT)
+    manifest = DownloadManifest(str(tmp_path))
+    manifest.files["tool.zip"] = {"sha256": sha256(b"other"), "pinned": True}
+    manifest.save()
+    messages = []
+    assert download_dependencies([server.url], str(tmp_path), messages.append) == ["tool.zip"]
+    assert not (tmp_path / "tool.zip").exists()
+    assert any("checksum mismatch" in message for message in messages)
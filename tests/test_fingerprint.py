@@ -0,0 +1,55 @@
+""" Tests for the vgmstream version handling of fingerprint.py """
+
+import json
+
+from fingerprint import FingerprintIndex, build_index
+
+def write_index(path, sounds):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "sounds": sounds}, f)
+
+def test_fingerprints_of_another_version_are_dropped(tmp_path):
+    path = str(tmp_path / "fingerprints.json")
+    write_index(path, {
+        "1": {"raw_hash": "a", "fingerprint": "ff00", "duration": 1.0, "silent": False, "tool": "old"},
+        "2": {"raw_hash": "a", "fingerprint": "ff00", "duration": 1.0, "silent": False, "tool": "new"},
+        "3": {"raw_hash": "b", "duration": 0.5, "silent": True, "tool": "old"},
+    })
+    index = FingerprintIndex(path, "new")
+    assert index.sounds["1"] == {"raw_hash": "a", "tool": "old"}
+    assert index.sounds["2"]["fingerprint"] == "ff00"
+    duplicates, silent = index.skip_plan()
+    # Raw hashes do not depend on the decoder, silence does
+    assert duplicates == {"2": "1"}
+    assert silent == []
+
+def test_without_a_version_the_index_is_kept(tmp_path):
+    path = str(tmp_path / "fingerprints.json")
+    write_index(path, {"3": {"raw_hash": "b", "silent": True, "tool": "old"}})
+    assert FingerprintIndex(path).skip_plan() == ({}, ["3"])
+
+def test_build_index_redoes_dropped_fingerprints(tmp_path, monkeypatch):
+    wem = tmp_path / "3.wem"
+    wem.write_bytes(b"RIFF")
+    stat = wem.stat()
+    path = str(tmp_path / "fingerprints.json")
+    write_index(path, {"3": {"path": str(wem), "size": stat.st_size, "mtime": stat.st_mtime,
+                             "raw_hash": "b", "silent": True, "tool": "old"}})
+    index = FingerprintIndex(path, "new")
+
+    class InlineExecutor:
+        def __init__(self, max_workers=None):
+            pass
+        def __enter__(self):
+            return self
+        def __exit__(self, *exc_info):
+            return False
+        def map(self, func, items, chunksize=1):
+            return map(func, items)
+
+    monkeypatch.setattr("fingerprint.ProcessPoolExecutor", InlineExecutor)
+    monkeypatch.setattr("fingerprint.spectral_fingerprint",
+                        lambda wav: {"duration": 0.5, "silent": False, "fingerprint": "0f"})
+    assert build_index(index, [str(wem)], {"3": str(tmp_path / "3.wem.wav")}) == 1
+    assert index.sounds["3"]["fingerprint"] == "0f"
+    assert index.sounds["3"]["tool"] == "new"
@@ -0,0 +1,111 @@
+""" Tests for run_planner.py on a small fake UnpackedData tree """
+
+import os
+import subprocess
+
+import pytest
+
+import run_planner
+from run_planner import plan_run, ThroughputHistory
+from tool_registry import ToolRegistry
+from audio_store import AudioStore, source_key
+
+BANKS = {"Shared": {"A.bnk": 100, "B.bnk": 300}, "SharedDev": {"C.bnk": 50}}
+WEMS = {"Shared": {"1.wem": 1000, "2.wem": 2000}, "SharedDev": {"3.wem": 500}}
+
+def write(path, size: int):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    unpacked = tmp_path / "UnpackedData"
+    for top, files in (("SharedSoundBanks", BANKS), ("SharedSounds", WEMS)):
+        for category, sizes in files.items():
+            for name, size in sizes.items():
+                write(unpacked / top / "Public" / category / "Assets" / "Sound" / name, size)
+    # One sound converted by an earlier run
+    write(tmp_path / "ConvertedAudio" / "Shared" / "9.wem.wav", 10)
+    write(tmp_path / "vgmstream" / "vgmstream-cli", 10)
+
+    history = ThroughputHistory(str(tmp_path / "throughput.json"))
+    history.record("decode", 3, 450, 4.5, 4)
+    history.record("convert_batch", 3, 3500, 10.0, 4)
+    history.save()
+
+    registry = ToolRegistry(str(tmp_path / "tool_cache.json"), str(tmp_path / "dependencies"))
+    monkeypatch.setattr(run_planner, "tool_registry", registry)
+
+    def no_subprocess(*args, **kwargs):
+        raise AssertionError(f"plan_run started a subprocess: {args}")
+
+    monkeypatch.setattr(subprocess, "Popen", no_subprocess)
+    monkeypatch.setattr(subprocess, "run", no_subprocess)
+
+    settings = {
+        "folder_unpacked_data": str(unpacked),
+        "folder_audio_converted": str(tmp_path / "ConvertedAudio"),
+        "folder_banks_converted": str(tmp_path / "ConvertedBanks"),
+        "folder_vgmstream": str(tmp_path / "vgmstream"),
+        "folder_audio_store": str(tmp_path / "AudioStore"),
+        "folder_bg3sids_wiki": str(tmp_path / "missing_wiki_data.json"),
+        "throughput_history": str(tmp_path / "throughput.json"),
+        "should_decode_banks": True,
+        "should_convert": True,
+        "should_group": True,
+        "should_rename": True,
+        "batch_convert": True,
+    }
+    return tmp_path, settings, registry
+
+def by_stage(plan):
+    return {entry["stage"]: entry for entry in plan}
+
+def test_counts_bytes_and_eta(tree):
+    tmp_path, settings, registry = tree
+    plan = by_stage(plan_run(settings))
+    assert list(plan) == ["decode", "convert", "group", "rename"]
+    assert (plan["decode"]["files"], plan["decode"]["bytes"]) == (3, 450)
+    assert plan["decode"]["seconds"] == pytest.approx(4.5)
+    assert (plan["convert"]["files"], plan["convert"]["bytes"]) == (3, 3500)
+    assert plan["convert"]["seconds"] == pytest.approx(10.0)
+    # 1, 2 and the earlier 9 in Shared, 3 in SharedDev
+    assert plan["group"]["files"] == 4
+    assert plan["rename"]["files"] == 0
+    assert "wiki_data.json is missing" in plan["rename"]["note"]
+
+def test_unmeasured_stage_has_no_eta(tree):
+    tmp_path, settings, registry = tree
+    os.remove(tmp_path / "throughput.json")
+    plan = by_stage(plan_run(settings))
+    assert plan["decode"]["seconds"] is None
+    assert plan["convert"]["seconds"] is None
+
+def test_store_without_cached_version_is_unknown(tree):
+    tmp_path, settings, registry = tree
+    settings["use_audio_store"] = True
+    plan = by_stage(plan_run(settings))
+    assert plan["convert"]["files"] == 3
+    assert "unknown" in plan["convert"]["note"]
+    assert not os.path.exists(tmp_path / "tool_cache.json")
+
+def test_store_with_cached_version_skips_current_sounds(tree):
+    tmp_path, settings, registry = tree
+    settings["use_audio_store"] = True
+    vgmstream = str(tmp_path / "vgmstream" / "vgmstream-cli")
+    stat = os.stat(vgmstream)
+    registry.cache[os.path.abspath(vgmstream)] = {"tool": "vgmstream", "size": stat.st_size,
+                                                  "mtime": stat.st_mtime, "version": "r1"}
+    store = AudioStore(settings["folder_audio_store"], "r1")
+    wem = os.path.join(settings["folder_unpacked_data"], "SharedSounds", "Public", "Shared",
+                       "Assets", "Sound", "2.wem")
+    converted = store.temp_path()
+    write(converted, 20)
+    store.add(source_key("Shared", wem), wem, converted)
+    store.save()
+
+    plan = by_stage(plan_run(settings))
+    assert (plan["convert"]["files"], plan["convert"]["bytes"]) == (2, 1500)
+    assert "1 up to date in the store" in plan["convert"]["note"]
+    assert plan["link"]["files"] == 3
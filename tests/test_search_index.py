@@ -0,0 +1,78 @@
+""" Tests for search_index.py and the /search endpoint of preview_server.py """
+
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from search_index import SearchIndex, build_index
+from preview_server import make_handler
+
+BANKS = {
+    "Shared": {
+        "CRE_Goblin": {"sound_files": {
+            "123456": {"friendly_name": "Goblin_Attack", "source_path": "Shared/CRE_Goblin.bnk"},
+            "654321": {"friendly_name": "Goblin_Death", "source_path": "Shared/CRE_Goblin.bnk"},
+        }},
+    },
+}
+
+@pytest.fixture(params=[True, False], ids=["fts", "like"])
+def index(tmp_path, request):
+    path = str(tmp_path / "search.db")
+    build_index(BANKS, path)
+    search_index = SearchIndex(path)
+    # The LIKE fallback is what SQLite builds without FTS5 use
+    search_index.has_fts = search_index.has_fts and request.param
+    yield search_index
+    search_index.close()
+
+def test_words_and_ids_are_found(index):
+    assert [row["sound_id"] for row in index.search("goblin death")] == ["654321"]
+    assert [row["sound_id"] for row in index.search("123456")] == ["123456"]
+
+@pytest.mark.parametrize("query", ['"', '"""', ' " " ', ""])
+def test_queries_without_words_find_nothing(index, query):
+    assert index.search(query) == []
+
+class FakeService:
+    def __init__(self):
+        self.calls = []
+
+    def search(self, query, limit=50):
+        self.calls.append((query, limit))
+        return [{"sound_id": "1"}]
+
+@pytest.fixture
+def server():
+    service = FakeService()
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(service))
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield service, f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+def get_status(url):
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+def test_search_passes_the_limit(server):
+    service, base = server
+    status, body = get_status(f"{base}/search?q=goblin&limit=5")
+    assert status == 200
+    assert json.loads(body) == [{"sound_id": "1"}]
+    assert service.calls == [("goblin", 5)]
+
+@pytest.mark.parametrize("limit", ["abc", "0", "-1", "2.5"])
+def test_bad_limit_is_rejected(server, limit):
+    service, base = server
+    status, _ = get_status(f"{base}/search?q=goblin&limit={limit}")
+    assert status == 400
+    assert service.calls == []
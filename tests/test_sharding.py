@@ -0,0 +1,192 @@
+""" Tests for sharding.py: N shards over a synthetic tree merge into the unsharded output """
+
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+from audio_store import AudioStore, source_key
+from dictionary_writer import DictionaryWriter
+from sharding import (Shard, parse_shard, write_shard_record, check_shards,
+                      merge_dictionaries, merge_stores, merge_trees)
+
+SHARD_COUNT = 4
+BANKS_PER_CATEGORY = 30
+SOUNDS_PER_BANK = 5
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(scope="module")
+def tree(tmp_path_factory):
+    """
+    UnpackedData-like tree of banks and WEMs in Shared and SharedDev
+
+    The same sound ID exists in both categories, and every tenth sound has
+    the same converted audio as the one before it.
+
+    Returns:
+        (root, {category: [(bank path, [WEM paths])]})
+    """
+    root = str(tmp_path_factory.mktemp("UnpackedData"))
+    banks = {}
+    for category in ("Shared", "SharedDev"):
+        folder = os.path.join(root, category, "Assets", "Sound")
+        os.makedirs(folder)
+        banks[category] = []
+        for i in range(BANKS_PER_CATEGORY):
+            bank = os.path.join(folder, f"{category}_Bank{i}.bnk")
+            with open(bank, "wb") as f:
+                f.write(b"BKHD")
+            wems = []
+            for j in range(SOUNDS_PER_BANK):
+                wem = os.path.join(folder, f"{i * SOUNDS_PER_BANK + j}.wem")
+                with open(wem, "wb") as f:
+                    f.write(f"{category} {i} {j}".encode("utf-8"))
+                wems.append(wem)
+            banks[category].append((bank, wems))
+    return root, banks
+
+def bank_name(bank):
+    return os.path.basename(bank)[:-4]
+
+def converted_audio(category, wem):
+    sound_id = int(os.path.basename(wem).split(".")[0])
+    return f"RIFF {category} {sound_id - sound_id % 10 if sound_id % 10 == 1 else sound_id}".encode("utf-8")
+
+def run_shard(tree, shard, output):
+    """Do the part of a run one shard owns: dictionary, audio store and decoded banks"""
+    root, banks = tree
+    os.makedirs(output, exist_ok=True)
+    dictionary = os.path.join(output, "bg3_sounds.json")
+    writer = DictionaryWriter(dictionary)
+    store = AudioStore(os.path.join(output, "AudioStore"), "v1")
+    decoded = os.path.join(output, "ConvertedBanks")
+    owned = {"banks": [], "wems": []}
+    for category, category_banks in banks.items():
+        for bank, wems in category_banks:
+            if shard is None or shard.owns(category, bank):
+                owned["banks"].append(source_key(category, bank))
+                sound_files = {os.path.basename(wem).split(".")[0]: {"wem_filename": os.path.basename(wem)}
+                               for wem in wems}
+                writer.add(category, bank_name(bank), {"name": bank_name(bank), "sound_files": sound_files})
+                bank_folder = os.path.join(decoded, category, bank_name(bank))
+                os.makedirs(bank_folder, exist_ok=True)
+                with open(os.path.join(bank_folder, f"{bank_name(bank)}.bnk.xml"), "w", encoding="utf-8") as f:
+                    f.write(f"<bank name='{bank_name(bank)}'/>")
+            for wem in wems:
+                if shard is None or shard.owns(category, wem):
+                    owned["wems"].append(source_key(category, wem))
+                    converted = store.temp_path()
+                    with open(converted, "wb") as f:
+                        f.write(converted_audio(category, wem))
+                    store.add(source_key(category, wem), wem, converted)
+    writer.close({category: sorted(bank_name(bank) for bank, _ in category_banks)
+                  for category, category_banks in banks.items()})
+    store.save()
+    if shard is not None:
+        for path in (dictionary, store.root, decoded):
+            write_shard_record(path, shard)
+    return owned
+
+def list_tree(root):
+    files = {}
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(dirpath, name)
+            with open(path, "rb") as f:
+                files[os.path.relpath(path, root)] = f.read()
+    return files
+
+@pytest.fixture(scope="module")
+def shards(tree, tmp_path_factory):
+    """Unsharded output and the outputs of shards 1/N ... N/N"""
+    base = tmp_path_factory.mktemp("runs")
+    full = run_shard(tree, None, str(base / "full"))
+    outputs = []
+    owned = []
+    for index in range(1, SHARD_COUNT + 1):
+        output = str(base / f"shard{index}")
+        owned.append(run_shard(tree, Shard(index, SHARD_COUNT), output))
+        outputs.append(output)
+    return str(base / "full"), full, outputs, owned
+
+def test_parse_shard():
+    assert parse_shard("2/4") == Shard(2, 4)
+    assert parse_shard("") is None
+    assert str(Shard(3, 8)) == "3/8"
+    for text in ("0/4", "5/4", "2", "a/b", "2/-4"):
+        with pytest.raises(ValueError):
+            Shard.parse(text)
+
+def test_every_file_is_owned_by_exactly_one_shard(shards):
+    _, full, _, owned = shards
+    for kind in ("banks", "wems"):
+        keys = [key for shard in owned for key in shard[kind]]
+        assert sorted(keys) == sorted(full[kind])
+        assert len(keys) == len(set(keys))
+        # The hash spreads the work: no shard is left empty
+        assert all(shard[kind] for shard in owned)
+
+def test_merged_dictionary_matches_the_unsharded_one(shards, tmp_path):
+    full_dir, _, outputs, _ = shards
+    inputs = [os.path.join(output, "bg3_sounds.json") for output in outputs]
+    assert check_shards(inputs)
+    merged = str(tmp_path / "bg3_sounds.json")
+    counts = merge_dictionaries(inputs, merged)
+    assert counts == {"banks": 2 * BANKS_PER_CATEGORY, "sounds": 2 * BANKS_PER_CATEGORY * SOUNDS_PER_BANK}
+    with open(merged, "r", encoding="utf-8") as f:
+        merged_text = f.read()
+    with open(os.path.join(full_dir, "bg3_sounds.json"), "r", encoding="utf-8") as f:
+        full_text = f.read()
+    assert json.loads(merged_text) == json.loads(full_text)
+    # Banks are sorted by name, so the file does not depend on the shard count
+    assert merged_text == full_text
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".bg3_dictionary_")]
+
+def test_merged_store_matches_the_unsharded_one(shards, tmp_path):
+    full_dir, _, outputs, _ = shards
+    inputs = [os.path.join(output, "AudioStore") for output in outputs]
+    assert check_shards(inputs)
+    merged_root = str(tmp_path / "AudioStore")
+    assert merge_stores(inputs, merged_root) == 2 * BANKS_PER_CATEGORY * SOUNDS_PER_BANK
+    merged = AudioStore(merged_root)
+    full = AudioStore(os.path.join(full_dir, "AudioStore"))
+    assert merged.sources == full.sources
+    assert list_tree(merged.objects_dir) == list_tree(full.objects_dir)
+    # Merging again adds nothing
+    assert merge_stores(inputs, merged_root) == 0
+
+def test_merged_tree_matches_the_unsharded_one(shards, tmp_path):
+    full_dir, _, outputs, _ = shards
+    inputs = [os.path.join(output, "ConvertedBanks") for output in outputs]
+    assert check_shards(inputs)
+    merged = str(tmp_path / "ConvertedBanks")
+    assert merge_trees(inputs, merged) == 2 * BANKS_PER_CATEGORY
+    assert list_tree(merged) == list_tree(os.path.join(full_dir, "ConvertedBanks"))
+
+def test_check_shards_rejects_missing_and_duplicate_shards(shards, tmp_path):
+    _, _, outputs, _ = shards
+    inputs = [os.path.join(output, "bg3_sounds.json") for output in outputs]
+    assert not check_shards(inputs[1:])
+    assert not check_shards(inputs + inputs[:1])
+    other = str(tmp_path / "other.json")
+    write_shard_record(other, Shard(1, SHARD_COUNT + 1))
+    assert not check_shards(inputs[1:] + [other])
+    # Outputs without a record cannot be checked and are accepted
+    assert check_shards([str(tmp_path / "unrecorded.json")])
+
+def test_merge_command_refuses_an_incomplete_set(shards, tmp_path):
+    _, _, outputs, _ = shards
+    inputs = [os.path.join(output, "bg3_sounds.json") for output in outputs]
+    command = [sys.executable, os.path.join(REPO, "sharding.py"), "merge-dictionary"]
+    output = str(tmp_path / "merged.json")
+    result = subprocess.run(command + inputs[:-1] + ["--output", output], cwd=tmp_path,
+                            capture_output=True, text=True)
+    assert result.returncode == 1
+    assert "Missing shards: 4" in result.stderr
+    assert not os.path.exists(output)
+    result = subprocess.run(command + inputs + ["--output", output], cwd=tmp_path,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert os.path.exists(output)
@@ -0,0 +1,115 @@
+""" Tests for the include/exclude rules of sound_filter.py """
+
+import gzip
+import json
+
+import pytest
+
+from sound_filter import SoundFilter, read_id_list, bank_name_of, sound_id_of
+
+def write_bank_xml(path, sound_ids, compress=False):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    text = "".join(f'<field type="tid" name="sourceID" value="{sound_id}"/>\n' for sound_id in sound_ids)
+    if compress:
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        path.write_text(text, encoding="utf-8")
+
+def test_names_of_paths():
+    assert bank_name_of("/x/VO_Goblin.bnk") == "VO_Goblin"
+    assert bank_name_of("VO_Goblin.bnk.xml.gz") == "VO_Goblin"
+    assert bank_name_of("VO_Goblin.bnk.xml.zst") == "VO_Goblin"
+    assert sound_id_of("/x/12345.wem.wav") == "12345"
+
+def test_read_id_list(tmp_path):
+    path = tmp_path / "ids.txt"
+    path.write_text("# sounds to keep\n"
+                    "123\n"
+                    "456, 789  # three on one line\n"
+                    "\n"
+                    "Goblin scream 1011\n"
+                    "#2222 commented out\n", encoding="utf-8")
+    assert read_id_list(str(path)) == {"123", "456", "789", "1011"}
+    with pytest.raises(ValueError, match="Cannot read ID list"):
+        read_id_list(str(tmp_path / "missing.txt"))
+
+def test_no_rules_select_everything():
+    sound_filter = SoundFilter()
+    assert not sound_filter.active
+    assert sound_filter.wants_bank("Other", "Any.bnk")
+    assert sound_filter.wants_sound("Shared", "1.wem")
+    assert sound_filter.describe() == "everything"
+
+def test_bank_globs_are_case_insensitive():
+    sound_filter = SoundFilter(banks=["VO_*", "*ambience*"])
+    assert sound_filter.wants_bank("Shared", "vo_goblin.bnk")
+    assert sound_filter.wants_bank("SharedDev", "Cave_Ambience_Loop.bnk.xml")
+    assert not sound_filter.wants_bank("Shared", "MUS_Combat.bnk")
+    # A bank filter selects no loose sounds until the banks are read
+    assert not sound_filter.wants_sound("Shared", "1.wem")
+
+def test_excludes_win_over_includes():
+    sound_filter = SoundFilter(banks=["VO_*"], exclude_banks=["VO_Goblin*"],
+                               ids={"1", "2"}, exclude_ids=["2"], exclude_categories=["SharedDev"])
+    assert sound_filter.wants_bank("Shared", "VO_Orc.bnk")
+    assert not sound_filter.wants_bank("Shared", "VO_Goblin_Boss.bnk")
+    assert not sound_filter.wants_bank("SharedDev", "VO_Orc.bnk")
+    assert sound_filter.wants_sound("Shared", "1.wem")
+    assert not sound_filter.wants_sound("Shared", "2.wem")
+    assert not sound_filter.wants_sound("SharedDev", "1.wem")
+    # Excludes alone leave everything else in
+    exclude_only = SoundFilter(exclude_banks=["MUS_*"], exclude_ids=["3"])
+    assert exclude_only.active and not exclude_only.includes
+    assert exclude_only.wants_bank("Shared", "VO_Orc.bnk")
+    assert not exclude_only.wants_bank("Shared", "MUS_Combat.bnk")
+    assert exclude_only.wants_sound("Shared", "4.wem")
+    assert not exclude_only.wants_sound("Shared", "3.wem")
+
+def test_categories():
+    sound_filter = SoundFilter(categories=["shared"])
+    assert sound_filter.wants_category("Shared")
+    assert not sound_filter.wants_category("SharedDev")
+    assert not sound_filter.wants_sound("Other", "1.wem")
+
+def test_id_list_selects_banks_named_by_id():
+    sound_filter = SoundFilter(ids={"123456"})
+    assert sound_filter.wants_bank("Shared", "123456.bnk")
+    assert not sound_filter.wants_bank("Shared", "654321.bnk")
+
+@pytest.mark.parametrize("compress", [False, True], ids=["xml", "gzip"])
+def test_wants_sound_after_load_bank_sounds(tmp_path, compress):
+    banks_dir = tmp_path / "ConvertedBanks" / "Shared"
+    suffix = ".bnk.xml.gz" if compress else ".bnk.xml"
+    write_bank_xml(banks_dir / "VO_Orc" / f"VO_Orc{suffix}", ["1", "2"], compress)
+    write_bank_xml(banks_dir / "VO_Goblin" / f"VO_Goblin{suffix}", ["3"], compress)
+    write_bank_xml(banks_dir / "MUS_Combat" / f"MUS_Combat{suffix}", ["4"], compress)
+    sound_filter = SoundFilter(banks=["VO_*"], exclude_banks=["VO_Goblin"], exclude_ids=["2"])
+    assert not sound_filter.wants_sound("Shared", "1.wem")
+    assert sound_filter.load_bank_sounds(str(banks_dir), "Shared") == 1
+    assert sound_filter.wants_sound("Shared", "1.wem")
+    assert not sound_filter.wants_sound("Shared", "2.wem")
+    assert not sound_filter.wants_sound("Shared", "3.wem")
+    assert not sound_filter.wants_sound("Shared", "4.wem")
+    # Only bank globs and wiki pages need the decoded banks
+    assert SoundFilter(ids={"4"}).load_bank_sounds(str(banks_dir), "Shared") == 0
+
+def test_from_settings(tmp_path):
+    ids_file = tmp_path / "ids.txt"
+    ids_file.write_text("10\n20\n", encoding="utf-8")
+    wiki = tmp_path / "wiki_data.json"
+    wiki.write_text(json.dumps({"VO_Orc (voice lines)": {"content": "1\nOrc_Laugh\n30, 31\n"}}), encoding="utf-8")
+    sound_filter = SoundFilter.from_settings({
+        "filter_ids_file": str(ids_file),
+        "filter_ids": [40],
+        "filter_wiki_pages": ["vo_orc"],
+        "folder_bg3sids_wiki": str(wiki),
+    })
+    assert sound_filter.ids == {"10", "20", "40"}
+    assert sound_filter.sound_ids == {"10", "20", "40", "30", "31"}
+    assert sound_filter.wants_bank("Shared", "VO_Orc.bnk")
+    assert sound_filter.wants_sound("Shared", "31.wem")
+    with pytest.raises(ValueError, match="No wiki page"):
+        SoundFilter.from_settings({"filter_wiki_pages": ["Dragon"], "folder_bg3sids_wiki": str(wiki)})
+    with pytest.raises(ValueError, match="need wiki_data.json"):
+        SoundFilter.from_settings({"filter_wiki_pages": ["Orc"], "folder_bg3sids_wiki": str(tmp_path / "none.json")})
@@ -0,0 +1,118 @@
+""" Tests for sound_scanner.py on a large synthetic UnpackedData tree """
+
+import os
+
+import pytest
+
+from sound_scanner import SoundScanner, CategoryMatcher, find_category_roots, SOUND_LAYOUTS
+
+FOLDERS_PER_CATEGORY = 40
+FILES_PER_FOLDER = 25
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "wb").close()
+
+@pytest.fixture(scope="module")
+def tree(tmp_path_factory):
+    """
+    UnpackedData with Shared and SharedDev sound folders, a SharedDev folder
+    nested inside Shared, decoys whose names start with "Shared", folders that
+    are pruned, and localized voice banks
+
+    Returns:
+        (root, {category: set of paths}, set of paths in pruned folders, set of localized paths)
+    """
+    root = str(tmp_path_factory.mktemp("UnpackedData"))
+    public = os.path.join(root, "SharedSoundBanks", "Public")
+    roots = {
+        "Shared": os.path.join(public, "Shared", "Assets", "Sound"),
+        "SharedDev": os.path.join(public, "SharedDev", "Assets", "Sound"),
+        # Nested inside the Shared sound folder: its own category wins
+        "Nested": os.path.join(public, "Shared", "Assets", "Sound", "SharedDev"),
+    }
+    expected = {category: set() for category in roots}
+    expected["Other"] = set()
+    for category, folder in roots.items():
+        for i in range(FOLDERS_PER_CATEGORY):
+            for j in range(FILES_PER_FOLDER):
+                path = os.path.join(folder, f"Bank{i}", f"{category}_{i}_{j}.bnk")
+                touch(path)
+                expected[category].add(path)
+    # Decoys: names containing "Shared" or "SharedDev" that are no category root
+    for decoy in ("SharedDevOld", "SharedBackup", "NotShared"):
+        for j in range(FILES_PER_FOLDER):
+            path = os.path.join(public, decoy, "Assets", "Sound", f"{decoy}_{j}.bnk")
+            touch(path)
+            expected["Other"].add(path)
+    # Files the pruning skips, and files inside a Sound folder that it keeps
+    pruned = set()
+    for folder in (os.path.join(public, "Shared", "Assets", "Textures"),
+                   os.path.join(public, "Shared", "Content"),
+                   os.path.join(root, "Textures", "Sound")):
+        path = os.path.join(folder, "hidden.bnk")
+        touch(path)
+        pruned.add(path)
+    kept = os.path.join(roots["Shared"], "Textures", "kept.bnk")
+    touch(kept)
+    expected["Shared"].add(kept)
+    # Localized voice banks, outside any Assets/Sound folder
+    localized = set()
+    for language in ("English", "French"):
+        path = os.path.join(root, "Localization", language, "Soundbanks", f"VO_{language}.bnk")
+        touch(path)
+        localized.add(path)
+    expected["Other"].update(localized)
+    return root, roots, expected, pruned, localized
+
+def test_category_matcher_prefers_the_longest_root(tree):
+    root, roots, expected, pruned, localized = tree
+    matcher = CategoryMatcher(dict(roots, Missing=None))
+    for category, paths in expected.items():
+        for path in paths:
+            assert (matcher.categorize(path) or "Other") == category, path
+
+def test_category_matcher_normalizes_paths(tree):
+    root, roots, expected, pruned, localized = tree
+    matcher = CategoryMatcher({"Shared": roots["Shared"] + os.sep, "SharedDev": roots["SharedDev"]})
+    path = os.path.join(roots["SharedDev"], "Bank0", "..", "Bank1", "x.bnk")
+    assert matcher.categorize(path) == "SharedDev"
+    assert matcher.categorize(roots["SharedDev"] + "Old" + os.sep + "x.bnk") is None
+
+@pytest.mark.parametrize("max_workers", [1, 8])
+def test_scan_parallel_matches_walk(tree, max_workers):
+    root, roots, expected, pruned, localized = tree
+    everything = set().union(*expected.values())
+    parallel = SoundScanner(extensions=(".bnk",))
+    found = list(parallel.scan_parallel(root, max_workers=max_workers))
+    assert len(found) == len(set(found))
+    assert set(found) == everything
+    assert set(SoundScanner(extensions=(".BNK",)).scan(root)) == everything
+    assert parallel.files_matched == len(everything)
+    assert not pruned & set(found)
+
+def test_shared_only_scan_skips_localization(tree):
+    root, roots, expected, pruned, localized = tree
+    found = set(SoundScanner(extensions=(".bnk",), shared_only=True).scan_parallel(root))
+    assert not localized & found
+    assert expected["Shared"] <= found and expected["SharedDev"] <= found
+
+def test_unpruned_scan_finds_everything(tree):
+    root, roots, expected, pruned, localized = tree
+    found = set(SoundScanner(extensions=(".bnk",), prune=False).scan_parallel(root))
+    assert found == set().union(*expected.values()) | pruned
+
+def test_closing_the_scan_early(tree):
+    root, roots, expected, pruned, localized = tree
+    scan = SoundScanner(extensions=(".bnk",)).scan_parallel(root)
+    first = [next(scan) for _ in range(10)]
+    scan.close()
+    assert len(set(first)) == 10
+
+def test_find_category_roots_prefers_other_layouts_for_sounds(tmp_path):
+    for folder in ("SharedSounds/Public/Shared", "Public/Shared", "Public/SharedDev"):
+        os.makedirs(tmp_path / folder)
+    roots = find_category_roots(str(tmp_path), SOUND_LAYOUTS)
+    assert roots == {"Shared": str(tmp_path / "Public" / "Shared"),
+                     "SharedDev": str(tmp_path / "Public" / "SharedDev")}
+    assert find_category_roots(str(tmp_path / "missing")) == {"Shared": None, "SharedDev": None}
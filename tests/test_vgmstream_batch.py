@@ -0,0 +1,138 @@
+""" Tests for vgmstream_batch.py with a fake vgmstream-cli """
+
+import os
+import sys
+import stat
+import logging
+
+import pytest
+
+import vgmstream_batch
+from vgmstream_batch import iter_batches, convert_batch, batch_output_path
+from process_runner import ProcessRunner
+
+# Converts its inputs in order and stops at the first one named "bad"; with
+# FAKE_VGMSTREAM_NO_PATTERN set it writes "?f" literally, like a build that
+# does not expand the pattern
+FAKE_CLI = f"""#!{sys.executable}
+import os, sys
+output, inputs = sys.argv[2], sys.argv[3:]
+for path in inputs:
+    if "bad" in os.path.basename(path):
+        sys.stderr.write(f"cannot open {{path}}\\n")
+        sys.exit(1)
+    name = "?f" if os.environ.get("FAKE_VGMSTREAM_NO_PATTERN") else os.path.basename(path)
+    with open(output.replace("?f", name), "wb") as f:
+        f.write(b"RIFF" + os.path.basename(path).encode())
+"""
+
+def make_wems(folder, names, size=10):
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for name in names:
+        path = os.path.join(folder, name)
+        with open(path, "wb") as f:
+            f.write(b"\0" * size)
+        paths.append(path)
+    return paths
+
+@pytest.fixture
+def cli(tmp_path):
+    path = tmp_path / "vgmstream-cli"
+    path.write_text(FAKE_CLI, encoding="utf-8")
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+def test_batches_are_limited_by_count(tmp_path):
+    wems = make_wems(str(tmp_path), [f"{i}.wem" for i in range(10)])
+    assert [len(batch) for batch in iter_batches(wems, max_files=4)] == [4, 4, 2]
+    assert [wem for batch in iter_batches(wems, max_files=4) for wem in batch] == wems
+
+def test_batches_are_limited_by_size(tmp_path):
+    wems = make_wems(str(tmp_path), ["1.wem", "2.wem", "3.wem"], size=40)
+    wems += make_wems(str(tmp_path), ["big.wem"], size=500)
+    wems += make_wems(str(tmp_path), ["4.wem"], size=40)
+    batches = list(iter_batches(wems, max_files=64, max_bytes=100))
+    # A file larger than the limit gets a batch of its own
+    assert [[os.path.basename(wem) for wem in batch] for batch in batches] == \
+        [["1.wem", "2.wem"], ["3.wem"], ["big.wem"], ["4.wem"]]
+
+def test_batches_are_limited_by_command_length(tmp_path, monkeypatch):
+    folder = os.path.join(str(tmp_path), "a" * 40)
+    wems = make_wems(folder, [f"{i}.wem" for i in range(6)])
+    chars = len(wems[0]) + 3
+    monkeypatch.setattr(vgmstream_batch, "MAX_COMMAND_CHARS", chars * 2 + 1)
+    assert [len(batch) for batch in iter_batches(wems)] == [2, 2, 2]
+
+def test_files_with_the_same_name_go_to_different_batches(tmp_path):
+    first = make_wems(str(tmp_path / "Shared"), ["1.wem", "2.wem"])
+    second = make_wems(str(tmp_path / "SharedDev"), ["1.wem", "3.wem"])
+    batches = list(iter_batches(first + second))
+    assert batches == [first, second]
+
+def test_batches_are_yielded_while_the_input_is_still_produced(tmp_path):
+    wems = make_wems(str(tmp_path), [f"{i}.wem" for i in range(5)])
+    produced = []
+
+    def scan():
+        for wem in wems:
+            produced.append(wem)
+            yield wem
+
+    batches = iter_batches(scan(), max_files=2)
+    assert next(batches) == wems[:2]
+    assert len(produced) == 3
+    # Files that vanished count as empty instead of failing the split
+    assert list(iter_batches([str(tmp_path / "gone.wem")])) == [[str(tmp_path / "gone.wem")]]
+
+def test_batch_converts_with_one_process(tmp_path, cli, caplog):
+    wems = make_wems(str(tmp_path / "in"), ["1.wem", "2.wem", "3.wem"])
+    output_dir = str(tmp_path / "out")
+    runner = ProcessRunner()
+    with caplog.at_level(logging.WARNING, logger="vgmstream_batch"):
+        results = convert_batch(cli, wems, output_dir, runner, timeout=30)
+    assert results == {wem: batch_output_path(wem, output_dir) for wem in wems}
+    assert all(os.path.exists(output) for output in results.values())
+    assert runner.stats["vgmstream-cli"]["runs"] == 1
+    assert caplog.text == ""
+
+def test_failed_input_is_retried_alone_and_reported(tmp_path, cli, caplog):
+    wems = make_wems(str(tmp_path / "in"), ["1.wem", "bad.wem", "3.wem", "4.wem"])
+    output_dir = str(tmp_path / "out")
+    # Outputs of an earlier run do not count as converted
+    os.makedirs(output_dir)
+    with open(batch_output_path(wems[1], output_dir), "wb") as f:
+        f.write(b"stale")
+    runner = ProcessRunner()
+    with caplog.at_level(logging.WARNING, logger="vgmstream_batch"):
+        results = convert_batch(cli, wems, output_dir, runner, timeout=30)
+    assert results[wems[1]] is None
+    assert [results[wem] for wem in wems if wem != wems[1]] == \
+        [batch_output_path(wem, output_dir) for wem in wems if wem != wems[1]]
+    # The batch stopped at bad.wem: it and the files after it ran on their own
+    stats = runner.stats["vgmstream-cli"]
+    assert (stats["runs"], stats["failed"]) == (4, 2)
+    assert "vgmstream-cli failed on" in caplog.text and "cannot open" in caplog.text
+    assert f"could not convert {wems[1]}" in caplog.text
+    # Some outputs were written, so the pattern works
+    assert "wrote none of" not in caplog.text
+
+def test_batch_without_outputs_is_reported(tmp_path, cli, caplog, monkeypatch):
+    monkeypatch.setenv("FAKE_VGMSTREAM_NO_PATTERN", "1")
+    wems = make_wems(str(tmp_path / "in"), ["1.wem", "2.wem"])
+    output_dir = str(tmp_path / "out")
+    runner = ProcessRunner()
+    with caplog.at_level(logging.WARNING, logger="vgmstream_batch"):
+        results = convert_batch(cli, wems, output_dir, runner, timeout=30)
+    assert "wrote none of the 2 outputs" in caplog.text
+    assert '"?f" output pattern' in caplog.text
+    # The single-file fallback names its output directly, so the files are still converted
+    assert all(results[wem] == batch_output_path(wem, output_dir) for wem in wems)
+    assert runner.stats["vgmstream-cli"]["runs"] == 3
+
+def test_cancelled_runner_starts_nothing(tmp_path, cli):
+    wems = make_wems(str(tmp_path / "in"), ["1.wem", "2.wem"])
+    runner = ProcessRunner()
+    runner.cancel()
+    assert convert_batch(cli, wems, str(tmp_path / "out"), runner, timeout=30) == {wem: None for wem in wems}
+    assert runner.stats == {}
@@ -0,0 +1,80 @@
+""" Tests for the tool version handling of watcher.py """
+
+import os
+import json
+
+from watcher import ChangeWatcher
+
+def make_state(tmp_path, tools):
+    root = tmp_path / "UnpackedData"
+    root.mkdir()
+    for name in ("a.bnk", "1.wem"):
+        (root / name).write_bytes(b"x")
+    state_path = str(tmp_path / "watch_state.json")
+    watcher = ChangeWatcher(str(root), state_path, tools=tools, log=lambda message: None)
+    watcher.files = watcher.scan()
+    watcher.save()
+    return str(root), state_path
+
+def test_changed_tool_reprocesses_its_files(tmp_path):
+    root, state_path = make_state(tmp_path, {"wwiser": "w1", "vgmstream": "v1"})
+    watcher = ChangeWatcher(root, state_path, tools={"wwiser": "w1", "vgmstream": "v2"}, log=lambda message: None)
+    changed, removed = watcher.diff(watcher.scan())
+    assert [os.path.basename(path) for path in changed] == ["1.wem"]
+    assert removed == []
+    watcher.save()
+    with open(state_path, encoding="utf-8") as f:
+        assert json.load(f)["tools"] == {"wwiser": "w1", "vgmstream": "v2"}
+
+def test_unchanged_tools_keep_the_state(tmp_path):
+    root, state_path = make_state(tmp_path, {"wwiser": "w1", "vgmstream": "v1"})
+    watcher = ChangeWatcher(root, state_path, tools={"wwiser": "w1", "vgmstream": "v1"})
+    assert watcher.diff(watcher.scan()) == ([], [])
+
+def test_state_without_versions_is_assumed_current(tmp_path):
+    root, state_path = make_state(tmp_path, None)
+    watcher = ChangeWatcher(root, state_path, tools={"wwiser": "w2", "vgmstream": "v2"})
+    assert watcher.diff(watcher.scan()) == ([], [])
+
+def run_batches(watcher, handle, batches):
+    """Run the watch loop for the given number of handled batches"""
+    calls = []
+
+    def record(changed, removed):
+        calls.append(sorted(os.path.basename(path) for path in changed))
+        return handle(changed, removed)
+
+    watcher.watch(record, should_continue=lambda: len(calls) < batches)
+    return calls
+
+def test_failed_files_are_retried_and_not_recorded(tmp_path):
+    root, state_path = make_state(tmp_path, None)
+    for name in ("b.bnk", "2.wem", "3.wem"):
+        (tmp_path / "UnpackedData" / name).write_bytes(b"yy")
+    watcher = ChangeWatcher(root, state_path, interval=0, settle=0, log=lambda message: None)
+
+    def fail_3(changed, removed):
+        return [path for path in changed if path.endswith("3.wem")]
+
+    assert run_batches(watcher, fail_3, 2) == [["2.wem", "3.wem", "b.bnk"], ["3.wem"]]
+    with open(state_path, encoding="utf-8") as f:
+        recorded = {os.path.basename(path) for path in json.load(f)["files"]}
+    assert recorded == {"a.bnk", "1.wem", "b.bnk", "2.wem"}
+    # A later run still processes the failed file
+    watcher = ChangeWatcher(root, state_path, interval=0, settle=0, log=lambda message: None)
+    assert run_batches(watcher, lambda changed, removed: None, 1) == [["3.wem"]]
+    assert ChangeWatcher(root, state_path).diff(watcher.scan()) == ([], [])
+
+def test_batch_that_raised_is_handed_over_again(tmp_path):
+    root, state_path = make_state(tmp_path, None)
+    (tmp_path / "UnpackedData" / "2.wem").write_bytes(b"yy")
+    watcher = ChangeWatcher(root, state_path, interval=0, settle=0, log=lambda message: None)
+    attempts = []
+
+    def fail_once(changed, removed):
+        attempts.append(changed)
+        if len(attempts) == 1:
+            raise RuntimeError("vgmstream-cli failed")
+
+    assert run_batches(watcher, fail_once, 2) == [["2.wem"], ["2.wem"]]
+    assert watcher.diff(watcher.scan()) == ([], [])
@@ -0,0 +1,211 @@
+""" tool_registry.py - Discovery and version probing of external tools
+Finds wwiser.pyz, vgmstream-cli and wwnames.db3 in the configured location,
+the dependencies folder or on the PATH, and works out which version each one
+is. Versions are cached in tool_cache.json keyed on the file's path, size and
+mtime, so a tool is only probed again after it has been replaced.
+
+The version string is meant to go into cache keys: anything converted or
+decoded with one version of a tool is redone after the tool is updated.
+"""
+
+import os
+import re
+import json
+import shutil
+import logging
+import hashlib
+import zipfile
+import threading
+import subprocess
+from typing import Dict, Optional, Any
+
+from config_manager import get_config
+from audio_store import hash_file
+
+logger = logging.getLogger(__name__)
+
+DEPENDENCIES_FOLDER = os.path.join(os.getcwd(), "dependencies")
+DEFAULT_CACHE_PATH = os.path.join(os.getcwd(), "tool_cache.json")
+PROBE_TIMEOUT = 10
+
+# Tool name -> config key holding its file or folder, file names to look for,
+# and subfolders of the dependencies folder it can be unpacked into
+TOOLS: Dict[str, Dict[str, Any]] = {
+    "wwiser": {"config_key": "wwiser_pyz", "files": ("wwiser.pyz",), "subdirs": ()},
+    "vgmstream": {"config_key": "folder_vgmstream", "files": ("vgmstream-cli.exe", "vgmstream-cli"),
+                  "subdirs": ("vgmstream-win64",)},
+    "wwnames": {"config_key": None, "files": ("wwnames.db3",), "subdirs": ()},
+}
+
+def _wwiser_version(path: str) -> Optional[str]:
+    """Read the version constant from inside the wwiser.pyz archive"""
+    try:
+        with zipfile.ZipFile(path) as archive:
+            for name in archive.namelist():
+                if name.endswith(".py") and "version" in os.path.basename(name).lower():
+                    match = re.search(r'VERSION\s*=\s*["\']([^"\']+)["\']',
+                                      archive.read(name).decode("utf-8", "replace"))
+                    if match:
+                        return match.group(1)
+    except (OSError, zipfile.BadZipFile) as e:
+        logger.warning(f"Cannot read wwiser version from {path}: {e}")
+    return None
+
+def _vgmstream_version(path: str) -> Optional[str]:
+    """Ask vgmstream-cli for its version"""
+    try:
+        process = subprocess.run([path, "-V"], capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"Cannot run {path}: {e}")
+        return None
+    for line in process.stdout.splitlines():
+        if line.strip():
+            return line.strip()
+    return None
+
+VERSION_PROBES = {
+    "wwiser": _wwiser_version,
+    "vgmstream": _vgmstream_version,
+}
+
+def cache_tag(version: Optional[str]) -> str:
+    """Short file name safe tag for a version string, for use in cache keys and file names"""
+    if not version:
+        return ""
+    return hashlib.sha1(version.encode("utf-8")).hexdigest()[:10]
+
+class ToolRegistry:
+    """Locates the external tools and caches their versions"""
+
+    def __init__(self, cache_path: str = DEFAULT_CACHE_PATH, dependencies_folder: str = DEPENDENCIES_FOLDER):
+        self.cache_path = cache_path
+        self.dependencies_folder = dependencies_folder
+        self.lock = threading.Lock()
+        self.cache: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    self.cache = json.load(f).get("tools", {})
+            except Exception as e:
+                logger.error(f"Error loading tool cache: {e}")
+
+    def save(self):
+        """Write the version cache to disk"""
+        with self.lock:
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "tools": self.cache}, f, indent=2)
+            os.replace(tmp_path, self.cache_path)
+
+    def resolve(self, tool: str, configured: Optional[str] = None) -> Optional[str]:
+        """
+        Find a tool
+
+        Looks at the configured location first (a file, or a folder containing
+        the tool), then the dependencies folder, then the PATH.
+
+        Args:
+            tool: Tool name, one of TOOLS
+            configured: Configured file or folder; defaults to the tool's config entry
+
+        Returns:
+            Absolute path to the tool, or None if it cannot be found
+        """
+        spec = TOOLS[tool]
+        if configured is None and spec["config_key"]:
+            configured = get_config(spec["config_key"])
+        folders = []
+        if configured:
+            if os.path.isfile(configured):
+                return os.path.abspath(configured)
+            folders.append(configured)
+        folders.append(self.dependencies_folder)
+        folders.extend(os.path.join(self.dependencies_folder, subdir) for subdir in spec["subdirs"])
+        for folder in folders:
+            for name in spec["files"]:
+                candidate = os.path.join(folder, name)
+                if os.path.isfile(candidate):
+                    return os.path.abspath(candidate)
+        for name in spec["files"]:
+            found = shutil.which(name)
+            if found:
+                return os.path.abspath(found)
+        return None
+
+    def probe(self, tool: str, configured: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Find a tool and its version, using the cache while the file is unchanged
+
+        Tools without a version of their own (or whose version cannot be read)
+        are identified by a hash of their contents instead.
+
+        Args:
+            tool: Tool name, one of TOOLS
+            configured: Configured file or folder; defaults to the tool's config entry
+
+        Returns:
+            Dictionary with path and version, or None if the tool cannot be found
+        """
+        path = self.resolve(tool, configured)
+        if path is None:
+            return None
+        cached = self._cached_version(path)
+        if cached is not None:
+            return {"path": path, "version": cached}
+
+        stat = os.stat(path)
+        probe = VERSION_PROBES.get(tool)
+        version = probe(path) if probe else None
+        if not version:
+            version = f"sha256:{hash_file(path)[:16]}"
+        logger.info(f"Found {tool} {version} at {path}")
+        with self.lock:
+            self.cache[path] = {"tool": tool, "size": stat.st_size, "mtime": stat.st_mtime, "version": version}
+        try:
+            self.save()
+        except OSError as e:
+            logger.warning(f"Cannot write tool cache: {e}")
+        return {"path": path, "version": version}
+
+    def cached(self, tool: str, configured: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Find a tool and its version from the cache only, never running it
+
+        Args:
+            tool: Tool name, one of TOOLS
+            configured: Configured file or folder; defaults to the tool's config entry
+
+        Returns:
+            Dictionary with path and version, or None if the tool cannot be found
+            or has not been probed since the file last changed
+        """
+        path = self.resolve(tool, configured)
+        if path is None:
+            return None
+        version = self._cached_version(path)
+        return {"path": path, "version": version} if version is not None else None
+
+    def _cached_version(self, path: str) -> Optional[str]:
+        """Cached version of the tool at path, if the file is unchanged since it was probed"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self.lock:
+            entry = self.cache.get(path)
+        if entry and entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime:
+            return entry["version"]
+        return None
+
+# Create a singleton instance
+tool_registry = ToolRegistry()
+
+# Easy access functions
+def find_tool(tool: str, configured: Optional[str] = None) -> Optional[str]:
+    """Path of a tool, or None if it cannot be found"""
+    return tool_registry.resolve(tool, configured)
+
+def tool_version(tool: str, configured: Optional[str] = None) -> Optional[str]:
+    """Version of a tool, or None if it cannot be found"""
+    info = tool_registry.probe(tool, configured)
+    return info["version"] if info else None
@@ -0,0 +1,118 @@
+""" vgmstream_batch.py - Batched vgmstream-cli conversion
+Converts many .wem files per vgmstream-cli process, using its multi-file
+input and "?f" output pattern, so process startup is paid once per batch
+instead of once per file. Failures are still detected per file: any input
+whose output is missing after the batch is retried on its own. A batch that
+produced no output at all is logged as a warning, since that is what a
+vgmstream-cli that does not expand "?f" to the input file name looks like:
+every file then quietly falls back to a process of its own.
+"""
+
+import os
+import logging
+from typing import Dict, List, Optional, Iterable, Iterator
+
+from process_runner import ProcessRunner, process_runner, DEFAULT_CONVERT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_FILES = 64
+DEFAULT_BATCH_BYTES = 64 * 1024 * 1024
+# Stay well below the Windows command line limit of 32767 characters
+MAX_COMMAND_CHARS = 24000
+
+def iter_batches(wems: Iterable[str],
+                 max_files: int = DEFAULT_BATCH_FILES,
+                 max_bytes: int = DEFAULT_BATCH_BYTES) -> Iterator[List[str]]:
+    """
+    Split WEM files into batches bounded by file count, total size and command length
+
+    Files sharing a name never go into the same batch, since the output
+    pattern names outputs after the input file. Each batch is yielded as soon
+    as it is full, so wems may be a generator that is still scanning.
+
+    Args:
+        wems: Paths of the .wem files, in the order they should run
+        max_files: Maximum number of files per batch
+        max_bytes: Maximum total input size per batch (a larger file gets its own batch)
+
+    Yields:
+        Batches of paths
+    """
+    batch: List[str] = []
+    names = set()
+    batch_bytes = 0
+    batch_chars = 0
+    for wem in wems:
+        try:
+            size = os.path.getsize(wem)
+        except OSError:
+            size = 0
+        name = os.path.basename(wem)
+        chars = len(wem) + 3
+        if batch and (len(batch) >= max_files
+                      or batch_bytes + size > max_bytes
+                      or batch_chars + chars > MAX_COMMAND_CHARS
+                      or name in names):
+            yield batch
+            batch, names, batch_bytes, batch_chars = [], set(), 0, 0
+        batch.append(wem)
+        names.add(name)
+        batch_bytes += size
+        batch_chars += chars
+    if batch:
+        yield batch
+
+def batch_output_path(wem: str, output_dir: str) -> str:
+    """Where a batch writes the output for an input: <output_dir>/<input name>.wav"""
+    return os.path.join(output_dir, os.path.basename(wem) + ".wav")
+
+def convert_batch(vgmstream_cli: str,
+                  wems: List[str],
+                  output_dir: str,
+                  runner: Optional[ProcessRunner] = None,
+                  timeout: float = DEFAULT_CONVERT_TIMEOUT) -> Dict[str, Optional[str]]:
+    """
+    Convert a batch of WEM files with one vgmstream-cli process
+
+    Args:
+        vgmstream_cli: Path to vgmstream-cli
+        wems: Paths of the .wem files
+        output_dir: Folder receiving "<name>.wem.wav" files
+        runner: ProcessRunner to run vgmstream-cli with (default: the shared one)
+        timeout: Seconds allowed per file; the whole batch gets this times its size
+
+    Returns:
+        Dictionary mapping each input to its output path, or None if it failed
+    """
+    runner = runner or process_runner
+    os.makedirs(output_dir, exist_ok=True)
+    # Outputs left from an earlier run would hide a failure in this one
+    for wem in wems:
+        output = batch_output_path(wem, output_dir)
+        if os.path.exists(output):
+            os.remove(output)
+    pattern = os.path.join(output_dir, "?f.wav")
+    batch = runner.run([vgmstream_cli, "-o", pattern] + list(wems), timeout=timeout * len(wems),
+                       name="vgmstream-cli", job=wems[0] if len(wems) == 1 else f"batch of {len(wems)} from {os.path.basename(wems[0])}")
+    outputs = [batch_output_path(wem, output_dir) for wem in wems]
+    if len(wems) > 1 and not runner.cancelled and not any(os.path.exists(output) for output in outputs):
+        logger.warning(f"vgmstream-cli wrote none of the {len(wems)} outputs of a batch ({batch.describe()}); "
+                       f"converting them one by one. If this happens for every batch, this vgmstream-cli "
+                       f"does not expand the \"?f\" output pattern and batch_convert should be turned off")
+
+    results: Dict[str, Optional[str]] = {}
+    for wem in wems:
+        output = batch_output_path(wem, output_dir)
+        if not os.path.exists(output) and not runner.cancelled:
+            # A failing file can stop the whole batch; convert the rest one by one
+            result = runner.run([vgmstream_cli, "-o", output, wem], timeout=timeout, name="vgmstream-cli", job=wem)
+            if not result.ok and not result.cancelled:
+                logger.error(f"vgmstream-cli failed on {wem}: {result.describe()}")
+        if os.path.exists(output):
+            results[wem] = output
+        else:
+            if not runner.cancelled:
+                logger.error(f"vgmstream-cli could not convert {wem}")
+            results[wem] = None
+    return results
@@ -0,0 +1,288 @@
+""" watcher.py - Watch UnpackedData for changed banks and sounds
+Keeps the size and modification time of every .bnk and .wem file under
+UnpackedData in a state file (watch_state.json). Each check compares the
+files against it and reports what was added, changed or removed since the
+last processed change, so after re-unpacking a patch only the files that
+really changed are processed again.
+
+With the optional watchdog package the watcher waits for file system
+events and only stats the files they name, with a full rescan now and
+then in case an event was missed. Without it the tree is polled every
+interval.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from typing import Dict, List, Optional, Callable, Iterable, Set, Tuple
+
+from sound_scanner import SoundScanner
+from sound_mappings import read_bank_source_ids, is_bank_xml
+from sound_filter import bank_name_of
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATE_PATH = os.path.join(os.getcwd(), "watch_state.json")
+# Seconds between checks
+DEFAULT_INTERVAL = 10.0
+# Seconds a changed file must stay unchanged before it is processed, so
+# files still being unpacked are not picked up half-written
+SETTLE_SECONDS = 5.0
+# With watchdog, seconds between full rescans that catch missed events
+RESCAN_SECONDS = 600.0
+WATCHED_EXTENSIONS = (".bnk", ".wem")
+# Files each tool processes; when a tool's version changes they are processed again
+TOOL_EXTENSIONS = {"wwiser": ".bnk", "vgmstream": ".wem"}
+
+def category_of(path: str) -> str:
+    """Category of a file under UnpackedData: "Shared", "SharedDev" or "Other" """
+    parts = os.path.normpath(path).split(os.sep)
+    if "SharedDev" in parts:
+        return "SharedDev"
+    if "Shared" in parts:
+        return "Shared"
+    return "Other"
+
+def stat_files(paths: Iterable[str]) -> Dict[str, Tuple[int, float]]:
+    """Size and mtime of the given files; files that are gone are left out"""
+    stats = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        stats[path] = (stat.st_size, stat.st_mtime)
+    return stats
+
+class _EventCollector(FileSystemEventHandler):
+    """Collects the paths of .bnk/.wem files named by watchdog events"""
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.paths: Set[str] = set()
+        self.event = threading.Event()
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        for path in (event.src_path, getattr(event, "dest_path", "")):
+            if path and path.lower().endswith(WATCHED_EXTENSIONS):
+                with self.lock:
+                    self.paths.add(path)
+                self.event.set()
+
+    def take(self) -> Set[str]:
+        with self.lock:
+            paths, self.paths = self.paths, set()
+        self.event.clear()
+        return paths
+
+class ChangeWatcher:
+    """Finds the .bnk/.wem files changed since the last processed change"""
+
+    def __init__(self,
+                 root: str,
+                 state_path: str = DEFAULT_STATE_PATH,
+                 interval: float = DEFAULT_INTERVAL,
+                 settle: float = SETTLE_SECONDS,
+                 log: Optional[Callable[[str], None]] = None,
+                 tools: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            root: UnpackedData folder to watch
+            state_path: File keeping the size and mtime of every watched file
+            interval: Seconds between checks
+            settle: Seconds a change must stay unchanged before it is reported
+            log: Optional callback for status messages
+            tools: Tool name -> cache_tag() of its version (see TOOL_EXTENSIONS);
+                files processed with another version of a tool count as changed
+        """
+        self.root = root
+        self.state_path = state_path
+        self.interval = interval
+        self.settle = settle
+        self.log = log or logger.info
+        self.tools = {tool: tag for tool, tag in (tools or {}).items() if tag}
+        self.files: Dict[str, Tuple[int, float]] = {}
+        self.loaded = False
+        self.load()
+
+    def load(self):
+        """Read the state file if it exists"""
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("root") == os.path.abspath(self.root):
+                self.files = {path: tuple(entry) for path, entry in data.get("files", {}).items()}
+                self.loaded = True
+                self.forget_outdated(data.get("tools", {}))
+        except Exception as e:
+            logger.error(f"Error loading watch state: {e}")
+
+    def forget_outdated(self, recorded: Dict[str, str]):
+        """Drop the files of tools whose version differs from the one recorded, so they are processed again"""
+        for tool, tag in self.tools.items():
+            # States written before versions were recorded are assumed current
+            if tool not in recorded or recorded[tool] == tag:
+                continue
+            extension = TOOL_EXTENSIONS[tool]
+            outdated = [path for path in self.files if path.lower().endswith(extension)]
+            for path in outdated:
+                del self.files[path]
+            self.log(f"{tool} changed since the last run; {len(outdated)} {extension} files will be processed again")
+
+    def save(self):
+        """Write the state file"""
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "root": os.path.abspath(self.root), "tools": self.tools,
+                       "files": self.files}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def scan(self) -> Dict[str, Tuple[int, float]]:
+        """Size and mtime of every watched file under the root"""
+        return stat_files(SoundScanner(extensions=WATCHED_EXTENSIONS).scan_parallel(self.root))
+
+    def diff(self, current: Dict[str, Tuple[int, float]],
+             checked: Optional[Iterable[str]] = None) -> Tuple[List[str], List[str]]:
+        """
+        Compare file stats with the state
+
+        Args:
+            current: Size and mtime of the files that exist now
+            checked: Paths that were looked at; None means the whole tree was scanned
+
+        Returns:
+            Tuple of (new or changed paths, removed paths), sorted
+        """
+        paths = set(self.files) if checked is None else set(checked)
+        changed = sorted(path for path, entry in current.items() if self.files.get(path) != tuple(entry))
+        removed = sorted(path for path in paths if path in self.files and path not in current)
+        return changed, removed
+
+    def wait_until_settled(self, changed: List[str]) -> Dict[str, Tuple[int, float]]:
+        """Wait until the changed files stop changing; returns the stats of those that still exist"""
+        stats = stat_files(changed)
+        while True:
+            time.sleep(self.settle)
+            again = stat_files(changed)
+            if again == stats:
+                return again
+            stats = again
+
+    def commit(self, changed: Dict[str, Tuple[int, float]], removed: Iterable[str]):
+        """Record processed changes (with the stats they were processed at) in the state file"""
+        self.files.update(changed)
+        for path in removed:
+            self.files.pop(path, None)
+        self.save()
+
+    def watch(self,
+              handle: Callable[[List[str], List[str]], Optional[Iterable[str]]],
+              should_continue: Callable[[], bool] = lambda: True):
+        """
+        Call handle(changed, removed) for every settled batch of changes until should_continue() is False
+
+        A batch is recorded in the state file once handle returns; a batch
+        that raised is handed over again with the next one. handle may return
+        the changed paths it failed to process: only those are left out of the
+        state and handed over again.
+        """
+        if not self.loaded:
+            # Nothing to compare with yet: everything on disk counts as processed
+            self.files = self.scan()
+            self.save()
+            self.loaded = True
+            self.log(f"Recorded {len(self.files)} files under {self.root}; changes from now on are processed")
+
+        collector = None
+        observer = None
+        if Observer is not None:
+            collector = _EventCollector()
+            observer = Observer()
+            observer.schedule(collector, self.root, recursive=True)
+            observer.start()
+            self.log(f"Watching {self.root} for file system events")
+        else:
+            self.log(f"Polling {self.root} every {self.interval:.0f}s (install watchdog to react to events)")
+
+        # Changes made while the watcher was not running
+        pending = self.diff(self.scan())
+        last_scan = time.monotonic()
+        failed: Tuple[List[str], List[str]] = ([], [])
+        try:
+            while should_continue():
+                changed = sorted(set(pending[0]) | set(failed[0]))
+                removed = sorted(set(pending[1]) | set(failed[1]))
+                failed = ([], [])
+                settled = self.wait_until_settled(changed) if changed else {}
+                if settled or removed:
+                    self.log(f"{len(settled)} changed and {len(removed)} removed files")
+                    try:
+                        unprocessed = set(handle(sorted(settled), removed) or ()) & set(settled)
+                    except Exception as e:
+                        logger.exception(f"Error processing changes: {e}")
+                        failed = (sorted(settled), removed)
+                    else:
+                        if unprocessed:
+                            self.log(f"{len(unprocessed)} files failed and will be processed again")
+                            failed = (sorted(unprocessed), [])
+                        self.commit({path: entry for path, entry in settled.items() if path not in unprocessed},
+                                    removed)
+
+                if collector is not None:
+                    collector.event.wait(self.interval)
+                    if time.monotonic() - last_scan >= RESCAN_SECONDS:
+                        collector.take()
+                        pending = self.diff(self.scan())
+                        last_scan = time.monotonic()
+                    else:
+                        paths = collector.take()
+                        pending = self.diff(stat_files(paths), paths)
+                else:
+                    time.sleep(self.interval)
+                    pending = self.diff(self.scan())
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+class BankSoundIndex:
+    """Which decoded banks reference each sound, read from the bank XMLs"""
+
+    def __init__(self, banks_dir: str):
+        """
+        Args:
+            banks_dir: Folder of decoded banks (<category>/<bank>/<bank>.bnk.xml)
+        """
+        self.banks_dir = banks_dir
+        self.banks: Dict[str, Set[str]] = {}
+        for root, _, files in os.walk(banks_dir):
+            for file in files:
+                if is_bank_xml(file):
+                    self.banks[bank_name_of(file)] = set(read_bank_source_ids(os.path.join(root, file)))
+
+    def refresh(self, bank_names: Iterable[str]):
+        """Re-read the XMLs of banks that were decoded again"""
+        bank_names = set(bank_names)
+        for root, _, files in os.walk(self.banks_dir):
+            for file in files:
+                if is_bank_xml(file) and bank_name_of(file) in bank_names:
+                    self.banks[bank_name_of(file)] = set(read_bank_source_ids(os.path.join(root, file)))
+
+    def banks_using(self, sound_ids: Iterable[str]) -> Set[str]:
+        """Names of the banks that reference any of the sounds"""
+        sound_ids = set(sound_ids)
+        return {name for name, ids in self.banks.items() if ids & sound_ids}